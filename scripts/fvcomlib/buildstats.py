@@ -0,0 +1,47 @@
+# buildstats.py - Build Statistics (BST) for FVCOM
+# Tested for version FVCOM 5.0.1 (intel)
+# Build: ifvcom501.wd.lag (@fvcom-u18-skeid)
+# VSF 2025
+# Jari í Hjøllum, Knud Simonsen
+#
+# This script builds the statistics sidecar (<datafile>.stats.npz) of a nc
+# output file: min, max, mean and percentiles per variable, siglay and time
+# step. The plotting scripts take their colour bounds from it.
+# Edit:
+# inbasepath  : The path of the input file.
+# datafile    : The filename of the input file.
+# fields      : The variables. Empty: all the default variables in the file.
+# percentiles : The percentiles (0-100) to store.
+# force       : 1: Recalculate variables which already have statistics.
+#
+#========CONSTANTS - DO NOT CHANGE==============================================
+#--------VERSION----------------------------------------------------------------
+VERSION         = "1.0"
+#========IMPORT=================================================================
+import sys
+sys.path.insert(1, '../scripts/')
+import fvcomlibutil as u
+import fvcomdata
+from fvcomdata import FVCOMData
+#========CONSTANTS - DO NOT CHANGE==============================================
+#--------VERSION----------------------------------------------------------------
+VERSIONSTRING   = "BuildStats v. {} by Jari í Hjøllum, 2025".format(VERSION)
+#========Verbose/Debugging output===============================================
+VERBOSE = True
+#========FILES - DO CHANGE==============================================
+#===INPUT FILES===
+inbasepath        = "../output/"
+datafile          = "far2024-12-01.nc"
+fields            = [] # e.g. ["zeta","velocity","temp"]
+percentiles       = fvcomdata.STATSPERCENTILES
+force             = 0
+#========AUTOMATED - DO NOT CHANGE==============================================
+indatafilefull      = inbasepath+datafile
+#========PRINT==================================================================
+print(VERSIONSTRING)
+if (VERBOSE):
+    print("Data file     : {}".format(indatafilefull))
+#========PROGRAM==================================================================
+d = FVCOMData()
+d.loadFile(indatafilefull)
+d.buildStats(fields if (len(fields) > 0) else None, percentiles, force==1)
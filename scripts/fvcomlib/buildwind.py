@@ -83,6 +83,8 @@ T_ZERO      = "MJD"
 # TIME_ZONE Use either 'none' or 'UTC' here. 'none' is recommended.
 TIME_ZONE   = 'none'
 timestepsperday = 24
+NcCompress      = 0 # zlib-compress the wind variables in the NetCDF file (NETCDF4 format)
+CDLExport       = 0 # Debug: Also write the forcing as a CDL text file (windfile).
 
 
 if ("basepath" in params):         basepath         = params["basepath"]
@@ -95,6 +97,8 @@ if ("T0" in params ):              T0               = float(params["T0"])
 if ("T9" in params ):              T9               = float(params["T9"])
 if ("timestepsperday" in params ): timestepsperday  = float(params["timestepsperday"])
 if ("saveimages" in params ):      saveimages       = int(params["saveimages"])
+if ("nccompress" in params ):      NcCompress       = int(params["nccompress"])
+if ("cdlexport" in params ):       CDLExport        = int(params["cdlexport"])
 
 
 #--------AUTOMATED---------------------------------------------------------------
@@ -518,78 +522,95 @@ if (run==1):
 
 
 
-    #Read header file
-    header = io.getFileContent(headerfilefull)
-    header = header.replace("##Casename##",casename)
-    header = header.replace("##node##",str(node))
-    header = header.replace("##nele##",str(nele))
-    header = header.replace("##timenodes##",str(TN))
-    header = header.replace("##time_zone##",TIME_ZONE)
-    header = header.replace("##VersionString##",VersionString)
-    header = header.replace("##ThisFileString##",ThisFileString)
-
-
-
-    data = "\tdata: \n"
-
-
-    xnele = nele
-    if (DEBUG):
-        xnele = 20
-
-
-    #===TIME================================================
-    time = ""
-    x = []
-    for i in range (TN):
-        x.append(TimeFloatStrMask.format(T[i])+", ")
-    time = ("".join(x)).strip()
-    time = u.replaceLastChar(time,";")
-    time = "\t\ttime = \n\t\t"+time
-
-    #===ITIME================================================
-    Itime = ""
-    x = []
-    for i in range (TN):
-        x.append("{:.0f}".format(T[i])+", ")
-    Itime = ("".join(x)).strip()
-    Itime = u.replaceLastChar(Itime,";")
-    Itime = "\t\tItime = \n\t\t"+Itime
-
-    #===ITIME2================================================
-    Itime2 = ""
-    x = []
-    for i in range (TN):
-        x.append("{:.0f}".format(T[i]*u.MILLISECONDSPERDAY)+", ")
-    Itime2 = ("".join(x)).strip()
-    Itime2 = u.replaceLastChar(Itime2,";")
-    Itime2 = "\t\tItime2 = \n\t\t"+Itime2
-
+    # Write the NetCDF file directly from the arrays
     if (Mode == "simple" or Mode == "csv"):
-        #===UWIND_SPEED====================================================
-        uwind_speed = u.generateDataSeries("uwind_speed",WX,TN,xnele,WindFloatStrMask) # Mask should be "{:.4f}" or similar
-
-        #===VWIND_SPEED====================================================
-        vwind_speed = u.generateDataSeries("vwind_speed",WY,TN,xnele,WindFloatStrMask) # Mask should be "{:.4f}" or similar
+        # Same wind for all elements
+        UW = np.broadcast_to(np.asarray(WX,dtype=float)[np.newaxis,:],(nele,TN))
+        VW = np.broadcast_to(np.asarray(WY,dtype=float)[np.newaxis,:],(nele,TN))
     elif (Mode == "ecmwf"):
-        uwind_speed = u.generateDataSeries2D("uwind_speed",WX,WindFloatStrMask) # Mask
-        vwind_speed = u.generateDataSeries2D("vwind_speed",WY,WindFloatStrMask) # Mask
-
-
-
-
-    data = data  +"\n"+time+"\n\n"+Itime+"\n\n"+Itime2+"\n\n"
-    data = data  +uwind_speed+"\n\n"+vwind_speed+"\n\n"
-    out = header.replace("##data##",data)
-
-    print("Writing to file: {}...".format(windfilefull))
-    io.writeFile(windfilefull,out)
-
-
-    print("Generating NetCDF file: {} ...".format(ncwindfilefull))
-    cmd = "ncgen -b {} -o {}".format(windfilefull,ncwindfilefull)
-
-    os.system(cmd)
+        UW = WX
+        VW = WY
+    # if END
+    globalattrs = {
+        "title"            : "'AN FVCOM CASE DESCRIPTION' - note string must be in 'quotes'",
+        "institution"      : "VSF",
+        "source"           : "FVCOM grid (unstructured) surface forcing",
+        "history"          : "N/A",
+        "CoordinateSystem" : "Cartesian",
+        "Version"          : VersionString,
+        "ThisFile"         : ThisFileString
+    }
+    io.writeForcingNetCDF(ncwindfilefull,np.asarray(T,dtype=float),{"uwind_speed": UW, "vwind_speed": VW},nele,node,globalattrs,TIME_ZONE,24,(NcCompress==1))
+    #
+    # Debug export: CDL text file
+    if (CDLExport==1):
+        #Read header file
+        header = io.getFileContent(headerfilefull)
+        header = header.replace("##Casename##",casename)
+        header = header.replace("##node##",str(node))
+        header = header.replace("##nele##",str(nele))
+        header = header.replace("##timenodes##",str(TN))
+        header = header.replace("##time_zone##",TIME_ZONE)
+        header = header.replace("##VersionString##",VersionString)
+        header = header.replace("##ThisFileString##",ThisFileString)
+
+
+
+        data = "\tdata: \n"
+
+
+        xnele = nele
+        if (DEBUG):
+            xnele = 20
+
+
+        #===TIME================================================
+        time = ""
+        x = []
+        for i in range (TN):
+            x.append(TimeFloatStrMask.format(T[i])+", ")
+        time = ("".join(x)).strip()
+        time = u.replaceLastChar(time,";")
+        time = "\t\ttime = \n\t\t"+time
+
+        #===ITIME================================================
+        Itime = ""
+        x = []
+        for i in range (TN):
+            x.append("{:.0f}".format(T[i])+", ")
+        Itime = ("".join(x)).strip()
+        Itime = u.replaceLastChar(Itime,";")
+        Itime = "\t\tItime = \n\t\t"+Itime
+
+        #===ITIME2================================================
+        Itime2 = ""
+        x = []
+        for i in range (TN):
+            x.append("{:.0f}".format(T[i]*u.MILLISECONDSPERDAY)+", ")
+        Itime2 = ("".join(x)).strip()
+        Itime2 = u.replaceLastChar(Itime2,";")
+        Itime2 = "\t\tItime2 = \n\t\t"+Itime2
+
+        if (Mode == "simple" or Mode == "csv"):
+            #===UWIND_SPEED====================================================
+            uwind_speed = u.generateDataSeries("uwind_speed",WX,TN,xnele,WindFloatStrMask) # Mask should be "{:.4f}" or similar
+
+            #===VWIND_SPEED====================================================
+            vwind_speed = u.generateDataSeries("vwind_speed",WY,TN,xnele,WindFloatStrMask) # Mask should be "{:.4f}" or similar
+        elif (Mode == "ecmwf"):
+            uwind_speed = u.generateDataSeries2D("uwind_speed",WX,WindFloatStrMask) # Mask
+            vwind_speed = u.generateDataSeries2D("vwind_speed",WY,WindFloatStrMask) # Mask
+
+
+
+
+        data = data  +"\n"+time+"\n\n"+Itime+"\n\n"+Itime2+"\n\n"
+        data = data  +uwind_speed+"\n\n"+vwind_speed+"\n\n"
+        out = header.replace("##data##",data)
+
+        print("Writing to file: {}...".format(windfilefull))
+        io.writeFile(windfilefull,out)
+    # if CDLExport END
 
 
     print("\n=====Config (for Case / NML file)::=====")
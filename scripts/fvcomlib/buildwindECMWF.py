@@ -67,9 +67,15 @@ heatingfile     = "buildwindECMWF_base_heating.cdl" #Input file, NetCDF header,
 windfile        = "fvcom_lgr_san_wnd.cdl" #Output file for NetCDF generation
 ncwindfile      = "fvcom_lgr_san_wnd.nc" #Output file for NetCDF generation
 SaveImages      = 0 #
+PlotAnimate     = 1 # SaveImages: keep one figure per plotted field and only update its data between time steps.
 HeatingActive   = 0 # Generate Heating Forcing into the nc-file
 PrintParams     = 0
 MappingMethod   = "gauss"
+NcCompress      = 0 # zlib-compress the forcing variables in the NetCDF file (NETCDF4 format)
+NcChunk         = 24 # Number of time steps written to the NetCDF file per chunk
+CDLExport       = 0 # Debug: Also write the forcing as a CDL text file (windfile). Slow and memory hungry.
+MapCache        = 1 # Cache GRIB->FVCOM maps and weights (.npz) between runs. Rebuilt automatically on grid/GRIB/method change.
+mapcachefile    = "fvcom_lgr_san_fgmap-{}-{}.npz" # Map cache file mask (maptype, method)
 WindDirMod360   = 1
 TempSeaMin      = 5  # The minimum temperature of the sea water
 TempSeaMax      = 12 # The maximum temperature of the sea water
@@ -106,9 +112,15 @@ if ("T0" in params ):              T0               = float(params["T0"])
 if ("T9" in params ):              T9               = float(params["T9"])
 if ("timestepsperday" in params ): timestepsperday  = float(params["timestepsperday"])
 if ("saveimages" in params ):      SaveImages       = int(params["saveimages"])
+if ("plotanimate" in params ):     PlotAnimate      = int(params["plotanimate"])
 if ("heatingactive" in params ):   HeatingActive    = int(params["heatingactive"])
 if ("printparams" in params ):     PrintParams      = int(params["printparams"])
 if ("mappingmethod" in params ):   MappingMethod    = params["mappingmethod"]
+if ("nccompress" in params ):      NcCompress       = int(params["nccompress"])
+if ("ncchunk" in params ):         NcChunk          = int(params["ncchunk"])
+if ("cdlexport" in params ):       CDLExport        = int(params["cdlexport"])
+if ("mapcache" in params ):        MapCache         = int(params["mapcache"])
+if ("mapcachefile" in params ):    mapcachefile     = params["mapcachefile"]
 if ("winddirmod360" in params ):   WindDirMod360    = int(params["winddirmod360"])
 if ("verbose" in params ):         Verbose          = int(params["verbose"])
 if ("exp1" in params ):            Exp1             = int(params["exp1"])
@@ -131,9 +143,15 @@ if (PrintParams==1):
     print(pp.format("T9",T9))
     print(pp.format("timestepsperday",timestepsperday))
     print(pp.format("saveimages",SaveImages))
+    print(pp.format("plotanimate",PlotAnimate))
     print(pp.format("heatingactive",HeatingActive))
     print(pp.format("printparams",PrintParams))
     print(pp.format("mappingmethod",MappingMethod))
+    print(pp.format("nccompress",NcCompress))
+    print(pp.format("ncchunk",NcChunk))
+    print(pp.format("cdlexport",CDLExport))
+    print(pp.format("mapcache",MapCache))
+    print(pp.format("mapcachefile",mapcachefile))
     print(pp.format("winddirmod360",WindDirMod360))
     print(pp.format("verbose",Verbose))
     print(pp.format("exp1",Exp1))
@@ -152,6 +170,7 @@ headerfilefull  = headerfile # Should be in same path as this py file.
 heatingfilefull = heatingfile # Should be in same path as this py file.
 windfilefull    = u.addFileToPath(basepath,windfile) # Output file
 ncwindfilefull  = u.addFileToPath(basepath,ncwindfile) # Output NC file
+mapcachefilefull= u.addFileToPath(basepath,mapcachefile) # Map cache file mask
 
 
 #========================================================================================
@@ -319,7 +338,12 @@ if (Mode == "ecmwf"):
     # FVCOM to GRIB MAP
     print("Creating element mapping from GRIB to FVCOM ...")
     fgemap = FvcomGribMap(fvcomgrd,gdr)
-    fgemap.buildElementMap()
+    fgemap.setPlotAnimate(PlotAnimate==1)
+    if (MapCache==1):
+        fgemap.buildMapCached("ele",MappingMethod,mapcachefilefull.format("ele",MappingMethod))
+    else:
+        fgemap.buildElementMap()
+    # if END
     fgemap.transmapWindPolar(MappingMethod)
     #
     #print("Calculating WX and WY ...")
@@ -359,7 +383,12 @@ if (Mode == "ecmwf"):
     # GENERATION OF NODE FORCING
     print("Creating node mapping from GRIB to FVCOM ...")
     fgnmap = FvcomGribMap(fvcomgrd,gdr) #
-    fgnmap.buildNodeMap()
+    fgnmap.setPlotAnimate(PlotAnimate==1)
+    if (MapCache==1):
+        fgnmap.buildMapCached("node",MappingMethod,mapcachefilefull.format("node",MappingMethod))
+    else:
+        fgnmap.buildNodeMap()
+    # if END
     gdr.printFieldSummary()
 
     if (HeatingActive == 1):
@@ -367,8 +396,7 @@ if (Mode == "ecmwf"):
         fieldList = ['mslp', 't2','cdrx','tpx']
         MSLP, T2, CDRX, TPX = fgnmap.transmapNodeValues(fieldList,MappingMethod)
         #
-        # Element-Node values
-        fgemap.buildEleToNodeMap()
+        # Element-Node values (area-weighted element->node operator on the grid)
         WS_EN=fgemap.transmapEleToNodeValues(["ws"])
 
 
@@ -466,123 +494,142 @@ run = 1
 if (run==1):
     print(VersionString)
 
-    #Read header file
-    header = io.getFileContent(headerfilefull)
-    header = header.replace("##Casename##",casename)
-    header = header.replace("##node##",str(node))
-    header = header.replace("##nele##",str(nele))
-    header = header.replace("##timenodes##",str(TN))
-    header = header.replace("##time_zone##",TIME_ZONE)
-    header = header.replace("##VersionString##",VersionString)
-    header = header.replace("##ThisFileString##",ThisFileString)
+    # Write the NetCDF file directly from the arrays
+    forcingfields = {"uwind_speed": WX, "vwind_speed": WY}
     if (HeatingActive==1):
-        header = header.replace("##HeatingFields##",io.getFileContent(heatingfilefull))
-    else:
-        header = header.replace("##HeatingFields##","")
+        forcingfields["air_temperature"] = AT
+        forcingfields["short_wave"]      = SW
+        forcingfields["long_wave"]       = LW
+        forcingfields["air_pressure"]    = AP
+        forcingfields["net_heat_flux"]   = NHF
+        forcingfields["precip"]          = PRE
+        forcingfields["evap"]            = EVA
     # if END
+    globalattrs = {
+        "title"            : "'AN FVCOM CASE DESCRIPTION' - note string must be in 'quotes'",
+        "institution"      : "VSF",
+        "source"           : "FVCOM grid (unstructured) surface forcing",
+        "history"          : "N/A",
+        "CoordinateSystem" : "Cartesian",
+        "Version"          : VersionString,
+        "ThisFile"         : ThisFileString
+    }
+    io.writeForcingNetCDF(ncwindfilefull,T,forcingfields,nele,node,globalattrs,TIME_ZONE,NcChunk,(NcCompress==1))
+    #
+    # Debug export: CDL text file
+    if (CDLExport==1):
+        #Read header file
+        header = io.getFileContent(headerfilefull)
+        header = header.replace("##Casename##",casename)
+        header = header.replace("##node##",str(node))
+        header = header.replace("##nele##",str(nele))
+        header = header.replace("##timenodes##",str(TN))
+        header = header.replace("##time_zone##",TIME_ZONE)
+        header = header.replace("##VersionString##",VersionString)
+        header = header.replace("##ThisFileString##",ThisFileString)
+        if (HeatingActive==1):
+            header = header.replace("##HeatingFields##",io.getFileContent(heatingfilefull))
+        else:
+            header = header.replace("##HeatingFields##","")
+        # if END
 
 
 
-    data = "\tdata: \n"
+        data = "\tdata: \n"
 
 
-    xnele = nele
-    if (DEBUG):
-        xnele = 20
+        xnele = nele
+        if (DEBUG):
+            xnele = 20
 
 
-    #===TIME================================================
-    time = ""
-    x = []
-    for i in range (TN):
-        x.append(TimeFloatStrMask.format(T[i])+", ")
-    time = ("".join(x)).strip()
-    time = u.replaceLastChar(time,";")
-    time = "\t\ttime = \n\t\t"+time
+        #===TIME================================================
+        time = ""
+        x = []
+        for i in range (TN):
+            x.append(TimeFloatStrMask.format(T[i])+", ")
+        time = ("".join(x)).strip()
+        time = u.replaceLastChar(time,";")
+        time = "\t\ttime = \n\t\t"+time
 
-    #===ITIME================================================
-    Itime = ""
-    x = []
-    for i in range (TN):
-        x.append("{:.0f}".format(T[i])+", ")
-    Itime = ("".join(x)).strip()
-    Itime = u.replaceLastChar(Itime,";")
-    Itime = "\t\tItime = \n\t\t"+Itime
+        #===ITIME================================================
+        Itime = ""
+        x = []
+        for i in range (TN):
+            x.append("{:.0f}".format(T[i])+", ")
+        Itime = ("".join(x)).strip()
+        Itime = u.replaceLastChar(Itime,";")
+        Itime = "\t\tItime = \n\t\t"+Itime
 
-    #===ITIME2================================================
-    Itime2 = ""
-    x = []
-    for i in range (TN):
-        x.append("{:.0f}".format(T[i]*u.MILLISECONDSPERDAY)+", ")
-    Itime2 = ("".join(x)).strip()
-    Itime2 = u.replaceLastChar(Itime2,";")
-    Itime2 = "\t\tItime2 = \n\t\t"+Itime2
+        #===ITIME2================================================
+        Itime2 = ""
+        x = []
+        for i in range (TN):
+            x.append("{:.0f}".format(T[i]*u.MILLISECONDSPERDAY)+", ")
+        Itime2 = ("".join(x)).strip()
+        Itime2 = u.replaceLastChar(Itime2,";")
+        Itime2 = "\t\tItime2 = \n\t\t"+Itime2
 
-    uwind_speed = u.generateDataSeries2D("uwind_speed",WX,WindFloatStrMask) # Mask
-    vwind_speed = u.generateDataSeries2D("vwind_speed",WY,WindFloatStrMask) # Mask
-    #
-    if (HeatingActive==1):
-        air_temperature = u.generateDataSeries2D("air_temperature",AT,WindFloatStrMask) # Mask
-        short_wave = u.generateDataSeries2D("short_wave",SW,SciFloatStrMask) # Mask
-        long_wave = u.generateDataSeries2D("long_wave",LW,SciFloatStrMask) # Mask
-        air_pressure = u.generateDataSeries2D("air_pressure",AP,SciFloatStrMask) # Mask
-        net_heat_flux = u.generateDataSeries2D("net_heat_flux",NHF,SciFloatStrMask) # Mask
-        precip = u.generateDataSeries2D("precip",PRE,SciFloatStrMask) # Mask
-        evap = u.generateDataSeries2D("evap",EVA,SciFloatStrMask) # Mask
-
-    if (DEBUG):
-        i=uwind_speed.find("\n",100)
-        uwind_speed = uwind_speed[0:i-1]+";"
-        i=vwind_speed.find("\n",100)
-        vwind_speed = vwind_speed[0:i-1]+";"
+        uwind_speed = u.generateDataSeries2D("uwind_speed",WX,WindFloatStrMask) # Mask
+        vwind_speed = u.generateDataSeries2D("vwind_speed",WY,WindFloatStrMask) # Mask
         #
         if (HeatingActive==1):
-            i=air_temperature.find("\n",100)
-            air_temperature = air_temperature[0:i-1]+";"
-            i=short_wave.find("\n",100)
-            short_wave = short_wave[0:i-1]+";"
-            i=long_wave.find("\n",100)
-            long_wave = long_wave[0:i-1]+";"
-            i=long_wave.find("\n",100)
-            long_wave = long_wave[0:i-1]+";"
-            i=air_pressure.find("\n",100)
-            air_pressure = air_pressure[0:i-1]+";"
-            i=net_heat_flux.find("\n",100)
-            net_heat_flux = net_heat_flux[0:i-1]+";"
-            i=precip.find("\n",100)
-            precip = precip[0:i-1]+";"
-            i=evap.find("\n",100)
-            evap = evap[0:i-1]+";"
-
+            air_temperature = u.generateDataSeries2D("air_temperature",AT,WindFloatStrMask) # Mask
+            short_wave = u.generateDataSeries2D("short_wave",SW,SciFloatStrMask) # Mask
+            long_wave = u.generateDataSeries2D("long_wave",LW,SciFloatStrMask) # Mask
+            air_pressure = u.generateDataSeries2D("air_pressure",AP,SciFloatStrMask) # Mask
+            net_heat_flux = u.generateDataSeries2D("net_heat_flux",NHF,SciFloatStrMask) # Mask
+            precip = u.generateDataSeries2D("precip",PRE,SciFloatStrMask) # Mask
+            evap = u.generateDataSeries2D("evap",EVA,SciFloatStrMask) # Mask
+
+        if (DEBUG):
+            i=uwind_speed.find("\n",100)
+            uwind_speed = uwind_speed[0:i-1]+";"
+            i=vwind_speed.find("\n",100)
+            vwind_speed = vwind_speed[0:i-1]+";"
+            #
+            if (HeatingActive==1):
+                i=air_temperature.find("\n",100)
+                air_temperature = air_temperature[0:i-1]+";"
+                i=short_wave.find("\n",100)
+                short_wave = short_wave[0:i-1]+";"
+                i=long_wave.find("\n",100)
+                long_wave = long_wave[0:i-1]+";"
+                i=long_wave.find("\n",100)
+                long_wave = long_wave[0:i-1]+";"
+                i=air_pressure.find("\n",100)
+                air_pressure = air_pressure[0:i-1]+";"
+                i=net_heat_flux.find("\n",100)
+                net_heat_flux = net_heat_flux[0:i-1]+";"
+                i=precip.find("\n",100)
+                precip = precip[0:i-1]+";"
+                i=evap.find("\n",100)
+                evap = evap[0:i-1]+";"
+
+            # if END
         # if END
-    # if END
-    #
-    # Accummulate data
-    data = data  +"\n"+time+"\n\n"+Itime+"\n\n"+Itime2+"\n\n"
-    data = data  +uwind_speed+"\n\n" +vwind_speed +"\n\n"
-    if (HeatingActive==1):
-        data = data + air_temperature + "\n\n"
-        data = data + short_wave + "\n\n"
-        data = data + long_wave + "\n\n"
-        data = data + air_pressure + "\n\n"
-        data = data + net_heat_flux + "\n\n"
-        data = data + precip + "\n\n"
-        data = data + evap + "\n\n"
-    # if END
-    #
-    # Write data into the header template
-    out = header.replace("##data##",data)
-    #
-    # Write to CDL file...
-    print("Writing to file: {} ...".format(windfilefull))
-    io.writeFile(windfilefull,out)
-    print("Writing to file: {} ... DONE.".format(windfilefull))
-    #
-    # Generate the NC file...
-    print("Generating NetCDF file: {} ...".format(ncwindfilefull))
-    cmd = "ncgen -b {} -o {}".format(windfilefull,ncwindfilefull)
-    ret_os = os.system(cmd)
-    print("Generating NetCDF file:  {} ... DONE (Return value: {}).".format(ncwindfilefull,ret_os))
+        #
+        # Accummulate data
+        data = data  +"\n"+time+"\n\n"+Itime+"\n\n"+Itime2+"\n\n"
+        data = data  +uwind_speed+"\n\n" +vwind_speed +"\n\n"
+        if (HeatingActive==1):
+            data = data + air_temperature + "\n\n"
+            data = data + short_wave + "\n\n"
+            data = data + long_wave + "\n\n"
+            data = data + air_pressure + "\n\n"
+            data = data + net_heat_flux + "\n\n"
+            data = data + precip + "\n\n"
+            data = data + evap + "\n\n"
+        # if END
+        #
+        # Write data into the header template
+        out = header.replace("##data##",data)
+        #
+        # Write to CDL file...
+        print("Writing to file: {} ...".format(windfilefull))
+        io.writeFile(windfilefull,out)
+        print("Writing to file: {} ... DONE.".format(windfilefull))
+    # if CDLExport END
     #
     # Write a config header for the *_run_nml file (mostly obsolete)
     #
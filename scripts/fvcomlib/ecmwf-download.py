@@ -4,6 +4,6 @@ DownloadNewData = True
 
 if ( DownloadNewData ):
     e.download_ecmwf_data()
-    e.copyToArchive()
+    e.copyToArchive(58, 66, -18, 0.5) # Also decode the buildwindECMWF area into the GRIB store
 
 
@@ -35,6 +35,8 @@ datafile          = "ulg0005_run05.nc"
 outbasepath       = "./"
 outcsvfile        = "out.dat"
 separator         = " " # columnseparator space ( ), comma (,), semicolon (;), tab (\t)
+stations          = [] # Stations as (x, y) or (lon, lat) pairs, e.g. [(-4213.8, 34138.4)]. If given, used instead of element indices.
+stationcoords     = "xy" # Coordinates of the stations: "xy" or "lonlat"
 #========AUTOMATED - DO NOT CHANGE==============================================
 indatafilefull      = inbasepath+datafile
 outcsvfilefull      = outbasepath+outcsvfile
@@ -45,6 +47,9 @@ if (VERBOSE):
 #========PROGRAM==================================================================
     d = FVCOMData()
     d.loadFile(indatafilefull)
-    d.getData([21,42],['u','v'])
+    if (len(stations) > 0):
+        d.getStationData(stations,['u','v'],coords=stationcoords)
+    else:
+        d.getData([21,42],['u','v'])
     d.exportcsv(outcsvfilefull,separator)
 
@@ -17,6 +17,12 @@ import os.path
 from matplotlib.patches import Rectangle
 import matplotlib as mpl
 import fvcomlibutil as u
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 
 VERBOSE = False
 
@@ -26,6 +32,36 @@ dkNode = 'node'
 dkEle  = 'ele'
 WATERVECTORSCALE = 0.65
 WINDVECTORSCALE = 0.20
+BOUNDSCHUNKBYTES = 256*1024*1024 # Max bytes read per chunk when streaming bounds over the time axis.
+STATSSUFFIX = ".stats.npz"       # Sidecar with precomputed statistics, next to the nc file.
+STATSFIELDS = ["zeta","u","v","ww","temp","salinity","uwind_speed","vwind_speed","velocity","windvelocity"] # Default keys of buildStats()
+STATSPERCENTILES = [1, 5, 25, 50, 75, 95, 99] # Percentiles stored by buildStats()
+STATSSAMPLE = 4000000            # Max values per variable kept for the per-layer and overall percentiles of buildStats().
+FIELDCACHESIZE = 64              # Slices memoized by getFieldSlice()
+dsPoint  = 'point'  # Derived field scopes, see DERIVEDFIELDS
+dsMesh   = 'mesh'
+dsColumn = 'column'
+# Derived fields, evaluated lazily by getFieldSlice()/getFieldBlock(). Each field declares
+#   inputs : nc variables or other derived fields.
+#   scope  : dsPoint  - kernel(*inputs), value by value. Can also be extracted at points (getDataBatch).
+#            dsMesh   - kernel(self, *inputs), needs the whole slice and the mesh.
+#            dsColumn - kernel(self, *inputs), needs all siglays. The result has no siglay.
+#   kernel : vectorized over arrays (time, siglay, space).
+#   kind   : dkNode/dkEle, None: as the first input.
+#   title, unit : for plotting.
+DERIVEDFIELDS = {
+    "velocity"      : { "inputs": ["u","v"],                     "scope": dsPoint,  "kernel": u.calcSpeed,                               "kind": None,  "title": "Water velocity",                 "unit": "m/s" },
+    "windvelocity"  : { "inputs": ["uwind_speed","vwind_speed"], "scope": dsPoint,  "kernel": u.calcSpeed,                               "kind": None,  "title": "Wind velocity",                  "unit": "m/s" },
+    "direction"     : { "inputs": ["u","v"],                     "scope": dsPoint,  "kernel": u.calcDirection,                           "kind": None,  "title": "Water direction (to)",           "unit": "°" },
+    "winddirection" : { "inputs": ["uwind_speed","vwind_speed"], "scope": dsPoint,  "kernel": lambda a, b: u.calcDirection(a, b, True),  "kind": None,  "title": "Wind direction (from)",          "unit": "°" },
+    "density"       : { "inputs": ["temp","salinity"],           "scope": dsPoint,  "kernel": u.calcSeawaterDensity,                     "kind": None,  "title": "Density",                        "unit": "kg/m3" },
+    "vorticity"     : { "inputs": ["u","v"],                     "scope": dsMesh,   "kernel": lambda d, a, b: d.calcVorticity(a, b),     "kind": dkEle, "title": "Vorticity",                      "unit": "1/s" },
+    "u_avg"         : { "inputs": ["u"],                         "scope": dsColumn, "kernel": lambda d, a: d.calcDepthAverage(a),        "kind": None,  "title": "Depth-averaged U-ward velocity", "unit": "m/s" },
+    "v_avg"         : { "inputs": ["v"],                         "scope": dsColumn, "kernel": lambda d, a: d.calcDepthAverage(a),        "kind": None,  "title": "Depth-averaged V-ward velocity", "unit": "m/s" },
+    "velocity_avg"  : { "inputs": ["u_avg","v_avg"],             "scope": dsPoint,  "kernel": u.calcSpeed,                               "kind": None,  "title": "Depth-averaged water velocity",  "unit": "m/s" },
+}
+INDEXEDREADMAX = 64              # Above this many scattered indices, a contiguous slab is read and indexed in memory.
+EXPORTBLOCKROWS = 65536          # Rows (time steps) written per block by the exporters.
 
 
 class FVCOMData:
@@ -38,6 +74,10 @@ class FVCOMData:
         #Variables
         self.filename = ""
         self.fhandle = 0
+        self.stats = {} # Precomputed statistics (bounds), see loadStats()/getVarBounds()
+        self.s_locators = {} # Cached point-in-triangle locators per coordinate kind, see getStationLocator()
+        self.f_cache = {} # Memoized field slices, see getFieldSlice()
+        self.f_mesh = None # Mesh data of the derived field kernels, see getMeshOperators()
         # Data conversion
         self.d_datatitle = None # The data structure for export. Should contain 'd_datatitle' and 'd_data'
         self.d_datahandle      = None # The data structure for export. Should contain 'd_datatitle' and 'd_data'
@@ -133,12 +173,10 @@ class FVCOMData:
 
 
         # === Calculated values
-        self.c_velocity = []
         self.velocity = []
         self.velocity_kind = self.u_kind
         self.velocity_bounds = []
 
-        self.c_windvelocity = []
         self.windvelocity = []
         self.windvelocity_kind = self.uwind_kind
         self.windvelocity_bounds = []
@@ -173,12 +211,20 @@ class FVCOMData:
         self.p_yinch    = 5
 
         self.p_plt=None
+        self.p_animate = False # Reuse figure, mesh, colorbar and quiver between plot() calls (see plotUpdate)
+        self.p_animkind = None
+        self.p_figure = None
+        self.p_ax = None
+        self.p_quiver = None
+        self.p_lagpatches = []
 
         self.p_contourdata = [] # Container for contour data to be plotted.
         self.p_contourkinds = ''
         self.p_contourbounds = []
         self.p_contourunit = ""
         self.p_triangulation = None
+        self.p_boundsmode = "global" # Colour bounds from the stats: "global", "layer" (plotted siglay) or "percentile"
+        self.p_boundspercentiles = [1, 99] # Low and high percentile for p_boundsmode "percentile"
         self.p_colormap=mpl.colormaps['jet'] #mpl.colormaps['turbo'] #mpl.colormaps['jet'] # mpl.colormaps['gist_rainbow'] # mpl.colormaps['plasma'] from https://matplotlib.org/stable/users/explain/colors/colormaps.html
 
         self.p_colormap_overcolorfactor = 1.05
@@ -258,6 +304,10 @@ class FVCOMData:
         print("Sigma layers : {}".format(self.siglay))
         print("Sigma levels : {}".format(self.siglev))
         print("Time steps   : {}".format(self.times))
+        self.s_locators = {}
+        self.f_cache = {}
+        self.f_mesh = None
+        self.loadStats()
 
         if (displayInfo):
             self.displayInfo()
@@ -302,14 +352,600 @@ class FVCOMData:
     # END def displayInfo
 
 
+# =================================================================
+# getStatsFilename()::
+# Returns the filename of the statistics sidecar of the loaded nc file.
+#
+    def getStatsFilename(self):
+        return self.filename + STATSSUFFIX
+    # def END
+
+
+# =================================================================
+# loadStats()::
+# Loads the statistics sidecar into self.stats, if it exists and is
+# not older than the nc file. Otherwise self.stats is left empty.
+#
+    def loadStats(self):
+        self.stats = {}
+        fn = self.getStatsFilename()
+        if ( not os.path.isfile(fn) ):
+            return 0
+        if ( os.path.getmtime(fn) < os.path.getmtime(self.filename) ):
+            print("Statistics file {} is older than {}. Ignored.".format(fn,self.filename))
+            return 0
+        try:
+            with np.load(fn) as f:
+                self.stats = { k : f[k] for k in f.files }
+            print("Statistics loaded from {} ({} entries).".format(fn,len(self.stats)))
+        except Exception as e:
+            print("WARNING: Could not read statistics file {}. [{}]".format(fn,e))
+            self.stats = {}
+        # try END
+        return 0
+    # def END
+
+
+# =================================================================
+# saveStats()::
+# Writes self.stats to the statistics sidecar. Failing to write
+# (e.g. read-only data directory) is not fatal.
+#
+    def saveStats(self):
+        fn = self.getStatsFilename()
+        tmp = fn + ".tmp.npz"
+        try:
+            np.savez(tmp, **self.stats)
+            os.replace(tmp, fn)
+        except Exception as e:
+            print("WARNING: Could not write statistics file {}. [{}]".format(fn,e))
+        # try END
+        return 0
+    # def END
+
+
+# =================================================================
+# getVarBounds()::
+# Returns [min, max] of a variable over all time steps (and layers).
+# The bounds are taken from self.stats when present, see getStatsBounds()
+# for p_boundsmode "layer" and "percentile". Otherwise they are
+# calculated in one streaming pass over time chunks, so at most
+# BOUNDSCHUNKBYTES of the variable is in memory, and stored in the sidecar.
+# Parameters:
+#   key     : name of the bounds in self.stats, e.g. "u" or "velocity".
+#   ncnames : nc variables. One name gives the raw value. Several names
+#             give the magnitude sqrt(a^2 + b^2 + ...), e.g. ["u","v"].
+#             None: key is any nc variable or DERIVEDFIELDS, and missing
+#             bounds are calculated with buildStats().
+#
+    def getVarBounds(self,key,ncnames=None):
+        bounds = self.getStatsBounds(key)
+        if ( bounds is not None ):
+            return bounds
+        kmin = key + "_min"
+        kmax = key + "_max"
+        if ( (kmin in self.stats) and (kmax in self.stats) ):
+            return [ self.stats[kmin][()], self.stats[kmax][()] ]
+        if ( ncnames is None ):
+            self.buildStats([key])
+            if ( kmin not in self.stats ):
+                print("ERROR: No bounds for {}.".format(key))
+                return []
+            return self.getVarBounds(key)
+        # if END
+
+        ncvars = [ self.fhandle.variables[n] for n in ncnames ]
+        shape = ncvars[0].shape
+        nt = shape[0]
+        stepbytes = max(1, int(np.prod(shape[1:])) * ncvars[0].dtype.itemsize * len(ncvars))
+        chunk = max(1, BOUNDSCHUNKBYTES // stepbytes)
+
+        vmin = None
+        vmax = None
+        imin = 0
+        imax = 0
+        for t0 in range(0, nt, chunk):
+            t1 = min(nt, t0 + chunk)
+            if ( len(ncvars)==1 ):
+                a = ncvars[0][t0:t1]
+            else:
+                a = np.sqrt(np.sum([ np.square(v[t0:t1]) for v in ncvars ], axis=0))
+            # if END
+            cmin = np.min(a)
+            cmax = np.max(a)
+            if ( (vmin is None) or (cmin < vmin) ):
+                vmin = cmin
+                imin = t0 * int(np.prod(shape[1:])) + int(np.argmin(a, axis=None))
+            if ( (vmax is None) or (cmax > vmax) ):
+                vmax = cmax
+                imax = t0 * int(np.prod(shape[1:])) + int(np.argmax(a, axis=None))
+        # for END
+
+        self.stats[kmin] = np.array(vmin)
+        self.stats[kmax] = np.array(vmax)
+        self.stats[key + "_argmin"] = np.array(np.unravel_index(imin, shape))
+        self.stats[key + "_argmax"] = np.array(np.unravel_index(imax, shape))
+        self.saveStats()
+        return [ self.stats[kmin][()], self.stats[kmax][()] ]
+    # def END
+
+
+# =================================================================
+# getStatsBounds()::
+# Returns the colour bounds of key for p_boundsmode "layer" (min/max of
+# the plotted siglay) or "percentile" (p_boundspercentiles of all values),
+# if buildStats() has stored them. Returns None otherwise, and for the
+# "global" mode, which is handled by getVarBounds().
+#
+    def getStatsBounds(self,key):
+        if ( self.p_boundsmode == "layer" ):
+            if ( (key + "_layer_min") not in self.stats ):
+                return None
+            lmin = self.stats[key + "_layer_min"]
+            lmax = self.stats[key + "_layer_max"]
+            k = min(self.p_siglaystep, len(lmin) - 1)
+            return [ lmin[k], lmax[k] ]
+        # if END
+        if ( self.p_boundsmode == "percentile" ):
+            if ( ((key + "_pct") not in self.stats) or ("percentiles" not in self.stats) ):
+                return None
+            q = self.stats["percentiles"]
+            pct = self.stats[key + "_pct"]
+            return [ np.interp(self.p_boundspercentiles[0], q, pct), np.interp(self.p_boundspercentiles[1], q, pct) ]
+        # if END
+        return None
+    # def END
+
+
+# =================================================================
+# calcVarStats()::
+# Calculates the statistics of one variable in a single streaming pass
+# over time chunks (at most BOUNDSCHUNKBYTES in memory) and stores them
+# in self.stats. With L siglays (1 for 2-D variables), nt time steps and
+# nq percentiles the entries are:
+#   key_min, key_max, key_mean       : over all values
+#   key_argmin, key_argmax           : index of min/max in the nc variable
+#   key_step_min/_max/_mean (nt, L)  : per time step and siglay
+#   key_step_pct (nt, L, nq)         : per time step and siglay
+#   key_layer_min/_max/_mean (L)     : per siglay
+#   key_layer_pct (L, nq), key_pct (nq)
+# The per-layer and overall percentiles are taken from an evenly strided
+# sample of at most STATSSAMPLE values, the others are exact.
+# Parameters:
+#   key : nc variable or DERIVEDFIELDS, e.g. "u" or "velocity".
+#   q   : percentiles (0-100).
+#
+    def calcVarStats(self,key,q):
+        ncvars = [ self.fhandle.variables[n] for n in self.getFieldInputs(key) ]
+        layered = self.getFieldLayered(key)
+        nt = ncvars[0].shape[0]
+        nl = self.fhandle.dimensions['siglay'].size if ( layered ) else 1
+        ns = ncvars[0].shape[-1]
+        stepbytes = max(1, max(v.shape[1] if ( len(v.shape)==3 ) else 1 for v in ncvars) * ns * 8 * len(ncvars))
+        chunk = max(1, BOUNDSCHUNKBYTES // stepbytes)
+        stride = max(1, int(math.ceil(nt * nl * ns / STATSSAMPLE)))
+
+        smin = np.zeros((nt, nl))
+        smax = np.zeros((nt, nl))
+        ssum = np.zeros((nt, nl))
+        scount = np.zeros((nt, nl), dtype=np.int64)
+        spct = np.zeros((nt, nl, len(q)))
+        samples = []
+        for t0 in range(0, nt, chunk):
+            t1 = min(nt, t0 + chunk)
+            a = self.getFieldBlock(key, t0, t1)
+            smin[t0:t1] = np.nanmin(a, axis=2)
+            smax[t0:t1] = np.nanmax(a, axis=2)
+            ssum[t0:t1] = np.nansum(a, axis=2, dtype=np.float64)
+            if ( np.isnan(a).any() ):
+                scount[t0:t1] = np.sum(~np.isnan(a), axis=2)
+                spct[t0:t1] = np.moveaxis(np.nanpercentile(a, q, axis=2), 0, -1)
+            else:
+                scount[t0:t1] = ns
+                spct[t0:t1] = np.moveaxis(np.percentile(a, q, axis=2), 0, -1)
+            # if END
+            # Every stride'th value of each layer, counted over the whole time axis.
+            start = (-t0 * ns) % stride
+            samples.append(a.transpose(1, 0, 2).reshape(nl, -1)[:, start::stride])
+            print("Statistics {}: time steps {}-{} of {}.".format(key, t0, t1-1, nt))
+        # for END
+        samples = np.concatenate(samples, axis=1)
+
+        # The location of min/max: the step and layer are known, only that slice is read again.
+        for (name, sval, argf) in [ ("argmin", smin, np.nanargmin), ("argmax", smax, np.nanargmax) ]:
+            (it, il) = np.unravel_index(argf(sval), sval.shape)
+            ie = argf(self.getFieldBlock(key, it, it + 1)[0, il])
+            self.stats[key + "_" + name] = np.array([it, il, ie] if ( layered ) else [it, ie])
+        # for END
+
+        self.stats[key + "_min"] = np.array(np.nanmin(smin))
+        self.stats[key + "_max"] = np.array(np.nanmax(smax))
+        self.stats[key + "_mean"] = np.array(np.sum(ssum) / max(1, np.sum(scount)))
+        self.stats[key + "_step_min"] = smin
+        self.stats[key + "_step_max"] = smax
+        self.stats[key + "_step_mean"] = ssum / np.maximum(scount, 1)
+        self.stats[key + "_step_pct"] = spct
+        self.stats[key + "_layer_min"] = np.nanmin(smin, axis=0)
+        self.stats[key + "_layer_max"] = np.nanmax(smax, axis=0)
+        self.stats[key + "_layer_mean"] = np.sum(ssum, axis=0) / np.maximum(np.sum(scount, axis=0), 1)
+        self.stats[key + "_layer_pct"] = np.moveaxis(np.nanpercentile(samples, q, axis=1), 0, -1)
+        self.stats[key + "_pct"] = np.nanpercentile(samples, q)
+        return 0
+    # def END
+
+
+# =================================================================
+# buildStats()::
+# Builds the statistics sidecar of the loaded nc file: min, max, mean and
+# percentiles per variable, per siglay and per time step (see
+# calcVarStats()), in one streaming pass per variable. Once written,
+# loadFile() picks it up and getVarBounds() returns the bounds without
+# reading the data.
+# Parameters:
+#   keys        : nc variables or DERIVEDFIELDS.
+#                 Default STATSFIELDS. Variables not in the file are skipped.
+#   percentiles : percentiles (0-100). Default STATSPERCENTILES.
+#   force       : recalculate keys which already have full statistics.
+#
+    def buildStats(self,keys=None,percentiles=None,force=False):
+        if ( keys is None ):
+            keys = STATSFIELDS
+        if ( percentiles is None ):
+            percentiles = STATSPERCENTILES
+        q = np.asarray(percentiles, dtype=float)
+        if ( ("percentiles" in self.stats) and not np.array_equal(self.stats["percentiles"], q) ):
+            force = True
+        self.stats["percentiles"] = q
+
+        t = time.time()
+        for key in keys:
+            missing = [ n for n in self.getFieldInputs(key) if n not in self.fhandle.variables ]
+            if ( len(missing) > 0 ):
+                print("WARNING: {} not found in dataset. No statistics for {}.".format(", ".join(missing), key))
+                continue
+            # if END
+            if ( (not force) and ((key + "_step_pct") in self.stats) ):
+                continue
+            self.calcVarStats(key, q)
+        # for END
+        self.saveStats()
+        print("Statistics written to {} ({:.1f} s) ... DONE".format(self.getStatsFilename(), time.time() - t))
+        return 0
+    # def END
+
+
+# =================================================================
+# getFieldLayered()::
+# True if the field (nc variable or DERIVEDFIELDS) has a siglay axis.
+#
+    def getFieldLayered(self,name):
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            return len(self.fhandle.variables[name].dimensions) == 3
+        if ( f["scope"] == dsColumn ):
+            return False
+        return any(self.getFieldLayered(n) for n in f["inputs"])
+    # def END
+
+
+# =================================================================
+# getFieldKind()::
+# Returns dkNode or dkEle for a field (nc variable or DERIVEDFIELDS).
+#
+    def getFieldKind(self,name):
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            return dkNode if ( 'node' in self.fhandle.variables[name].dimensions ) else dkEle
+        if ( f["kind"] is not None ):
+            return f["kind"]
+        return self.getFieldKind(f["inputs"][0])
+    # def END
+
+
+# =================================================================
+# getFieldInputs()::
+# Returns the nc variables a field (nc variable or DERIVEDFIELDS) is
+# evaluated from.
+#
+    def getFieldInputs(self,name):
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            return [name]
+        return list(dict.fromkeys(n for i in f["inputs"] for n in self.getFieldInputs(i)))
+    # def END
+
+
+# =================================================================
+# getPointInputs()::
+# Returns the nc variables of a field that can be evaluated value by value
+# (an nc variable, or a dsPoint field of nc variables), see evalPointField().
+# Returns None for fields that need the mesh or the water column.
+#
+    def getPointInputs(self,name):
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            return [name]
+        if ( (f["scope"] == dsPoint) and all((n not in DERIVEDFIELDS) for n in f["inputs"]) ):
+            return f["inputs"]
+        return None
+    # def END
+
+
+# =================================================================
+# evalPointField()::
+# Evaluates a field from the values of its getPointInputs() (any shape).
+#
+    def evalPointField(self,name,inputs):
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            return inputs[0]
+        return f["kernel"](*inputs)
+    # def END
+
+
+# =================================================================
+# evalField()::
+# Evaluates a field (nc variable or DERIVEDFIELDS) for time steps t0..t1-1
+# and the given siglays as an array (time, siglay, space). Fields without
+# a siglay axis have siglay length 1. Inputs are evaluated recursively and
+# every result is memoized in cache, keyed by the slice it covers.
+#
+    def evalField(self,name,t0,t1,siglays,cache):
+        layered = self.getFieldLayered(name)
+        key = (name, t0, t1, tuple(int(k) for k in siglays) if ( layered ) else None)
+        if ( key in cache ):
+            return cache[key]
+        f = DERIVEDFIELDS.get(name)
+        if ( f is None ):
+            var = self.fhandle.variables[name]
+            if ( not layered ):
+                a = var[t0:t1, :][:, np.newaxis, :]
+            elif ( np.array_equal(siglays, np.arange(siglays[0], siglays[-1] + 1)) ):
+                a = var[t0:t1, int(siglays[0]):int(siglays[-1]) + 1, :]
+            else:
+                a = var[t0:t1, list(siglays), :]
+            # if END
+            a = np.ma.filled(a, np.nan)
+        elif ( f["scope"] == dsColumn ):
+            alllayers = np.arange(self.fhandle.dimensions['siglay'].size)
+            a = f["kernel"](self, *[ self.evalField(n, t0, t1, alllayers, cache) for n in f["inputs"] ])
+        elif ( f["scope"] == dsMesh ):
+            a = f["kernel"](self, *[ self.evalField(n, t0, t1, siglays, cache) for n in f["inputs"] ])
+        else:
+            a = f["kernel"](*[ self.evalField(n, t0, t1, siglays, cache) for n in f["inputs"] ])
+        # if END
+        cache[key] = a
+        return a
+    # def END
+
+
+# =================================================================
+# getFieldSlice()::
+# Returns a field (nc variable or DERIVEDFIELDS) at one time step and
+# siglay (ignored for fields without siglays) as a 1-D array over the
+# nodes or elements. Only that slice of the inputs is read and the
+# FIELDCACHESIZE most recent slices (inputs included) are memoized, so
+# e.g. velocity and direction at the same slice read u and v once.
+#
+    def getFieldSlice(self,name,timestep,siglay=0):
+        a = self.evalField(name, timestep, timestep + 1, [siglay], self.f_cache)
+        while ( len(self.f_cache) > FIELDCACHESIZE ):
+            del self.f_cache[next(iter(self.f_cache))]
+        return a[0, 0]
+    # def END
+
+
+# =================================================================
+# getFieldBlock()::
+# Returns a field (nc variable or DERIVEDFIELDS) for time steps t0..t1-1
+# as an array (time, siglay, space), see evalField(). Not memoized.
+# Parameters:
+#   siglays : list of siglays. Default: all.
+#
+    def getFieldBlock(self,name,t0,t1,siglays=None):
+        if ( siglays is None ):
+            siglays = np.arange(self.fhandle.dimensions['siglay'].size)
+        return self.evalField(name, t0, t1, np.asarray(siglays, dtype=int), {})
+    # def END
+
+
+# =================================================================
+# getMeshOperators()::
+# Returns the mesh data used by the dsMesh and dsColumn kernels, read and
+# calculated once per file:
+#   nv         : (nele, 3) nodes of the elements (0-based)
+#   area       : (nele) element areas
+#   nodearea   : (node) sum of the areas of the elements around each node
+#   dndx, dndy : (nele, 3) gradients of the linear shape functions
+#   dsignode, dsigele : (siglay, node/nele) sigma layer thickness (sums to 1)
+#
+    def getMeshOperators(self):
+        if ( self.f_mesh is not None ):
+            return self.f_mesh
+        x = np.asarray(self.fhandle.variables['x'][:], dtype=float)
+        y = np.asarray(self.fhandle.variables['y'][:], dtype=float)
+        nv = np.transpose(np.asarray(self.fhandle.variables['nv'][:], dtype=int) - 1)
+        xe = x[nv]
+        ye = y[nv]
+        area2 = (xe[:,1] - xe[:,0]) * (ye[:,2] - ye[:,0]) - (xe[:,2] - xe[:,0]) * (ye[:,1] - ye[:,0])
+        dndx = np.column_stack([ye[:,1] - ye[:,2], ye[:,2] - ye[:,0], ye[:,0] - ye[:,1]]) / area2[:, np.newaxis]
+        dndy = np.column_stack([xe[:,2] - xe[:,1], xe[:,0] - xe[:,2], xe[:,1] - xe[:,0]]) / area2[:, np.newaxis]
+        area = 0.5 * np.abs(area2)
+        nodearea = np.bincount(nv.ravel(), weights=np.repeat(area, 3), minlength=len(x))
+
+        nsiglay = self.fhandle.dimensions['siglay'].size
+        if ( 'siglev' in self.fhandle.variables ):
+            siglev = np.asarray(self.fhandle.variables['siglev'][:], dtype=float)
+            if ( siglev.ndim == 1 ):
+                siglev = np.repeat(siglev[:, np.newaxis], len(x), axis=1)
+            dsignode = siglev[:-1] - siglev[1:]
+        else:
+            print("WARNING: siglev not found in dataset. Equal sigma layers assumed.")
+            dsignode = np.full((nsiglay, len(x)), 1.0 / nsiglay)
+        # if END
+        dsigele = np.mean(dsignode[:, nv], axis=2)
+
+        self.f_mesh = { "nv": nv, "area": area, "nodearea": nodearea, "dndx": dndx, "dndy": dndy,
+                        "dsignode": dsignode, "dsigele": dsigele }
+        return self.f_mesh
+    # def END
+
+
+# =================================================================
+# calcVorticity()::
+# Vertical vorticity dv/dx - du/dy (1/s) of element velocities (..., nele).
+# u and v are averaged to the nodes (area-weighted) and differentiated
+# with the linear shape functions of each element.
+#
+    def calcVorticity(self,uu,vv):
+        m = self.getMeshOperators()
+        nv = m["nv"]
+        nvflat = nv.ravel()
+        nnode = len(m["nodearea"])
+        wnode = np.divide(1.0, m["nodearea"], out=np.zeros(nnode), where=(m["nodearea"] > 0))
+        shape = np.broadcast_shapes(uu.shape, vv.shape)
+        ue = np.broadcast_to(uu, shape).reshape(-1, shape[-1])
+        ve = np.broadcast_to(vv, shape).reshape(-1, shape[-1])
+        out = np.empty(ue.shape)
+        for r in range(ue.shape[0]):
+            un = np.bincount(nvflat, weights=np.repeat(ue[r] * m["area"], 3), minlength=nnode) * wnode
+            vn = np.bincount(nvflat, weights=np.repeat(ve[r] * m["area"], 3), minlength=nnode) * wnode
+            out[r] = np.sum(m["dndx"] * vn[nv] - m["dndy"] * un[nv], axis=1)
+        # for END
+        return out.reshape(shape)
+    # def END
+
+
+# =================================================================
+# calcDepthAverage()::
+# Depth average of a (time, siglay, space), weighted by the sigma layer
+# thickness. Returns (time, 1, space).
+#
+    def calcDepthAverage(self,a):
+        m = self.getMeshOperators()
+        dsig = m["dsigele"] if ( a.shape[-1] == len(m["area"]) ) else m["dsignode"]
+        return np.sum(a * dsig[np.newaxis], axis=1, keepdims=True) / np.sum(dsig, axis=0)
+    # def END
+
+
+# =================================================================
+# readIndexed()::
+# Reads time steps t0..t1-1 of nc variable ncname at the sorted unique
+# spatial indices idx (elements or nodes) and siglays (ignored for 2-D
+# variables, which are repeated over the siglays). Few indices are read
+# with orthogonal indexing; many scattered indices as one contiguous slab
+# that is indexed in memory. Returns an array (time, siglay, index).
+#
+    def readIndexed(self,ncname,t0,t1,siglays,idx):
+        var = self.fhandle.variables[ncname]
+        if ( len(idx) > INDEXEDREADMAX ):
+            lo = int(idx[0])
+            hi = int(idx[-1]) + 1
+            if ( len(var.dimensions) == 3 ):
+                a = var[t0:t1, int(siglays[0]):int(siglays[-1])+1, lo:hi][:, siglays - siglays[0], :][:, :, idx - lo]
+            else:
+                a = var[t0:t1, lo:hi][:, idx - lo]
+            # if END
+        else:
+            if ( len(var.dimensions) == 3 ):
+                a = var[t0:t1, siglays, idx]
+            else:
+                a = var[t0:t1, idx]
+            # if END
+        # if END
+        a = np.ma.filled(a, np.nan)
+        if ( len(var.dimensions) != 3 ):
+            a = np.repeat(a[:, np.newaxis, :], len(siglays), axis=1)
+        # if END
+        return a
+    # def END
+
+
+# =================================================================
+# getIndexedChunk()::
+# Number of time steps per chunk for readIndexed() of the nc variables
+# ncnames, so that at most BOUNDSCHUNKBYTES are read per chunk.
+#
+    def getIndexedChunk(self,ncnames,siglays,idx):
+        span = len(idx) if ( len(idx) <= INDEXEDREADMAX ) else int(idx[-1]) - int(idx[0]) + 1
+        layers = int(siglays[-1]) - int(siglays[0]) + 1
+        stepbytes = max(1, span * layers * 8 * len(ncnames))
+        return max(1, BOUNDSCHUNKBYTES // stepbytes)
+    # def END
+
+
+# =================================================================
+# getDataBatch()::
+# Extracts time series of several fields at several (element, siglay)
+# points. Each nc variable is read once per time chunk (at most
+# BOUNDSCHUNKBYTES), with orthogonal indexing over the requested siglays
+# and elements, instead of one strided pass per point and field.
+# Parameters:
+#   elements : list of elements (or nodes, for node variables).
+#   fields   : list of fields, nc variables or dsPoint DERIVEDFIELDS (e.g. "velocity").
+#   siglays  : list of sigma layers. Ignored for 2-D (time, ele/node) variables.
+# Returns (data, labels):
+#   data   : array (time, point, field). Point p is element p // len(siglays)
+#            and siglay p % len(siglays).
+#   labels : dict with "time" (values), "fields", "points" (array of
+#            [element, siglay] per point) and "titles" (array (point, field)
+#            of "<field>_<element>_<siglay>").
+#
+    def getDataBatch(self,elements,fields, siglays = [0]):
+        elements = np.asarray(elements, dtype=int)
+        siglays = np.asarray(siglays, dtype=int)
+        elementsu, ie = np.unique(elements, return_inverse=True)
+        siglaysu, iss = np.unique(siglays, return_inverse=True)
+        pe = np.repeat(ie, len(siglays)) # Point -> index in elementsu
+        ps = np.tile(iss, len(elements)) # Point -> index in siglaysu
+        pointcount = len(pe)
+
+        ncnames = {}
+        for f in fields:
+            ncnames[f] = self.getPointInputs(f)
+            if ( ncnames[f] is None ):
+                print("ERROR: {} needs the mesh or the water column and cannot be extracted at points. Filled with NaN.".format(f))
+                ncnames[f] = []
+            # if END
+        # for END
+        needed = list(dict.fromkeys(n for f in fields for n in ncnames[f]))
+
+        t = np.ma.filled(self.fhandle.variables['time'][:], np.nan)
+        nt = len(t)
+        data = np.full((nt, pointcount, len(fields)), np.nan)
+        chunk = self.getIndexedChunk(needed, siglaysu, elementsu)
+        for t0 in range(0, nt, chunk):
+            t1 = min(nt, t0 + chunk)
+            block = {}
+            for n in needed:
+                a = self.readIndexed(n, t0, t1, siglaysu, elementsu)
+                block[n] = a[:, ps, pe]
+            # for END
+            for j in range(len(fields)):
+                names = ncnames[fields[j]]
+                if ( len(names) > 0 ):
+                    data[t0:t1, :, j] = self.evalPointField(fields[j], [ block[n] for n in names ])
+                # if END
+            # for END
+        # for END
+
+        points = np.column_stack([np.repeat(elements, len(siglays)), np.tile(siglays, len(elements))])
+        titles = np.array([ [ "{}_{}_{}".format(f, p[0], p[1]) for f in fields ] for p in points ], dtype=object).reshape((pointcount, len(fields)))
+        labels = { "time": t, "fields": list(fields), "points": points, "titles": titles }
+        return data, labels
+    # def END
+
+
 # =================================================================
 # getData()::
-# Gets data from the named elements with chosen fields
+# Gets data from the named elements with chosen fields (see getDataBatch)
 # Parameters:
 #   elements : list of elements for which to load data.
 #   fields   : list of fields for which to load data.
 # Returns 0
 # Writes the generated data into the variables
+#   d_data      : Array (time, point, field) from getDataBatch
+#   d_labels    : Labels of d_data from getDataBatch
 #   d_datatitle : Array of string title of each data column
 #   d_datahandle: Array of handles to the data array
 #
@@ -318,37 +954,27 @@ class FVCOMData:
         fieldcount = len(fields)
         siglaycount = len(siglays)
 
+        self.d_data, self.d_labels = self.getDataBatch(elements, fields, siglays)
+
         self.d_datatitle = np.zeros((1 + elementcount * fieldcount * siglaycount), dtype=object)
         self.d_datahandle = np.zeros((1 + elementcount * fieldcount * siglaycount), dtype=object)
         self.d_datatitle[0]='time'
-        self.d_datahandle[0]=self.fhandle.variables['time']
+        self.d_datahandle[0]=self.d_labels["time"]
 
         offset = 1 # (time)
         n = offset
-        # Raw data fields
+        # Columns in the order element, field, siglay
         for i in range(elementcount):
             for j in range(fieldcount):
                 for k in range (siglaycount):
-                    match fields[j]:
-                        case "velocity":
-                            print("{}_{}_{}".format(j,i,k))
-                            self.d_datatitle[n]="{}_{}_{}".format(fields[j],elements[i],siglays[k])
-                            u = self.fhandle.variables["u"][:,siglays[k],elements[i]]
-                            v = self.fhandle.variables["v"][:,siglays[k],elements[i]]
-                            self.d_datahandle[n]=np.sqrt(np.add(np.square(u),np.square(v)))
-                            print("self.d_datahandle[{}]: variable: {}   element:{}   siglay:{}  len:  {}".format(n,fields[j],elements[i],siglays[k],len(self.d_datahandle[n])))
-                        case _:
-                            print("{}_{}_{}".format(j,i,k))
-                            self.d_datatitle[n]="{}_{}_{}".format(fields[j],elements[i],siglays[k])
-                            self.d_datahandle[n]=self.fhandle.variables[fields[j]][:,siglays[k],elements[i]]
-
-                            print("self.d_datahandle[{}]: variable: {}   element:{}   siglay:{}  len:  {}".format(n,fields[j],elements[i],siglays[k],len(self.d_datahandle[n])))
-                        # case END
-                    # match END
+                    p = i * siglaycount + k
+                    self.d_datatitle[n]=self.d_labels["titles"][p, j]
+                    self.d_datahandle[n]=self.d_data[:, p, j]
                     n += 1
                 # for k END
             # for j END
         #for i END
+        print("Loaded data: {} time steps x {} points x {} fields.".format(*self.d_data.shape))
 
         self.d_elements = elements
         self.d_elementcount = elementcount
@@ -359,6 +985,186 @@ class FVCOMData:
 
         return 0
     # def END
+
+
+# =================================================================
+# getStationLocator()::
+# Returns the cached point-in-triangle locator (triangulation, trifinder)
+# over nv and the node coordinates. It is built on first use per kind.
+# Parameters:
+#   coords : "xy" (x, y variables) or "lonlat" (lon, lat variables).
+#
+    def getStationLocator(self,coords="xy"):
+        if ( coords in self.s_locators ):
+            return self.s_locators[coords]
+        # if END
+        print("Building station locator ({}) ...".format(coords))
+        nv = np.transpose(np.array(self.fhandle.variables['nv']) - 1)
+        if ( coords == "lonlat" ):
+            px = np.array(self.fhandle.variables['lon'][:], dtype=float)
+            py = np.array(self.fhandle.variables['lat'][:], dtype=float)
+        else:
+            px = np.array(self.fhandle.variables['x'][:], dtype=float)
+            py = np.array(self.fhandle.variables['y'][:], dtype=float)
+        # if END
+        triangulation = mtri.Triangulation(px, py, nv)
+        self.s_locators[coords] = (triangulation, triangulation.get_trifinder())
+        print("Building station locator ({}) ... DONE".format(coords))
+        return self.s_locators[coords]
+    # def END
+
+
+# =================================================================
+# locateStations()::
+# Finds the element containing each station and the barycentric weights
+# of its three nodes.
+# Parameters:
+#   stations : list of (x, y) or (lon, lat) pairs.
+#   coords   : "xy" or "lonlat".
+# Returns (elements, nodes, weights):
+#   elements : array (station) of 0-indexed elements, -1 if outside the mesh.
+#   nodes    : array (station, 3) of 0-indexed nodes of the element.
+#   weights  : array (station, 3) of barycentric weights (sum 1).
+#
+    def locateStations(self,stations,coords="xy"):
+        triangulation, trifinder = self.getStationLocator(coords)
+        st = np.asarray(stations, dtype=float).reshape(-1, 2)
+        elements = np.asarray(trifinder(st[:, 0], st[:, 1]), dtype=int)
+        inside = elements >= 0
+        nodes = np.zeros((len(st), 3), dtype=int)
+        nodes[inside] = triangulation.triangles[elements[inside]]
+        x = triangulation.x[nodes]
+        y = triangulation.y[nodes]
+        det = (y[:, 1] - y[:, 2]) * (x[:, 0] - x[:, 2]) + (x[:, 2] - x[:, 1]) * (y[:, 0] - y[:, 2])
+        det[~inside] = 1.0
+        weights = np.zeros((len(st), 3))
+        weights[:, 0] = ((y[:, 1] - y[:, 2]) * (st[:, 0] - x[:, 2]) + (x[:, 2] - x[:, 1]) * (st[:, 1] - y[:, 2])) / det
+        weights[:, 1] = ((y[:, 2] - y[:, 0]) * (st[:, 0] - x[:, 2]) + (x[:, 0] - x[:, 2]) * (st[:, 1] - y[:, 2])) / det
+        weights[:, 2] = 1.0 - weights[:, 0] - weights[:, 1]
+        weights[~inside] = np.nan
+        if ( not np.all(inside) ):
+            print("WARNING: {} of {} stations are outside the mesh: {}".format(np.count_nonzero(~inside), len(st), np.flatnonzero(~inside)[:20].tolist()))
+        # if END
+        return elements, nodes, weights
+    # def END
+
+
+# =================================================================
+# getStationDataBatch()::
+# Extracts time series of several fields at several stations in one pass
+# over the file (see getDataBatch). Element fields (e.g. u, v) are taken
+# from the containing element, node fields (e.g. zeta, temp on nodes) are
+# interpolated barycentrically from its three nodes.
+# Parameters:
+#   stations : list of (x, y) or (lon, lat) pairs.
+#   fields   : list of fields, nc variables or dsPoint DERIVEDFIELDS.
+#   siglays  : list of sigma layers. Ignored for 2-D variables.
+#   coords   : "xy" or "lonlat".
+# Returns (data, labels) as getDataBatch, with "points" holding
+# [station, element, siglay] per point and "stations", "elements",
+# "nodes" and "weights" from locateStations(). Stations outside the
+# mesh give NaN.
+#
+    def getStationDataBatch(self,stations,fields, siglays = [0],coords="xy"):
+        elements, nodes, weights = self.locateStations(stations, coords)
+        siglays = np.asarray(siglays, dtype=int)
+        siglaysu, iss = np.unique(siglays, return_inverse=True)
+        stationcount = len(elements)
+        inside = elements >= 0
+        pst = np.repeat(np.arange(stationcount), len(siglays)) # Point -> station
+        ps = np.tile(iss, stationcount)                        # Point -> index in siglaysu
+        pointcount = len(pst)
+
+        ncnames = {}
+        for f in fields:
+            ncnames[f] = self.getPointInputs(f)
+            if ( ncnames[f] is None ):
+                print("ERROR: {} needs the mesh or the water column and cannot be extracted at points. Filled with NaN.".format(f))
+                ncnames[f] = []
+            # if END
+        # for END
+        needed = list(dict.fromkeys(n for f in fields for n in ncnames[f]))
+        # Only stations inside the mesh are read. Outside stations point at entry 0 and are set to NaN.
+        elementsu, iein = np.unique(elements[inside], return_inverse=True)
+        ie = np.zeros(stationcount, dtype=int)
+        ie[inside] = iein
+        nodesu, innin = np.unique(nodes[inside], return_inverse=True)
+        inn = np.zeros(nodes.shape, dtype=int)
+        inn[inside] = innin.reshape(-1, nodes.shape[1])
+        isnode = { n: ('node' in self.fhandle.variables[n].dimensions) for n in needed }
+
+        t = np.ma.filled(self.fhandle.variables['time'][:], np.nan)
+        nt = len(t)
+        data = np.full((nt, pointcount, len(fields)), np.nan)
+        chunk = min(self.getIndexedChunk(needed, siglaysu, elementsu), self.getIndexedChunk(needed, siglaysu, nodesu))
+        w = weights[pst] # (point, 3)
+        ntread = nt if ( np.any(inside) ) else 0 # Nothing to read if all stations are outside the mesh
+        for t0 in range(0, ntread, chunk):
+            t1 = min(nt, t0 + chunk)
+            block = {}
+            for n in needed:
+                if ( isnode[n] ):
+                    a = self.readIndexed(n, t0, t1, siglaysu, nodesu)
+                    block[n] = np.sum(a[:, ps[:, np.newaxis], inn[pst]] * w[np.newaxis, :, :], axis=2)
+                else:
+                    a = self.readIndexed(n, t0, t1, siglaysu, elementsu)
+                    block[n] = a[:, ps, ie[pst]]
+                # if END
+                block[n][:, ~inside[pst]] = np.nan
+            # for END
+            for j in range(len(fields)):
+                names = ncnames[fields[j]]
+                if ( len(names) > 0 ):
+                    data[t0:t1, :, j] = self.evalPointField(fields[j], [ block[n] for n in names ])
+                # if END
+            # for END
+        # for END
+
+        points = np.column_stack([pst, elements[pst], siglays[ps]])
+        titles = np.array([ [ "{}_st{}_{}".format(f, p[0], siglays[k]) for f in fields ] for p, k in zip(points, np.tile(np.arange(len(siglays)), stationcount)) ], dtype=object).reshape((pointcount, len(fields)))
+        labels = { "time": t, "fields": list(fields), "points": points, "titles": titles,
+                   "stations": np.asarray(stations, dtype=float).reshape(-1, 2), "elements": elements, "nodes": nodes, "weights": weights }
+        return data, labels
+    # def END
+
+
+# =================================================================
+# getStationData()::
+# As getData, but for stations given by coordinates (see getStationDataBatch).
+# Columns are in the order station, field, siglay.
+#
+    def getStationData(self,stations,fields, siglays = [0],coords="xy"):
+        self.d_data, self.d_labels = self.getStationDataBatch(stations, fields, siglays, coords)
+        stationcount = len(self.d_labels["elements"])
+        fieldcount = len(fields)
+        siglaycount = len(siglays)
+
+        self.d_datatitle = np.zeros((1 + stationcount * fieldcount * siglaycount), dtype=object)
+        self.d_datahandle = np.zeros((1 + stationcount * fieldcount * siglaycount), dtype=object)
+        self.d_datatitle[0]='time'
+        self.d_datahandle[0]=self.d_labels["time"]
+        n = 1
+        for i in range(stationcount):
+            for j in range(fieldcount):
+                for k in range (siglaycount):
+                    p = i * siglaycount + k
+                    self.d_datatitle[n]=self.d_labels["titles"][p, j]
+                    self.d_datahandle[n]=self.d_data[:, p, j]
+                    n += 1
+                # for k END
+            # for j END
+        #for i END
+        print("Loaded data: {} time steps x {} points x {} fields.".format(*self.d_data.shape))
+
+        self.d_elements = self.d_labels["elements"]
+        self.d_elementcount = stationcount
+        self.d_fields = fields
+        self.d_fieldcount = fieldcount
+        self.d_siglays = siglays
+        self.d_siglaycount = siglaycount
+
+        return 0
+    # def END
     #
 
 
@@ -413,6 +1219,8 @@ class FVCOMData:
                 result = ["evap"]
             case "dye":
                 result = ["dye"]
+            case _ if (plotvar in DERIVEDFIELDS):
+                result = [plotvar]
 
 
             case _:
@@ -423,6 +1231,39 @@ class FVCOMData:
     #==========================================================================================================
     #==========================================================================================================
     #
+    # getStatsKeys()::
+    # Returns the statistics keys (see getVarBounds/buildStats) of the load
+    # variables of getLoadVars(), e.g. ["velocity","u","v"] for "velocity".
+    # "all" gives STATSFIELDS.
+    #
+    def getStatsKeys(self,loadvars):
+        if ( "all" in loadvars ):
+            return list(STATSFIELDS)
+        statsKeys = {
+            "z"   : "zeta",
+            "zeta"  : "zeta",
+            "u" : "u",
+            "v"  : "v",
+            "ww"   : "ww",
+            "temp"  : "temp",
+            "salinity" : "salinity",
+            "uwind"   : "uwind_speed",
+            "vwind"  : "vwind_speed",
+            "velocity"  : "velocity",
+            "windvelocity"  : "windvelocity",
+            "shortwave"   : "short_wave",
+            "netheatflux"   : "net_heat_flux",
+            "precip"   : "precip",
+            "evap"   : "evap",
+            "dye"   : "DYE",
+        }
+        keys = [ statsKeys.get(vn, vn if (vn in DERIVEDFIELDS) else None) for vn in loadvars ]
+        return list(dict.fromkeys(k for k in keys if (k is not None)))
+    # def END
+    #==========================================================================================================
+    #==========================================================================================================
+    #==========================================================================================================
+    #
     def getVarName(self,vn):
         varNames = {
             "siglay" : "siglay",
@@ -448,7 +1289,7 @@ class FVCOMData:
             "evap"   : "evap",
             "dye"   : "dye",
         }
-        return varNames.get(vn, None)
+        return varNames.get(vn, vn if (vn in DERIVEDFIELDS) else None)
     # def END
     #==========================================================================================================
     #==========================================================================================================
@@ -479,7 +1320,7 @@ class FVCOMData:
             "evap"   : "Evaporation",
             "dye"   : "Dye",
         }
-        return varTitles.get(vn, None)
+        return varTitles.get(vn, DERIVEDFIELDS[vn]["title"] if (vn in DERIVEDFIELDS) else None)
     # def END
     #==========================================================================================================
     #==========================================================================================================
@@ -510,7 +1351,7 @@ class FVCOMData:
             "evap"   : "m/s",
             "dye"   : "kg/m3",
         }
-        return varUnits.get(vn, None)
+        return varUnits.get(vn, DERIVEDFIELDS[vn]["unit"] if (vn in DERIVEDFIELDS) else None)
     # def END
     #==========================================================================================================
     #==========================================================================================================
@@ -586,7 +1427,7 @@ class FVCOMData:
         if ( ("zeta" in self.loadvars) or ("all" in self.loadvars) ):
             self.zeta=np.array(self.fhandle.variables['zeta'][self.p_timestep,:]) # "Water Surface Elevation"
             if ( len(self.zeta_bounds)==0 ) :
-                self.zeta_bounds=[ np.min(self.fhandle.variables['zeta'][:,:]), np.max(self.fhandle.variables['zeta'][:,:]) ]
+                self.zeta_bounds=self.getVarBounds('zeta',['zeta'])
             self.z=self.zeta
             self.z_kind=self.zeta_kind
             self.z_bounds = self.zeta_bounds
@@ -594,52 +1435,52 @@ class FVCOMData:
 
 
         if ( ("u" in self.loadvars) or ("all" in self.loadvars) ):
-            self.u=np.array(self.fhandle.variables['u'][self.p_timestep,self.p_siglaystep,:])
+            self.u=self.getFieldSlice('u',self.p_timestep,self.p_siglaystep)
             if ( len(self.u_bounds)==0 ) :
-                self.u_bounds=[ np.min(self.fhandle.variables['u'][:,:,:]), np.max(self.fhandle.variables['u'][:,:,:]) ]
+                self.u_bounds=self.getVarBounds('u',['u'])
             print("U (kind={}, timestep={}, siglay={}) loaded.".format(self.u_kind,self.p_timestep,self.p_siglaystep))
 
         if ( ("v" in self.loadvars) or ("all" in self.loadvars) ):
-            self.v=np.array(self.fhandle.variables['v'][self.p_timestep,self.p_siglaystep,:])
+            self.v=self.getFieldSlice('v',self.p_timestep,self.p_siglaystep)
             if ( len(self.v_bounds)==0 ) :
-                self.v_bounds=[ np.min(self.fhandle.variables['v'][:,:,:]), np.max(self.fhandle.variables['v'][:,:,:]) ]
+                self.v_bounds=self.getVarBounds('v',['v'])
             print("V (kind={}, timestep={}, siglay={}) loaded.".format(self.v_kind,self.p_timestep,self.p_siglaystep))
 
         if ( ("ww" in self.loadvars) or ("all" in self.loadvars) ):
             self.ww=np.array(self.fhandle.variables['ww'][self.p_timestep,self.p_siglaystep,:])
     #         self.ww_kind='ele'
             if ( len(self.ww_bounds)==0 ) :
-                self.ww_bounds=[ np.min(self.fhandle.variables['ww'][:,:,:]), np.max(self.fhandle.variables['ww'][:,:,:]) ]
+                self.ww_bounds=self.getVarBounds('ww',['ww'])
             print("ww (kind={}, timestep={}, siglay={}) loaded.".format(self.ww_kind,self.p_timestep,self.p_siglaystep))
 
         if ( ("temp" in self.loadvars) or ("all" in self.loadvars) ):
             self.temp=np.array(self.fhandle.variables['temp'][self.p_timestep,self.p_siglaystep,:])
             if ( len(self.temp_bounds)==0 ) :
-                self.temp_bounds=[ np.min(self.fhandle.variables['temp'][:,:,:]), np.max(self.fhandle.variables['temp'][:,:,:]) ]
+                self.temp_bounds=self.getVarBounds('temp',['temp'])
             print("TEMP (kind={}, timestep={}, siglay={}) loaded.".format(self.temp_kind,self.p_timestep,self.p_siglaystep))
 
         if ( ("salinity" in self.loadvars) or ("all" in self.loadvars) ):
             self.salinity=np.array(self.fhandle.variables['salinity'][self.p_timestep,self.p_siglaystep,:])
             if ( len(self.salinity_bounds)==0 ) :
-                self.salinity_bounds=[ np.min(self.fhandle.variables['salinity'][:,:,:]), np.max(self.fhandle.variables['salinity'][:,:,:]) ]
+                self.salinity_bounds=self.getVarBounds('salinity',['salinity'])
             print("SALINITY (kind={}, timestep={}, siglay={}) loaded.".format(self.salinity_kind,self.p_timestep,self.p_siglaystep))
 
 
         # === FORCING VALUES =============================================================================================
         if ( ("uwind" in self.loadvars) or ("all" in self.loadvars) ):
             try:
-                self.uwind=np.array(self.fhandle.variables['uwind_speed'][self.p_timestep,:])
+                self.uwind=self.getFieldSlice('uwind_speed',self.p_timestep)
                 if ( len(self.uwind_bounds)==0 ) :
-                    self.uwind_bounds=[ np.min(self.fhandle.variables['uwind_speed'][:,:]), np.max(self.fhandle.variables['uwind_speed'][:,:]) ]
+                    self.uwind_bounds=self.getVarBounds('uwind_speed',['uwind_speed'])
                 print("UWIND (kind={}, timestep={}, siglay={}) loaded.".format(self.uwind_kind,self.p_timestep,self.p_siglaystep))
             except:
                 print("UWIND not found in dataset.")
 
         if ( ("vwind" in self.loadvars) or ("all" in self.loadvars) ):
             try:
-                self.vwind=np.array(self.fhandle.variables['vwind_speed'][self.p_timestep,:])
+                self.vwind=self.getFieldSlice('vwind_speed',self.p_timestep)
                 if ( len(self.vwind_bounds)==0 ) :
-                    self.vwind_bounds=[ np.min(self.fhandle.variables['vwind_speed'][:,:]), np.max(self.fhandle.variables['vwind_speed'][:,:]) ]
+                    self.vwind_bounds=self.getVarBounds('vwind_speed',['vwind_speed'])
                 print("VWIND (kind={}, timestep={}, siglay={}) loaded.".format(self.vwind_kind,self.p_timestep,self.p_siglaystep))
             except Exception as e:
                 print("VWIND not found in dataset. [{}]".format(e))
@@ -649,7 +1490,7 @@ class FVCOMData:
             try:
                 self.shortwave=np.array(self.fhandle.variables['short_wave'][self.p_timestep,:])
                 if ( len(self.shortwave_bounds)==0 ) :
-                    self.shortwave_bounds=[ np.min(self.fhandle.variables['short_wave'][:,:]), np.max(self.fhandle.variables['short_wave'][:,:]) ]
+                    self.shortwave_bounds=self.getVarBounds('short_wave',['short_wave'])
                 print("SHORTWAVE (kind={}, timestep={}, siglay={}) loaded.".format(self.shortwave_kind,self.p_timestep,self.p_siglaystep))
             except Exception as e:
                 print("SHORTWAVE not found in dataset. [{}]".format(e))
@@ -660,7 +1501,7 @@ class FVCOMData:
             try:
                 self.netheatflux=np.array(self.fhandle.variables['net_heat_flux'][self.p_timestep,:])
                 if ( len(self.netheatflux_bounds)==0 ) :
-                    self.netheatflux_bounds=[ np.min(self.fhandle.variables['net_heat_flux'][:,:]), np.max(self.fhandle.variables['net_heat_flux'][:,:]) ]
+                    self.netheatflux_bounds=self.getVarBounds('net_heat_flux',['net_heat_flux'])
                 print("NETHEATFLUX (kind={}, timestep={}, siglay={}) loaded.".format(self.netheatflux_kind,self.p_timestep,self.p_siglaystep))
             except Exception as e:
                 print("NETHEATFLUX not found in dataset. [{}]".format(e))
@@ -674,7 +1515,7 @@ class FVCOMData:
                 self.precip=np.array(self.fhandle.variables[fieldname][self.p_timestep,:])
                 # Read the bounds
                 if ( len(self.precip_bounds)==0 ) :
-                    self.precip_bounds=[ np.min(self.fhandle.variables[fieldname][:,:]),  np.max(self.fhandle.variables[fieldname][:,:]) ]
+                    self.precip_bounds=self.getVarBounds(fieldname,[fieldname])
                 # if END
                 print("{} (kind={}, timestep={}, siglay={}, unit={}) loaded.".format(fieldname.upper(),self.precip_kind,self.p_timestep,self.p_siglaystep,self.precip_unit))
             except Exception as e:
@@ -690,7 +1531,7 @@ class FVCOMData:
                 self.evap=np.array(self.fhandle.variables[fieldname][self.p_timestep,:])
                 # Read the bounds
                 if ( len(self.evap_bounds)==0 ) :
-                    self.evap_bounds=[ np.min(self.fhandle.variables[fieldname][:,:]), np.max(self.fhandle.variables[fieldname][:,:]) ]
+                    self.evap_bounds=self.getVarBounds(fieldname,[fieldname])
                 # if END
                 print("{} (kind={}, timestep={}, siglay={}, unit={}) loaded.".format(fieldname.upper(),self.evap_kind,self.p_timestep,self.p_siglaystep,self.evap_unit))
                 print("shape {}".format(self.evap.shape))
@@ -706,7 +1547,7 @@ class FVCOMData:
                 self.dye=np.array(self.fhandle.variables['DYE'][self.p_timestep,self.p_siglaystep,:])
                 # Read the bounds
                 if ( len(self.dye_bounds)==0 ) :
-                    self.dye_bounds=[ np.min(self.fhandle.variables['DYE'][:,:,:]), np.max(self.fhandle.variables['DYE'][:,:,:]) ]
+                    self.dye_bounds=self.getVarBounds('DYE',['DYE'])
                 # if END
                 print("{} (kind={}, timestep={}, siglay={}, unit={}) loaded.".format(fieldname.upper(),self.dye_kind,self.p_timestep,self.p_siglaystep,self.dye_unit))
                 print("shape {}".format(self.dye.shape))
@@ -724,40 +1565,42 @@ class FVCOMData:
         #
         # VELOCITY
         if ( ("velocity" in self.loadvars) or ("all" in self.loadvars) ):
-            if ( len(self.c_velocity)== 0):
-                print("Calculating the velocity variables for ALL points...")
-                t1 = self.fhandle.variables['u'][:,:,:]
-                t2 = self.fhandle.variables['v'][:,:,:]
-                self.c_velocity = np.sqrt(np.add(np.square(t1),np.square(t2)))
-            #self.velocity = np.sqrt(np.add(np.square(self.u),np.square(self.v)))
-            self.velocity = self.c_velocity[self.p_timestep,self.p_siglaystep,:]
+            # Only the plotted slice is read (shared with u, v); the bounds come from the stats or a streaming pass.
+            self.velocity = self.getFieldSlice('velocity',self.p_timestep,self.p_siglaystep)
             self.velocity_kind = self.u_kind
             if ( len(self.velocity_bounds)==0 ) :
-                self.velocity_bounds=[ np.min(self.c_velocity), np.max(self.c_velocity) ]
+                self.velocity_bounds=self.getVarBounds('velocity',DERIVEDFIELDS['velocity']['inputs'])
                 print("Velocity bounds found: {} {}".format(self.velocity_bounds[0],self.velocity_bounds[1]))
 
-            (i_velmin, j_velmin, k_velmin) = np.unravel_index(np.argmin(self.c_velocity, axis=None), self.c_velocity.shape)
-            if VERBOSE: print("MIN timestep: {} Siglay: {}, Element or Node: {}".format(i_velmin, j_velmin, k_velmin))
-            if VERBOSE: print("MIN VALUE: {}.".format(self.c_velocity[i_velmin, j_velmin, k_velmin]))
-
-            (i_velmax, j_velmax, k_velmax) = np.unravel_index(np.argmax(self.c_velocity, axis=None), self.c_velocity.shape)
-            if VERBOSE: print("MAX timestep: {} Siglay: {}, Element or Node: {}".format(i_velmax, j_velmax, k_velmax))
-            if VERBOSE: print("MAX VALUE: {}.".format(self.c_velocity[i_velmax, j_velmax, k_velmax]))
+            if ( "velocity_argmin" in self.stats ):
+                (i_velmin, j_velmin, k_velmin) = self.stats["velocity_argmin"]
+                if VERBOSE: print("MIN timestep: {} Siglay: {}, Element or Node: {}".format(i_velmin, j_velmin, k_velmin))
+                if VERBOSE: print("MIN VALUE: {}.".format(self.velocity_bounds[0]))
+            if ( "velocity_argmax" in self.stats ):
+                (i_velmax, j_velmax, k_velmax) = self.stats["velocity_argmax"]
+                if VERBOSE: print("MAX timestep: {} Siglay: {}, Element or Node: {}".format(i_velmax, j_velmax, k_velmax))
+                if VERBOSE: print("MAX VALUE: {}.".format(self.velocity_bounds[1]))
             if VERBOSE: print("VELOCITY (kind={}, timestep={}, siglay={}) calculated.".format(self.velocity_kind,self.p_timestep,self.p_siglaystep))
         #
         # WINDVELOCITY
         if ( ("windvelocity" in self.loadvars) or ("all" in self.loadvars) ):
-            if ( len(self.c_windvelocity)== 0):
-                print("Calculating the windvelocity variables for ALL points...")
-                t1 = self.fhandle.variables['uwind_speed'][:,:]
-                t2 = self.fhandle.variables['vwind_speed'][:,:]
-                self.c_windvelocity = np.sqrt(np.add(np.square(t1),np.square(t2)))
-            self.windvelocity = self.c_windvelocity[self.p_timestep,:]
+            self.windvelocity = self.getFieldSlice('windvelocity',self.p_timestep)
             self.windvelocity_kind = self.u_kind
             if ( len(self.windvelocity_bounds)==0 ) :
-                self.windvelocity_bounds=[ np.min(self.c_windvelocity), np.max(self.c_windvelocity) ]
+                self.windvelocity_bounds=self.getVarBounds('windvelocity',DERIVEDFIELDS['windvelocity']['inputs'])
                 print("Velocity bounds found: {} {}".format(self.windvelocity_bounds[0],self.windvelocity_bounds[1]))
             print("VELOCITY (kind={}, timestep={}, siglay={}) calculated.".format(self.windvelocity_kind,self.p_timestep,self.p_siglaystep))
+        #
+        # OTHER DERIVED FIELDS (DERIVEDFIELDS). Not part of "all", only evaluated when asked for.
+        for name in DERIVEDFIELDS:
+            if ( (name in self.loadvars) and (name not in ["velocity", "windvelocity"]) ):
+                setattr(self, name, self.getFieldSlice(name,self.p_timestep,self.p_siglaystep))
+                setattr(self, name + "_kind", self.getFieldKind(name))
+                if ( len(getattr(self, name + "_bounds", [])) == 0 ):
+                    setattr(self, name + "_bounds", self.getVarBounds(name))
+                print("{} (kind={}, timestep={}, siglay={}) calculated.".format(name.upper(),getattr(self, name + "_kind"),self.p_timestep,self.p_siglaystep))
+            # if END
+        # for END
 
 
 
@@ -766,6 +1609,9 @@ class FVCOMData:
 # PLOT
 #
     def plot(self):
+        if ( self.p_animate and (self.p_figure != None) and (self.p_animkind == self.p_contourkind) ):
+            return self.plotUpdate()
+        # if END
 
         #===============PLOT INTI BEGIN================================================================================================
         #
@@ -779,6 +1625,10 @@ class FVCOMData:
         fig = plt.figure()
         fig.set_size_inches(self.p_xinch, self.p_yinch)
         ax = fig.add_subplot(1,1,1)
+        self.p_ax = ax
+        self.p_animkind = self.p_contourkind
+        self.p_quiver = None
+        self.p_lagpatches = []
         #===============PLOT INTI END===============================================================================================
 
         #===============PLOTTING BOUNDS BEGIN================================================================================================
@@ -814,46 +1664,7 @@ class FVCOMData:
         ax.triplot(self.p_triangulation, linewidth=0.5, c="#D3D3D3", markerfacecolor="#DC143C",markeredgecolor="black", markersize=10)
         ax.set_xlabel('X (m)')
         ax.set_ylabel('Y (m)')
-        epsilon=1e-7
-        #
-        # IF p_contourbounds is set, it mean there are predefined bounds, most likely from loading of data.
-        if ( len(self.p_contourbounds)==0):# If there are no global extrema for the entire dataset, use separate for each image.
-            pmin=np.min(self.p_contourdata)
-            pmax=np.max(self.p_contourdata)
-
-            if ( (abs(pmax - pmin) < 1e-10) ):
-                pmax = pmin + 1
-                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
-            # if END
-        else: # Use global.
-            pmin=self.p_contourbounds[0]
-            pmax=self.p_contourbounds[1]
-            if ( (abs(pmax - pmin) < 1e-20) ):
-                pmax = pmin * 2 + 1e-10
-                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
-            elif ( (abs(pmax - pmin) < 1e-15) ):
-                pmax = pmin * 2 + 1e-8
-                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
-            elif ( (abs(pmax - pmin) < 1e-10) ):
-                pmax = pmin * 2 + 1e-5
-                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
-            # if END
-
-        # if END
-        #
-        if VERBOSE: print("P (VERBOSE)     Min Max {:+12.10f} {:+12.10f}".format(pmin,pmax))
-        print("Defined Contour Min Max {:+12.10f} {:+12.10f}".format(self.p_contourbounds[0],self.p_contourbounds[1]))
-        print("Found   Contour Min Max {:+12.10f} {:+12.10f}".format(np.min(self.p_contourdata),np.max(self.p_contourdata)))
-        tpmin = pmin*(1-epsilon)
-        tpmax = pmax*(1+epsilon)
-        tprange = tpmax-tpmin
-        tpdelta = tprange /(self.p_nLevels)
-        print("TP      Contour Min Max {:+12.10f} {:+12.10f}".format(tpmin,tpmax))
-
-        self.p_levels = np.linspace(tpmin,tpmax,self.p_nLevels)
-        self.p_levels = np.append(self.p_levels,self.p_overcolorrangefactor*tpmax+tpdelta) # Overcolor
-        self.p_levels = np.insert(self.p_levels,0,self.p_undercolorrangefactor*tpmin-tpdelta) # Undercolor
-        self.p_ticks = np.linspace(tpmin,tpmax,self.p_nTicks)
+        tpmin, tpmax = self.calcContourLevels()
         #
         # === PLOT CONTOUR ===
         if (self.p_contourkind == 'node'): # node
@@ -880,16 +1691,24 @@ class FVCOMData:
             if ( len(self.gx) == 0):
                 self.populateRegularGrid([self.p_plottingbounds[0], self.p_plottingbounds[1], self.p_vectorxdelta, self.p_plottingbounds[2], self.p_plottingbounds[3], self.p_vectorydelta])
             # if END
-            for i in range(self.gm):
-                for j in range(self.gn):
-                    plt.arrow(self.xc[self.gri[i][j]], self.yc[self.gri[i][j]],
-                              kk*self.vxsource[self.gri[i][j]], kk*self.vysource[self.gri[i][j]],
-                               head_width = 500.2, width = 0.05, color = self.p_vectorcolor)
-                    if VERBOSE:
-                        print("Arrow {} {} {} {}.".format(self.xc[self.gri[i][j]], self.yc[self.gri[i][j]], kk*self.vxsource[self.gri[i][j]], kk*self.vysource[self.gri[i][j]]))
-                    # if END
-                # for j END
-            # for i END
+            if (self.p_animate):
+                # One quiver artist, so plotUpdate() only has to replace U and V.
+                ii = self.gri.ravel()
+                self.p_quiver = ax.quiver(self.xc[ii], self.yc[ii], kk*self.vxsource[ii], kk*self.vysource[ii],
+                                          angles='xy', scale_units='xy', scale=1, units='xy',
+                                          width=50, headwidth=10, headlength=15, headaxislength=13.5, color=self.p_vectorcolor)
+            else:
+                for i in range(self.gm):
+                    for j in range(self.gn):
+                        plt.arrow(self.xc[self.gri[i][j]], self.yc[self.gri[i][j]],
+                                  kk*self.vxsource[self.gri[i][j]], kk*self.vysource[self.gri[i][j]],
+                                   head_width = 500.2, width = 0.05, color = self.p_vectorcolor)
+                        if VERBOSE:
+                            print("Arrow {} {} {} {}.".format(self.xc[self.gri[i][j]], self.yc[self.gri[i][j]], kk*self.vxsource[self.gri[i][j]], kk*self.vysource[self.gri[i][j]]))
+                        # if END
+                    # for j END
+                # for i END
+            # if END
             #
             # Draw vector legend
             dx=self.p_plottingbounds[1]-self.p_plottingbounds[0]
@@ -910,14 +1729,7 @@ class FVCOMData:
         #===============VECTORS END ================================================================================================
 
         #===============LAG BEGIN==============================================================================================
-        if ( self.lag_active ):
-            print("Time: {} LAG: {}.".format(self.time[self.p_timestep],self.lag_time[self.p_timestep]))
-            iLagTime = np.argmin(np.abs(self.lag_time-self.time[self.p_timestep]))
-            print("LAG iLagTime {}".format(iLagTime))
-            for i in range(self.lag_nlag):
-                #print("P {}: x:{}  y:{}".format(i,self.lag_x[iLagTime][i],self.lag_y[iLagTime][i]))
-                circle1 = plt.Circle((self.lag_x[iLagTime][i],self.lag_y[iLagTime][i]), 100, color=self.p_lagcolor)
-                ax.add_patch(circle1)
+        self.plotLag(ax)
 
         #===============LAG END ================================================================================================
 
@@ -991,6 +1803,109 @@ class FVCOMData:
             return x*x
     # def END
     #
+#===================================================================================================================================
+# calcContourLevels
+# Sets p_levels and p_ticks from the contour bounds (or the current contour
+# data if no bounds are set). Returns the padded bounds tpmin, tpmax.
+#
+    def calcContourLevels(self):
+        epsilon=1e-7
+        #
+        # IF p_contourbounds is set, it mean there are predefined bounds, most likely from loading of data.
+        if ( len(self.p_contourbounds)==0):# If there are no global extrema for the entire dataset, use separate for each image.
+            pmin=np.min(self.p_contourdata)
+            pmax=np.max(self.p_contourdata)
+
+            if ( (abs(pmax - pmin) < 1e-10) ):
+                pmax = pmin + 1
+                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
+            # if END
+        else: # Use global.
+            pmin=self.p_contourbounds[0]
+            pmax=self.p_contourbounds[1]
+            if ( (abs(pmax - pmin) < 1e-20) ):
+                pmax = pmin * 2 + 1e-10
+                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
+            elif ( (abs(pmax - pmin) < 1e-15) ):
+                pmax = pmin * 2 + 1e-8
+                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
+            elif ( (abs(pmax - pmin) < 1e-10) ):
+                pmax = pmin * 2 + 1e-5
+                print("WARNING: MAX and MIN identical. Aurocorrected MAX to {}.".format(pmax))
+            # if END
+
+        # if END
+        #
+        if VERBOSE: print("P (VERBOSE)     Min Max {:+12.10f} {:+12.10f}".format(pmin,pmax))
+        print("Defined Contour Min Max {:+12.10f} {:+12.10f}".format(self.p_contourbounds[0],self.p_contourbounds[1]))
+        print("Found   Contour Min Max {:+12.10f} {:+12.10f}".format(np.min(self.p_contourdata),np.max(self.p_contourdata)))
+        tpmin = pmin*(1-epsilon)
+        tpmax = pmax*(1+epsilon)
+        tprange = tpmax-tpmin
+        tpdelta = tprange /(self.p_nLevels)
+        print("TP      Contour Min Max {:+12.10f} {:+12.10f}".format(tpmin,tpmax))
+
+        self.p_levels = np.linspace(tpmin,tpmax,self.p_nLevels)
+        self.p_levels = np.append(self.p_levels,self.p_overcolorrangefactor*tpmax+tpdelta) # Overcolor
+        self.p_levels = np.insert(self.p_levels,0,self.p_undercolorrangefactor*tpmin-tpdelta) # Undercolor
+        self.p_ticks = np.linspace(tpmin,tpmax,self.p_nTicks)
+        return tpmin, tpmax
+    # def END
+
+#===================================================================================================================================
+# plotLag
+# Draws the LAG particles for the current time step, replacing the ones
+# drawn by the previous call.
+#
+    def plotLag(self,ax):
+        for p in self.p_lagpatches:
+            p.remove()
+        # for END
+        self.p_lagpatches = []
+        if ( self.lag_active ):
+            print("Time: {} LAG: {}.".format(self.time[self.p_timestep],self.lag_time[self.p_timestep]))
+            iLagTime = np.argmin(np.abs(self.lag_time-self.time[self.p_timestep]))
+            print("LAG iLagTime {}".format(iLagTime))
+            for i in range(self.lag_nlag):
+                #print("P {}: x:{}  y:{}".format(i,self.lag_x[iLagTime][i],self.lag_y[iLagTime][i]))
+                circle1 = plt.Circle((self.lag_x[iLagTime][i],self.lag_y[iLagTime][i]), 100, color=self.p_lagcolor)
+                self.p_lagpatches.append(ax.add_patch(circle1))
+            # for END
+        # if END
+    # def END
+
+#===================================================================================================================================
+# plotUpdate
+# Animation mode (p_animate): the figure, mesh, colorbar and vector legend
+# from the first plot() call are kept. Only the contour data, the quiver U/V
+# and the LAG particles are replaced.
+#
+    def plotUpdate(self):
+        ax = self.p_ax
+        tpmin, tpmax = self.calcContourLevels()
+        if (self.p_contourkind == 'node'): # node - a filled contour set cannot be updated in place
+            self.p_tripcolor.remove()
+            self.p_tripcolor = ax.tricontourf(self.p_triangulation, self.p_contourdata, vmin=tpmin, vmax=tpmax, levels=self.p_levels, cmap=self.p_colormap)
+        if (self.p_contourkind == 'ele'): # ele
+            self.p_tripcolor.set_array(self.p_contourdata)
+            self.p_tripcolor.set_clim(tpmin, tpmax)
+        # if END
+        if ( len(self.p_contourbounds)==0 ): # Bounds follow the data of each frame.
+            self.p_cbar.update_normal(self.p_tripcolor)
+            self.p_cbar.set_ticks(self.p_ticks)
+        # if END
+
+        if ( (self.p_quiver != None) and (len(self.vxsource)>0) ):
+            delta = 0.5 * (self.p_vectorxdelta + self.p_vectorydelta) # average of x and y-delta
+            kk = self.p_vectorscale * delta
+            ii = self.gri.ravel()
+            self.p_quiver.set_UVC(kk*self.vxsource[ii], kk*self.vysource[ii])
+        # if END
+
+        self.plotLag(ax)
+        plt.figure(self.p_figure.number) # title()/text() of the caller go to this figure
+    # def END
+
     #===============================================================================================================================
     # populateRegularGrid
     #  input:
@@ -1152,6 +2067,19 @@ class FVCOMData:
 #===================================================================================================================================
     def setPlotBlocking(self,value):
         self.p_blocking=value
+#===================================================================================================================================
+    def setPlotAnimate(self,value):
+        self.p_animate=value
+        self.p_figure=None
+#===================================================================================================================================
+    def setPlotBoundsMode(self,mode,percentiles=None):
+        if ( mode not in ["global", "layer", "percentile"] ):
+            print("ERROR: Unknown bounds mode ({}). Valid options are: global, layer, percentile.".format(mode))
+            return -1
+        self.p_boundsmode = mode
+        if ( percentiles is not None ):
+            self.p_boundspercentiles = percentiles
+        return 0
 #===================================================================================================================================
     def setPlotSize(self,pxinch,pyinch):
         self.p_xinch = pxinch
@@ -1206,20 +2134,111 @@ class FVCOMData:
 
 
 
-    def exportcsv(self,fn,separator=","):
-        s = []
-        ss=[]
-        for j in range(len(self.d_datatitle)):
-            ss.append(self.d_datatitle[j])
-        s.append(separator.join(ss))
-        for i in range(len(self.d_datahandle[0])):
-            ss=[]
-            for j in range(len(self.d_datahandle)):
-                ss.append("{}".format(self.d_datahandle[j][i]))
-            s.append(",".join(ss))
-        s="\n".join(s)
-        io.writeFile(fn, s)
+# =================================================================
+# exportcsv()::
+# Writes the getData()/getStationData() columns (d_datatitle, d_datahandle)
+# as text, streamed in blocks of blockrows rows. Each block is formatted
+# column-wise by numpy (shortest repr of each value), so memory use is
+# bounded by the block. The separator is used in the header and data rows.
+#
+    def exportcsv(self,fn,separator=",",blockrows=EXPORTBLOCKROWS):
+        print("Exporting data (text) to {} ...".format(fn))
+        nrows = len(self.d_datahandle[0])
+        with open(fn, "w") as f:
+            f.write(separator.join(str(t) for t in self.d_datatitle))
+            for r0 in range(0, nrows, blockrows):
+                r1 = min(nrows, r0 + blockrows)
+                cols = [ np.ma.filled(h[r0:r1], np.nan).astype(str) for h in self.d_datahandle ]
+                rows = np.stack(cols, axis=1).tolist()
+                f.write("\n")
+                f.write("\n".join(separator.join(row) for row in rows))
+            # for END
+        # with END
+        print("Exporting data (text) to {} ... DONE ({} rows)".format(fn, nrows))
+        return 0
+    # def END
+
+
+# =================================================================
+# exportParquet()::
+# Writes the getData()/getStationData() columns to a Parquet file
+# (one column per title), in row groups of blockrows rows. Needs pyarrow.
+#
+    def exportParquet(self,fn,blockrows=EXPORTBLOCKROWS):
+        if (pa is None):
+            print("ERROR: pyarrow is not available. Parquet export of {} skipped.".format(fn))
+            return -1
+        # if END
+        print("Exporting data (Parquet) to {} ...".format(fn))
+        nrows = len(self.d_datahandle[0])
+        names = [ str(t) for t in self.d_datatitle ]
+        writer = None
+        for r0 in range(0, max(nrows, 1), blockrows):
+            r1 = min(nrows, r0 + blockrows)
+            cols = [ pa.array(np.ma.filled(h[r0:r1], np.nan)) for h in self.d_datahandle ]
+            table = pa.Table.from_arrays(cols, names=names)
+            if (writer is None):
+                writer = pq.ParquetWriter(fn, table.schema)
+            # if END
+            writer.write_table(table)
+        # for END
+        writer.close()
+        print("Exporting data (Parquet) to {} ... DONE ({} rows)".format(fn, nrows))
+        return 0
+    # def END
 
 
+# =================================================================
+# exportNetCDF()::
+# Writes the getDataBatch()/getStationDataBatch() result (d_data, d_labels)
+# as a NetCDF time series: one variable (time, point) per field, plus the
+# element and siglay (and station coordinates) of each point. Written in
+# blocks of blockrows time steps.
+#
+    def exportNetCDF(self,fn,blockrows=EXPORTBLOCKROWS):
+        print("Exporting data (NetCDF) to {} ...".format(fn))
+        nt, npoint, nfield = self.d_data.shape
+        points = self.d_labels["points"]
+        f = netCDF4.Dataset(fn, "w")
+        f.source = self.filename
+        f.createDimension("time", None)
+        f.createDimension("point", npoint)
+        vtime = f.createVariable("time", self.d_labels["time"].dtype, ("time",))
+        if ("units" in self.time.ncattrs()):
+            vtime.units = self.time.units
+        # if END
+        f.createVariable("element", "i4", ("point",))[:] = points[:, -2]
+        f.createVariable("siglay", "i4", ("point",))[:] = points[:, -1]
+        if ("stations" in self.d_labels):
+            f.createVariable("station", "i4", ("point",))[:] = points[:, 0]
+            f.createVariable("station_x", "f8", ("point",))[:] = self.d_labels["stations"][points[:, 0], 0]
+            f.createVariable("station_y", "f8", ("point",))[:] = self.d_labels["stations"][points[:, 0], 1]
+        # if END
+        fvars = [ f.createVariable(self.d_labels["fields"][j], self.d_data.dtype, ("time", "point"), zlib=False) for j in range(nfield) ]
+        for t0 in range(0, nt, blockrows):
+            t1 = min(nt, t0 + blockrows)
+            vtime[t0:t1] = self.d_labels["time"][t0:t1]
+            for j in range(nfield):
+                fvars[j][t0:t1, :] = self.d_data[t0:t1, :, j]
+            # for END
+        # for END
+        f.close()
+        print("Exporting data (NetCDF) to {} ... DONE ({} time steps x {} points x {} fields)".format(fn, nt, npoint, nfield))
+        return 0
+    # def END
 
 
+# =================================================================
+# exportData()::
+# Writes the extracted data in the format given by the file suffix:
+# .parquet (exportParquet), .nc (exportNetCDF), otherwise text (exportcsv).
+#
+    def exportData(self,fn,separator=","):
+        ext = os.path.splitext(fn)[1].lower()
+        if (ext == ".parquet"):
+            return self.exportParquet(fn)
+        elif (ext == ".nc"):
+            return self.exportNetCDF(fn)
+        # if END
+        return self.exportcsv(fn, separator)
+    # def END
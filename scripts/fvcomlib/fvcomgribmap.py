@@ -9,6 +9,14 @@ import matplotlib.tri as mtri
 import matplotlib as mpl
 import os
 import math
+import sys
+import hashlib
+try:
+    from scipy.spatial import cKDTree
+    from scipy.sparse import csr_matrix
+except ImportError:
+    cKDTree = None
+    csr_matrix = None
 
 
 VERBOSE = False
@@ -21,6 +29,10 @@ NM = 1852
 MinPerDeg = 60
 GribCellWidthDeg = 0.2
 SQRT2 = 1.41421356237
+NEARCHUNK = 4096 # Entries per block in the brute-force nearest point fallback.
+CACHEVERSION = 2 # Increase when the layout of the map cache file changes
+WINDFIELDS = ["u10", "v10", "ws", "wd", "wx", "wy"] # Order of transmapWindPolar* return values
+NODEFIELDS = ["mslp", "t2", "cdrx", "tpx"]          # Order of transmapSimple/1D/Gauss return values
 
 
 class FvcomGribMap:
@@ -76,6 +88,12 @@ class FvcomGribMap:
         self.GaussCorrectionFactor = SQRT2*SQRT2
 
         self.GaussSigma = (1* NM)
+        # Interpolation weights (see buildWeightMatrix)
+        self.w_method = None # "simple", "1D" or "gauss"
+        self.w_idx = None    # (entries, K) flat GRIB point index
+        self.w_val = None    # (entries, K) normalized weights
+        self.W = None        # (entries, GRIB points) sparse CSR matrix - if scipy is available
+        self.enmap = None    # (nodes) 1-indexed element touching each node - diagnostic only (see buildEleToNodeMap)
 
 
         # PLOTTING
@@ -87,6 +105,8 @@ class FvcomGribMap:
         self.p_figure                   = None
         self.p_plt                      = None
         self.p_triangulation            = None
+        self.p_animate                  = False # Reuse figure, mesh, colorbar and quiver per plot key (see plotContourUpdate)
+        self.p_anim                     = {}    # animkey -> {"fig", "ax", "tripcolor", "quiver", "tpmin", "tpmax", "levels"}
         self.p_colormap_default         = mpl.colormaps['jet']
         self.p_colormap                 = self.p_colormap_default # Cyclic: hsv. Progressive: jet. From: https://matplotlib.org/
                                              # stable/users/explain/colors/colormaps.html
@@ -141,65 +161,51 @@ class FvcomGribMap:
         self.fgmap=np.zeros((self.fvcomgrid.cellcount, 2),dtype=int)
         #
         ilen=self.fvcomgrid.cellcount # disable if debug
-        progStr = "Building element map {:4.0f}%"
-        for i in range(ilen):
-            # Calculate all d1-norms from current cellcenter (i), to all x and y in GRIB data:
-            d1=u.d1norm(self.gribdata.x,self.gribdata.y,self.fvcomgrid.cellCenters[i,0],self.fvcomgrid.cellCenters[i,1])
-            # Find index-set of smallest d1.
-            (ibest, jbest) = np.unravel_index(np.argmin(d1, axis=None), d1.shape)
-            if DEBUG:
-                if (i<20):
-                    print("ibest:{}     jbest: {}    d1.shape:{}".format(ibest,jbest,d1.shape))
-            # Store the map
-            self.fgmap[i,I_FG]=ibest
-            self.fgmap[i,J_FG]=jbest
-
-            if self.verbose:
+        print("Building element map ...")
+        # Find index-set of smallest d1 for all cellcenters in one query.
+        (ibest, jbest, dbest) = self.findNearestGribPoints(self.fvcomgrid.cellCenters[:,0],self.fvcomgrid.cellCenters[:,1])
+        if DEBUG:
+            for i in range(min(20,ilen)):
+                print("ibest:{}     jbest: {}    d1.shape:{}".format(ibest[i],jbest[i],self.gribdata.x.shape))
+        # Store the map
+        self.fgmap[:,I_FG]=ibest
+        self.fgmap[:,J_FG]=jbest
+
+        if self.verbose:
+            for i in range(ilen):
                 if (i < 10 or i > (ilen-10)  ):
+                    ib, jb = ibest[i], jbest[i]
                     print("{:5d}: GX[{}] GY[{}] (d={:8.1f}) F({:8.1f},{:8.1f}) <-> G({:8.1f},{:8.1f}) => ({:8.1f},{:8.1f})"
-                        .format(i,ibest,jbest,d1[ibest,jbest], self.fvcomgrid.cellCenters[i,0],self.fvcomgrid.cellCenters[i,1],self.gribdata.x[ibest,jbest],self.gribdata.y[ibest,jbest],self.fvcomgrid.cellCenters[i,0]-self.gribdata.x[ibest,jbest],self.fvcomgrid.cellCenters[i,1]-self.gribdata.y[ibest,jbest]))
-
-
-            u.prog(i,ilen-1,0.25,progStr)
-            #if END
-        #for END
+                        .format(i,ib,jb,dbest[i], self.fvcomgrid.cellCenters[i,0],self.fvcomgrid.cellCenters[i,1],self.gribdata.x[ib,jb],self.gribdata.y[ib,jb],self.fvcomgrid.cellCenters[i,0]-self.gribdata.x[ib,jb],self.fvcomgrid.cellCenters[i,1]-self.gribdata.y[ib,jb]))
+                #if END
+            #for END
+        #if END
         self.maptype="ele"
+        self.w_method=None # Weights must be rebuilt for the new map
         self.entrycount=self.fvcomgrid.cellcount
         print("Mapping elements done.")
     # def END
     #====================================================================================
     #====================================================================================
-    # buildMapElement
+    # buildEleToNodeMap
+    # Diagnostic only: the first element touching each node and a check of the element-node indices. The
+    # element -> node values use the area-weighted operator on the grid (see eleToNodeValues).
     def buildEleToNodeMap(self):
         print("Mapping element-nodes ...")
         jMax=9876543210
-        self.enmap=np.multiply(jMax,np.ones((self.fvcomgrid.nodecount),dtype=int))
-        jlen=self.fvcomgrid.cellcount # disable if debug
-        progStr = "Building element-node map {:4.0f}%"
-        for j in range(jlen):
-            in0=self.fvcomgrid.cells[j,0]-1 # Indexes are 0-indexed
-            in1=self.fvcomgrid.cells[j,1]-1 # Indexes are 0-indexed
-            in2=self.fvcomgrid.cells[j,2]-1 # Indexes are 0-indexed
-            self.enmap[in0]=min(self.enmap[in0],j+1) # Values are 1-indexed
-            self.enmap[in1]=min(self.enmap[in1],j+1) # Values are 1-indexed
-            self.enmap[in2]=min(self.enmap[in2],j+1) # Values are 1-indexed
-            if DEBUG:
-                if j<10:
-                    print("cell{}:  {}  {}  {}".format(j+1,self.fvcomgrid.cells[j,0],self.fvcomgrid.cells[j,1],self.fvcomgrid.cells[j,2]))
-                # if END
-            #if END
-            #
-            # Print progress...
-            u.prog(j,jlen-1,0.25,progStr)
-        #for j END
+        first=self.fvcomgrid.getNodeFirstElements() # 0-indexed lowest element at each node, -1 for orphans (CSR adjacency on the grid)
+        self.enmap=np.where(first>=0,first+1,jMax) # Values are 1-indexed
+        if DEBUG:
+            for j in range(min(10,self.fvcomgrid.cellcount)):
+                print("cell{}:  {}  {}  {}".format(j+1,self.fvcomgrid.cells[j,0],self.fvcomgrid.cells[j,1],self.fvcomgrid.cells[j,2]))
+            # for END
+        #if END
         #
-        iErrors = 0
-        for i in range(self.fvcomgrid.nodecount):
-            if (self.enmap[i]<0 or self.enmap[i]>self.fvcomgrid.cellcount):
-                print("ERROR: Index of Element-Node (node:{}) outside cell count: {}.".format(i,self.enmap[i]))
-                iErrors = iErrors + 1
-            # if END
+        bad=np.flatnonzero((self.enmap<0) | (self.enmap>self.fvcomgrid.cellcount))
+        for i in bad:
+            print("ERROR: Index of Element-Node (node:{}) outside cell count: {}.".format(i,self.enmap[i]))
         # for i END
+        iErrors = len(bad)
 
         if DEBUG:
             for i in range(10):
@@ -219,34 +225,23 @@ class FvcomGribMap:
         self.fgmap=np.zeros((self.fvcomgrid.nodecount, 2),dtype=int)
         #
         ilen=self.fvcomgrid.nodecount # disable if debug
-        progStr = "Building node map {:4.0f}%"
-
-        ##dxr=np.zeros((ilen,self.gribdata.x.shape[0],self.gribdata.x.shape[1]))
-        for i in range(ilen):
-            d1=u.d1norm(self.gribdata.x,self.gribdata.y,self.fvcomgrid.nodes[i,fvcomgrid.inX],self.fvcomgrid.nodes[i,fvcomgrid.inY])
-            (ibest, jbest) = np.unravel_index(np.argmin(d1, axis=None), d1.shape)
-            ##dx=d1
-            ##dxr[i,:,:]=dx
-            ###ix = np.argmin(dx)
-            ##ibest0, jbest0 = ibest, jbest
-            ##(ibest, jbest) = np.unravel_index(np.argmin(dx, axis=None), dx.shape)
+        print("Building node map ...")
+        (ibest, jbest, dbest) = self.findNearestGribPoints(self.fvcomgrid.nodes[:,fvcomgrid.inX],self.fvcomgrid.nodes[:,fvcomgrid.inY])
 
+        self.fgmap[:,I_FG]=ibest
+        self.fgmap[:,J_FG]=jbest
 
-            ##if (ibest==ibest0 and jbest==jbest0):
-                ##print("WARNING - SAME INDEX: {}=={} and {}=={}".format(ibest,ibest0,jbest,jbest0))
-
-            self.fgmap[i,I_FG]=ibest
-            self.fgmap[i,J_FG]=jbest
-
-            if self.verbose:
+        if self.verbose:
+            for i in range(ilen):
                 if (i < 10 or i > (ilen-10)  ):
+                    ib, jb = ibest[i], jbest[i]
                     print("{:5d}: GX[{}] GY[{}] (d={:8.1f}) F({:8.1f},{:8.1f}) <-> G({:8.1f},{:8.1f}) => ({:8.1f},{:8.1f})"
-                        .format(i,ibest,jbest,d1[ibest,jbest], self.fvcomgrid.nodes[i,0],self.fvcomgrid.nodes[i,1],self.gribdata.x[ibest,jbest],self.gribdata.y[ibest,jbest],self.fvcomgrid.nodes[i,0]-self.gribdata.x[ibest,jbest],self.fvcomgrid.nodes[i,1]-self.gribdata.y[ibest,jbest]))
+                        .format(i,ib,jb,dbest[i], self.fvcomgrid.nodes[i,0],self.fvcomgrid.nodes[i,1],self.gribdata.x[ib,jb],self.gribdata.y[ib,jb],self.fvcomgrid.nodes[i,0]-self.gribdata.x[ib,jb],self.fvcomgrid.nodes[i,1]-self.gribdata.y[ib,jb]))
                 # if END
-            #if END
-            u.prog(i,ilen,0.25,progStr)
-        #for END
+            #for END
+        #if END
         self.maptype="node"
+        self.w_method=None # Weights must be rebuilt for the new map
         self.entrycount=self.fvcomgrid.nodecount
         print("Mapping nodes done.")
     # def END
@@ -254,6 +249,87 @@ class FvcomGribMap:
 #
 #=============================================================================================================================
 #=============================================================================================================================
+# buildMapCached
+# Loads fgmap and weights from the cache file (.npz) if its key matches the current
+# grid, GRIB geometry, method and Gauss parameters. Otherwise the map is built and the cache file is (re)written.
+    def buildMapCached(self, maptype, method, fn):
+        if self.loadCache(fn, maptype, method):
+            return True
+        # if END
+        if (maptype == "ele"):
+            self.buildElementMap()
+        elif (maptype == "node"):
+            self.buildNodeMap()
+        else:
+            print("ERROR: Invalid map type: [{}]. Exiting.".format(maptype))
+            sys.exit(1)
+        # if END
+        self.buildWeightMatrix(method)
+        self.saveCache(fn, method)
+        return False
+    # def END
+#=============================================================================================================================
+# getCacheKey
+# Hash of everything the map and weights depend on.
+    def getCacheKey(self, maptype, method):
+        h = hashlib.sha1()
+        h.update("v{} {} {}".format(CACHEVERSION, maptype, method).encode())
+        h.update("{!r} {!r} {!r} {!r} {!r}".format(self.GaussLat, self.GaussNearN, self.GaussCorrectionFactor, self.GaussSigma, self.GribCellWidthDeg).encode())
+        for a in [self.fvcomgrid.nodes[:,[fvcomgrid.inX,fvcomgrid.inY]], self.fvcomgrid.cells, self.gribdata.lat, self.gribdata.lon]:
+            a = np.ascontiguousarray(a)
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        # for END
+        return h.hexdigest()
+    # def END
+#=============================================================================================================================
+# loadCache
+    def loadCache(self, fn, maptype, method):
+        if not os.path.isfile(fn):
+            print("Map cache file not found: \"{}\". Building map.".format(fn))
+            return False
+        # if END
+        key = self.getCacheKey(maptype, method)
+        try:
+            with np.load(fn) as c:
+                if (str(c["key"]) != key):
+                    print("Map cache file \"{}\" does not match grid/GRIB/method. Rebuilding map.".format(fn))
+                    return False
+                # if END
+                self.fgmap = c["fgmap"]
+                self.w_idx = c["w_idx"]
+                self.w_val = c["w_val"]
+        except Exception as e:
+            print("WARNING: Could not read map cache file \"{}\" ({}). Rebuilding map.".format(fn,e))
+            return False
+        # try END
+        self.maptype = maptype
+        self.entrycount = self.fvcomgrid.cellcount if (maptype == "ele") else self.fvcomgrid.nodecount
+        self.w_method = method
+        self.buildSparseWeights()
+        print("Map loaded from cache file: \"{}\" ({}, {}).".format(fn, maptype, method))
+        return True
+    # def END
+#=============================================================================================================================
+# saveCache
+    def saveCache(self, fn, method):
+        if (self.w_method != method):
+            self.buildWeightMatrix(method)
+        # if END
+        # Written to a temporary file and renamed, so fn is exactly the given name and never left truncated.
+        tmp = fn + ".tmp.npz"
+        try:
+            np.savez(tmp, key=self.getCacheKey(self.maptype, method), fgmap=self.fgmap, w_idx=self.w_idx, w_val=self.w_val)
+            os.replace(tmp, fn)
+            print("Map cache file written: \"{}\" ({}, {}).".format(fn, self.maptype, method))
+        except Exception as e:
+            print("WARNING: Could not write map cache file \"{}\". [{}]".format(fn, e))
+        # try END
+    # def END
+#=============================================================================================================================
+#
+#=============================================================================================================================
+#=============================================================================================================================
 # calcWindCartesian
     def calcWindCartesian(self):
         #self.windCartesian = ForcingDataCartesian()
@@ -264,6 +340,44 @@ class FvcomGribMap:
         return self.WX, self.WY
     # def END
 #=============================================================================================================================
+#
+#=============================================================================================================================
+#=============================================================================================================================
+# findNearestGribPoints
+# Finds the nearest GRIB point (ibest, jbest) for all points (px, py) in one query.
+# Uses a KD-tree over the GRIB x/y lattice (scipy), or a blocked brute-force argmin if scipy is unavailable.
+# Ties are resolved as np.argmin(d1norm(...)) does, i.e. the same (ibest, jbest) as the per-entry search.
+    def findNearestGribPoints(self, px, py):
+        gx = np.ravel(self.gribdata.x)
+        gy = np.ravel(self.gribdata.y)
+        px = np.asarray(px,dtype=float)
+        py = np.asarray(py,dtype=float)
+        npts = np.size(px)
+        kbest = np.zeros(npts,dtype=int)
+        dbest = np.zeros(npts,dtype=float)
+        if (cKDTree is not None and np.size(gx) > 1):
+            tree = cKDTree(np.column_stack((gx,gy)))
+            # Up to 4 GRIB points can be equidistant on a regular lattice.
+            (dk, kk) = tree.query(np.column_stack((px,py)), k=min(4,np.size(gx)))
+            kk = np.reshape(kk,(npts,-1))
+            # Re-evaluate the candidates with d1norm in flat index order, so (near) ties resolve as np.argmin does.
+            kk = np.sort(kk, axis=1)
+            d1 = u.d1norm(gx[kk], gy[kk], px[:,np.newaxis], py[:,np.newaxis])
+            kmin = np.argmin(d1, axis=1)
+            kbest = kk[np.arange(npts), kmin]
+            dbest = d1[np.arange(npts), kmin]
+        else:
+            for i0 in range(0, npts, NEARCHUNK):
+                i1 = min(i0+NEARCHUNK, npts)
+                d1 = u.d1norm(gx[np.newaxis,:], gy[np.newaxis,:], px[i0:i1,np.newaxis], py[i0:i1,np.newaxis])
+                kbest[i0:i1] = np.argmin(d1, axis=1)
+                dbest[i0:i1] = d1[np.arange(i1-i0), kbest[i0:i1]]
+            # for END
+        # if END
+        (ibest, jbest) = np.unravel_index(kbest, self.gribdata.x.shape)
+        return ibest, jbest, dbest
+    # def END
+#=============================================================================================================================
 #=============================================================================================================================
 #
     def getEntryX(self, index):
@@ -435,52 +549,55 @@ class FvcomGribMap:
     # def END
     #====================================================================================
     #====================================================================================
-    def plot(self,fn, timeIndex):
+    def plot(self,fn, timeIndex, animkey=None):
         plt=None
         tix=self.gribdata.mjd[timeIndex]
+        if (animkey == None):
+            animkey = fn
+        # if END
 
         if fn == "ws":
-            plt=self.plotContour(self.WS,timeIndex,"ele","WindSpeed (MJD={:.3f})".format(tix),"Wind speed (m/s)")
+            plt=self.plotContour(self.WS,timeIndex,"ele","WindSpeed (MJD={:.3f})".format(tix),"Wind speed (m/s)",animkey=animkey)
         elif fn == "wd":
             tmp_cml = self.p_colormapbounds
             tmp_ntl = self.p_nTicks
             self.p_nTicks = 13
             self.p_colormapbounds = [0, 360]
-            plt=self.plotContour(self.WD,timeIndex,"ele","WindDirection (MJD={:.3f})".format(tix),"Wind direction (deg)")
+            plt=self.plotContour(self.WD,timeIndex,"ele","WindDirection (MJD={:.3f})".format(tix),"Wind direction (deg)",animkey=animkey)
             self.p_colormapbounds = tmp_cml
             self.p_nTicks = tmp_ntl
 
         elif fn == "wx":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "wy":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "u10":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "v10":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "mslp":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "t2":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "cdr":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "cdrx":
-            plt=self.plotContour(self.CDRX,timeIndex,'node',"CDRX (MJD={:.3f})".format(tix),"Radiation (W/m2)")
+            plt=self.plotContour(self.CDRX,timeIndex,'node',"CDRX (MJD={:.3f})".format(tix),"Radiation (W/m2)",animkey=animkey)
         elif fn == "tp":
-            plt=self.plotContour(self.TP,timeIndex,'node',"TP (MJD={:.3f})".format(tix),"Total precipitation (acc.) (m)")
+            plt=self.plotContour(self.TP,timeIndex,'node',"TP (MJD={:.3f})".format(tix),"Total precipitation (acc.) (m)",animkey=animkey)
         elif fn == "tpx":
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
         elif fn == "c1":
-            plt=self.plotContour(self.C1,timeIndex,'node',"C1 (MJD={:.3f})".format(tix),"C1 cloud cover (0-1)")
+            plt=self.plotContour(self.C1,timeIndex,'node',"C1 (MJD={:.3f})".format(tix),"C1 cloud cover (0-1)",animkey=animkey)
         elif fn == "c2":
-            plt=self.plotContour(self.C2,timeIndex,'node',"C2 (MJD={:.3f})".format(tix),"C2 cloud cover (0-1)")
+            plt=self.plotContour(self.C2,timeIndex,'node',"C2 (MJD={:.3f})".format(tix),"C2 cloud cover (0-1)",animkey=animkey)
         elif fn == "c3":
-            plt=self.plotContour(self.C3,timeIndex,'node',"C3 (MJD={:.3f})".format(tix),"C3 cloud cover (0-1)")
+            plt=self.plotContour(self.C3,timeIndex,'node',"C3 (MJD={:.3f})".format(tix),"C3 cloud cover (0-1)",animkey=animkey)
         elif fn == "ws_en":
             xx=self.getField(fn)
             #print(xx)
             xx=self.getFieldKind(fn)
-            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn))
+            plt=self.plotContour(self.getField(fn),timeIndex,self.getFieldKind(fn),self.getFieldPlotTitle(fn).format(tix),self.getFieldPlotColorbarLabel(fn),animkey=animkey)
 
 
 
@@ -499,7 +616,7 @@ class FvcomGribMap:
     #
     #====================================================================================
     #====================================================================================
-    def plotContour(self, field, timeIndex,pcontourkind = "ele",ptitle="Arb. measure at any time", pcolorbarlabel="Arbitrary measure (arb. unit)"):
+    def plotContour(self, field, timeIndex,pcontourkind = "ele",ptitle="Arb. measure at any time", pcolorbarlabel="Arbitrary measure (arb. unit)", animkey=None):
         self.p_title=ptitle
         self.p_colorbarlabel=pcolorbarlabel
 
@@ -510,7 +627,11 @@ class FvcomGribMap:
             mpl.use("Agg")
         # if END
         #
-        if (not self.p_plt is None):
+        if ( self.p_animate and (animkey in self.p_anim) ):
+            return self.plotContourUpdate(contourdata,pcontourkind,animkey)
+        # if END
+        #
+        if ( (not self.p_plt is None) and (not self.p_animate) ):
             self.p_plt.close()
         # if END
         self.p_plt=plt
@@ -563,6 +684,10 @@ class FvcomGribMap:
         self.showColorbar()
         self.p_plt.title(self.p_title)
         self.p_figure=fig
+        if ( self.p_animate and (animkey != None) ):
+            self.p_anim[animkey] = { "fig" : fig, "ax" : ax, "tripcolor" : self.p_tripcolor, "quiver" : None,
+                                     "tpmin" : tpmin, "tpmax" : tpmax, "levels" : self.p_levels }
+        # if END
 
         if (not blocking):
             plt.ion() #if non-blocking
@@ -572,6 +697,30 @@ class FvcomGribMap:
         return plt
     # def END
 #=============================================================================================================================
+# plotContourUpdate
+# Animation mode (p_animate): reuses the figure, mesh and colorbar created by
+# the first plotContour() call with the same animkey. Only the contour data
+# and the title are replaced. The colour bounds are those of the first call,
+# which are taken from the whole field (all time steps) or p_colormapbounds.
+#
+    def plotContourUpdate(self, contourdata, pcontourkind, animkey):
+        a = self.p_anim[animkey]
+        if (pcontourkind == 'node'): # node - a filled contour set cannot be updated in place
+            a["tripcolor"].remove()
+            a["tripcolor"] = a["ax"].tricontourf(self.p_triangulation, contourdata, vmin=a["tpmin"], vmax=a["tpmax"], levels=a["levels"], cmap=self.p_colormap)
+        # if END
+        if (pcontourkind == 'ele'): # ele
+            a["tripcolor"].set_array(contourdata)
+        # if END
+        a["ax"].set_title(self.p_title)
+        self.p_tripcolor = a["tripcolor"]
+        self.p_figure = a["fig"]
+        self.p_ax = a["ax"]
+        self.p_plt = plt
+        plt.figure(a["fig"].number)
+        return plt
+    # def END
+#=============================================================================================================================
 #
 #=============================================================================================================================
 #=============================================================================================================================
@@ -589,7 +738,8 @@ class FvcomGribMap:
         tmp_bool = self.p_saveplot
         self.p_saveplot = False
         #plt = self.plotContour(cField,timeIndex,pcontourKind,ptitle,pcolorbarlabel)
-        plt = self.plot(contourFieldName,timeIndex)
+        animkey = "{}-{}-{}".format(contourFieldName,xfieldName, yfieldName)
+        plt = self.plot(contourFieldName,timeIndex,animkey)
         self.p_saveplot = tmp_bool
         #
         #
@@ -602,14 +752,28 @@ class FvcomGribMap:
         # if END
         self.p_xc = self.fvcomgrid.cellCenters[:,0]
         self.p_yc = self.fvcomgrid.cellCenters[:,1]
-        for i in range(self.p_gm):
-            for j in range(self.p_gn):
-                #print("{}  {}      {}  {}        {}   {} ".format(i,j, self.p_xc[self.p_grid[i][j]], self.p_yc[self.p_grid[i][j]], xField[self.p_grid[i][j],timeIndex],  yField[self.p_grid[i][j],timeIndex]))
-                plt.arrow(self.p_xc[self.p_grid[i][j]], self.p_yc[self.p_grid[i][j]],
-                            kk*xField[self.p_grid[i][j],timeIndex], kk*yField[self.p_grid[i][j],timeIndex],
-                            head_width = 500.2, width = 0.05, color = self.p_vectorcolor)
+        if (self.p_animate):
+            # One quiver artist per animkey, later frames only replace U and V.
+            ii = self.p_grid.ravel()
+            U = kk*xField[ii,timeIndex]
+            V = kk*yField[ii,timeIndex]
+            a = self.p_anim[animkey]
+            if (a["quiver"] is None):
+                a["quiver"] = a["ax"].quiver(self.p_xc[ii], self.p_yc[ii], U, V, angles='xy', scale_units='xy', scale=1, units='xy',
+                                             width=50, headwidth=10, headlength=15, headaxislength=13.5, color=self.p_vectorcolor)
+            else:
+                a["quiver"].set_UVC(U, V)
+            # if END
+        else:
+            for i in range(self.p_gm):
+                for j in range(self.p_gn):
+                    #print("{}  {}      {}  {}        {}   {} ".format(i,j, self.p_xc[self.p_grid[i][j]], self.p_yc[self.p_grid[i][j]], xField[self.p_grid[i][j],timeIndex],  yField[self.p_grid[i][j],timeIndex]))
+                    plt.arrow(self.p_xc[self.p_grid[i][j]], self.p_yc[self.p_grid[i][j]],
+                                kk*xField[self.p_grid[i][j],timeIndex], kk*yField[self.p_grid[i][j],timeIndex],
+                                head_width = 500.2, width = 0.05, color = self.p_vectorcolor)
+                # for END
             # for END
-        # for END
+        # if END
         if self.p_saveplot:
             self.saveplot("img/fvcomgribmap-{}-{}-{}-{:05d}.png".format(contourFieldName,xfieldName, yfieldName,timeIndex))
 
@@ -660,18 +824,21 @@ class FvcomGribMap:
 #=============================================================================================================================
 #
     def propertyEleToNode(self,elefield):
-        if (self.fvcomgrid.enMap == []):
-            self.fvcomgrid.calcEleNodeMap()
-        NF = np.zeros((self.fvcomgrid.nodecount, len(self.T)),dtype=float)
-        for i in range(self.fvcomgrid.nodecount):
-            print(i)
-            for t in range(len(self.T)):
-                k = self.fvcomgrid.enMap[i]
-                NF[i,t]=elefield[k,t]
-            # for END
-        # for END
+        NF = self.eleToNodeValues(np.asarray(elefield)[:, :len(self.T)]) # Area-weighted (sparse operator, see FVCOMGrid.buildTransferOperators)
         return NF
     # def END
+#=============================================================================================================================
+# eleToNodeValues
+# Area-weighted element -> node average for the forcing fields. Orphan nodes (no element) would get NaN, which must
+# not reach the forcing file: they are set to fill and listed in a warning (see cleangridorphans.py).
+    def eleToNodeValues(self, values, fill=0.0):
+        orphans = np.flatnonzero(self.fvcomgrid.getNodeFirstElements() < 0)
+        if (len(orphans) > 0):
+            print("WARNING: {} orphan node(s) without elements set to {}: {}{}".format(len(orphans), fill,
+                " ".join(str(i+1) for i in orphans[:20]), " ..." if (len(orphans) > 20) else ""))
+        # if END
+        return self.fvcomgrid.eleToNodeAverage(values, fill=fill)
+    # def END
 
 #=============================================================================================================================
 #=============================================================================================================================
@@ -722,178 +889,146 @@ class FvcomGribMap:
 #=============================================================================================================================
     def transmapWindPolarSimple(self):
         print("Transmapping SIMPLE from GRIB(u10,v10,ws,wd,wx,wy)[{},{},{}] to FVCOM(U10,V10,WS,WD,WX,WY)[{},{}] ...".format(self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #print(TN)
-        #wfp=ForcingDataPolar()
-        #
-        U10 = np.zeros((self.entrycount,TN),float)
-        V10 = np.zeros((self.entrycount,TN),float)
-        S   = np.zeros((self.entrycount,TN),float)
-        D   = np.zeros((self.entrycount,TN),float)
-        X   = np.zeros((self.entrycount,TN),float)
-        Y   = np.zeros((self.entrycount,TN),float)
-
-        progStr = "Transmapping (U10,V10,WS,WD,WX,WY) {:3.0f}%"
-
-        #
-        for i in range(self.entrycount):
-            for t in range(TN):
-                gi=self.fgmap[i,I_FG]
-                gj=self.fgmap[i,J_FG] # her stóð i_fg
-                U10[i,t] = self.gribdata.u10[gi,gj,t]
-                V10[i,t] = self.gribdata.v10[gi,gj,t]
-                X[i,t]   = self.gribdata.wx[gi,gj,t]
-                Y[i,t]   = self.gribdata.wy[gi,gj,t]
-                S[i,t]   = self.gribdata.ws[gi,gj,t]
-                D[i,t]   = self.gribdata.wd[gi,gj,t]
-
-            # for END
-            u.prog(i,self.entrycount-1,0.25,progStr)
-        # for END
-        #X, Y= u.calcWindXY(self.windPolar.S,self.windPolar.D)
-
+        U10, V10, S, D, X, Y = self.transmapFields(WINDFIELDS,"simple")
         return U10, V10, S, D, X, Y
     # def END
 #=============================================================================================================================
     def transmapWindPolar1D(self):
-        minDist = 250.0 # m
-        nearN = 1 # Nearest neightbors
-
         print("Transmapping 1D from GRIB(u10,v10,ws,wd,wx,wy)[{},{},{}] to FVCOM(U10,V10,WS,WD,WX,WY)[{},{}] ...".format(self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #wfp=ForcingDataPolar()
-        #
-        U10 = np.zeros((self.entrycount,TN),float)
-        V10 = np.zeros((self.entrycount,TN),float)
-        S  = np.zeros((self.entrycount,TN),float)
-        D  = np.zeros((self.entrycount,TN),float)
-        X   = np.zeros((self.entrycount,TN),float)
-        Y   = np.zeros((self.entrycount,TN),float)
-
-        #
-        xinf=self.gribdata.x.shape[0]
-        yinf=self.gribdata.x.shape[1]
-
-        progStr = "Transmapping (U10,V10,WS,WD,WX,WY) {:3.0f}%"
-
-        for i in range(self.entrycount):
-            gi = self.fgmap[i,I_FG]
-            gj = self.fgmap[i,J_FG] # her stóð i_fg
-            xs = self.gribdata.x[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            ys = self.gribdata.y[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            x0 = self.getEntryX(i)
-            y0 = self.getEntryY(i)
-            d = u.d1norm(xs,ys,x0,y0)
-            d = np.maximum(d,minDist)
-            w = np.divide(1.0,np.square(d))
-            wsum = np.sum(w)
-            #
-            for t in range(TN):
-                u10vals = self.gribdata.u10[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                v10vals = self.gribdata.v10[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wsvals = self.gribdata.ws[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wdvals = self.gribdata.wd[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wxvals = self.gribdata.wx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wyvals = self.gribdata.wy[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                u10 = np.sum(np.multiply(w, u10vals )) / wsum
-                v10 = np.sum(np.multiply(w, v10vals )) / wsum
-                ws  = np.sum(np.multiply(w, wsvals )) / wsum
-                wd  = np.sum(np.multiply(w, wdvals )) / wsum
-                wx  = np.sum(np.multiply(w, wxvals )) / wsum
-                wy  = np.sum(np.multiply(w, wyvals )) / wsum
-                U10[i,t] = u10
-                V10[i,t] = v10
-                S[i,t]   = ws
-                D[i,t]   = wd
-                WX[i,t]   = wx
-                Y[i,t]   = wy
-
-            # for END
-            u.prog(i,self.entrycount-1,0.25,progStr)
-            #X, Y= u.calcWindXY(self.windPolar.S,self.windPolar.D)
-        # for END
+        U10, V10, S, D, X, Y = self.transmapFields(WINDFIELDS,"1D")
         return U10, V10, S, D, X, Y
     # def END
 #=============================================================================================================================
     def transmapWindPolarGauss(self):
-        nearN = self.GaussNearN # Nearest neightbors
-        sigmaCorrectionFactor = self.GaussCorrectionFactor
-        cosLat = math.cos(self.GaussLat/180*math.pi)
-        sigma = sigmaCorrectionFactor * cosLat * ( (HALF * self.GribCellWidthDeg * MinPerDeg) ) * self.GaussSigma  # sqrt(2) times [smallest halftwidth of cell]= 1.4142 * 5217 = 7378 m
-        #sigma = 12000
-        #sigma = 1000
-        sigma2 = sigma**2
         print("Transmapping GAUSS from GRIB(u10,v10,ws,wd,wx,wy)[{},{},{}] to FVCOM(U10,V10,WS,WD,WX,WY)[{},{}] ...".format(self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #wfp=ForcingDataPolar()
-        U10 = np.zeros((self.entrycount,TN),float)
-        V10 = np.zeros((self.entrycount,TN),float)
-        S  = np.zeros((self.entrycount,TN),float)
-        D  = np.zeros((self.entrycount,TN),float)
-        X   = np.zeros((self.entrycount,TN),float)
-        Y   = np.zeros((self.entrycount,TN),float)
-
-        #
+        U10, V10, S, D, X, Y = self.transmapFields(WINDFIELDS,"gauss")
+        return U10, V10, S, D, X, Y
+    # def END
+    #====================================================================================
+    #====================================================================================
+    # buildWeightMatrix
+    # Builds the (entries x GRIB points) interpolation weights from fgmap for the chosen kernel:
+    #   simple : nearest GRIB point.
+    #   1D     : 3x3 neighbourhood, w = 1/max(d,minDist)^2.
+    #   gauss  : (2*GaussNearN+1)^2 neighbourhood, w = exp(-d^2/sigma^2).
+    # Weights are normalized per entry. Neighbourhoods are clipped at the GRIB sub-area edges.
+    # The weights are stored both padded (w_idx, w_val: entries x K) and, if scipy is available, as a CSR matrix (W).
+    def buildWeightMatrix(self, method):
         xinf=self.gribdata.x.shape[0]
         yinf=self.gribdata.x.shape[1]
-
-        progStr = "Transmapping (U10,V10,WS,WD,WX,WY) {:3.0f}%"
-
-        for i in range(self.entrycount):
-            gi = self.fgmap[i,I_FG] # Mapping millum fvcom og grib
-            gj = self.fgmap[i,J_FG] # Mapping millum fvcom og grib
-            xs = self.gribdata.x[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            ys = self.gribdata.y[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            x0 = self.getEntryX(i)
-            y0 = self.getEntryY(i)
-            #d = u.d1norm(xs,ys,x0,y0)
-            d2 = u.d2norm(xs,ys,x0,y0) # TODO Move this outside for optimization ...
-            w  = np.exp(-d2/sigma2)
-            wsum = np.sum(w)
-
-            for t in range(TN):
-                u10vals = self.gribdata.u10[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                v10vals = self.gribdata.v10[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wsvals = self.gribdata.ws[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wdvals = self.gribdata.wd[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wxvals = self.gribdata.wx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                wyvals = self.gribdata.wy[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-
-                u10 = np.sum(np.multiply(w, u10vals )) / wsum
-                v10 = np.sum(np.multiply(w, v10vals )) / wsum
-                ws  = np.sum(np.multiply(w, wsvals )) / wsum
-                wd  = np.sum(np.multiply(w, wdvals )) / wsum
-                wx  = np.sum(np.multiply(w, wxvals )) / wsum
-                wy  = np.sum(np.multiply(w, wyvals )) / wsum
-
-                U10[i,t] = u10
-                V10[i,t] = v10
-                S[i,t]   = ws
-                D[i,t]   = wd
-                X[i,t]   = wx
-                Y[i,t]   = wy
-
+        npoints = xinf*yinf
+        match method:
+            case "simple":
+                nearN = 0
+            case "1D":
+                nearN = 1 # Nearest neightbors
+                minDist = 250.0 # m
+            case "gauss":
+                nearN = self.GaussNearN # Nearest neightbors
+                cosLat = math.cos(self.GaussLat/180*math.pi)
+                sigma = self.GaussCorrectionFactor * cosLat * ( (HALF * self.GribCellWidthDeg * MinPerDeg) ) * self.GaussSigma  # sqrt(2) times [smallest halftwidth of cell]= 1.4142 * 5217 = 7378 m
+                sigma2 = sigma**2
+            case _:
+                print("ERROR: Invalid mapping method: [{}]. Exiting.".format(method))
+                sys.exit(1)
+        # match END
+        print("Building {} weight matrix [{} x {}] ...".format(method,self.entrycount,npoints))
+        gi = self.fgmap[:,I_FG]
+        gj = self.fgmap[:,J_FG]
+        x0 = self.getEntryX(slice(None))
+        y0 = self.getEntryY(slice(None))
+        offsets = np.arange(-nearN,nearN+1)
+        di, dj = np.meshgrid(offsets,offsets,indexing="ij")
+        ni = gi[:,np.newaxis] + np.ravel(di)[np.newaxis,:] # (entries, K)
+        nj = gj[:,np.newaxis] + np.ravel(dj)[np.newaxis,:] # (entries, K)
+        valid = (ni >= 0) & (ni < xinf) & (nj >= 0) & (nj < yinf)
+        ni = np.clip(ni,0,xinf-1)
+        nj = np.clip(nj,0,yinf-1)
+        xs = self.gribdata.x[ni,nj]
+        ys = self.gribdata.y[ni,nj]
+        match method:
+            case "simple":
+                w = np.ones(ni.shape,float)
+            case "1D":
+                d = u.d1norm(xs,ys,x0[:,np.newaxis],y0[:,np.newaxis])
+                d = np.maximum(d,minDist)
+                w = np.divide(1.0,np.square(d)) # Statistical weigth
+            case "gauss":
+                d2 = u.d2norm(xs,ys,x0[:,np.newaxis],y0[:,np.newaxis])
+                w  = np.exp(-d2/sigma2) # Statistical weigth
+        # match END
+        w = np.where(valid, w, 0.0)
+        wsum = np.sum(w,axis=1)  # Statistical weigth SUM / normalization value
+        self.w_idx = np.where(valid, ni*yinf + nj, 0) # Flat (C-order) GRIB point index
+        self.w_val = w / wsum[:,np.newaxis]
+        self.w_method = method
+        self.buildSparseWeights()
+        print("Building {} weight matrix DONE".format(method))
+        return self.W
+    # def END
+    #====================================================================================
+    #====================================================================================
+    # buildSparseWeights
+    # Builds the CSR matrix W from the padded weights (w_idx, w_val). W is None if scipy is unavailable.
+    def buildSparseWeights(self):
+        self.W = None
+        if (csr_matrix is not None):
+            npoints = self.gribdata.x.shape[0]*self.gribdata.x.shape[1]
+            rows = np.repeat(np.arange(self.entrycount),self.w_idx.shape[1])
+            self.W = csr_matrix((np.ravel(self.w_val),(rows,np.ravel(self.w_idx))),shape=(self.entrycount,npoints))
+            self.W.eliminate_zeros()
+        # if END
+        return self.W
+    # def END
+    #====================================================================================
+    #====================================================================================
+    # applyWeightMatrix
+    # Applies the weights to a set of GRIB fields (each [i,j,t]) in one go: the fields are stacked as
+    # (GRIB points x (fields*T)) and multiplied by W, giving (entries x T) for each field.
+    def applyWeightMatrix(self, gribFields):
+        if (len(gribFields) == 0):
+            return []
+        # if END
+        TN = gribFields[0].shape[2]
+        F = np.concatenate([ np.reshape(f,(-1,TN)) for f in gribFields ], axis=1)
+        if (self.W is not None):
+            R = self.W @ F
+        else:
+            R = np.zeros((self.entrycount,F.shape[1]),float)
+            for k in range(self.w_idx.shape[1]):
+                R += self.w_val[:,k,np.newaxis] * F[self.w_idx[:,k],:]
             # for END
-
-            u.prog(i,self.entrycount-1,0.25,progStr)
-
+        # if END
+        return [ R[:,n*TN:(n+1)*TN] for n in range(len(gribFields)) ]
+    # def END
+    #====================================================================================
+    #====================================================================================
+    # transmapFields
+    # Transmaps the named GRIB fields to FVCOM entries (nodes/elements) with the given method.
+    # The weight matrix is (re)built only when the method changes.
+    def transmapFields(self, fieldList, method):
+        if (self.w_method != method):
+            self.buildWeightMatrix(method)
+        # if END
+        gribFields = []
+        for fn in fieldList:
+            f = self.gribdata.getField(fn)
+            if (f is None):
+                print("ERROR: Unknown GRIB field: [{}]. Exiting.".format(fn))
+                sys.exit(1)
+            # if END
+            gribFields.append(f)
         # for END
-        return U10, V10, S, D, X, Y
+        return self.applyWeightMatrix(gribFields)
     # def END
     #====================================================================================
     #====================================================================================
     #
     def transmapEleToNodeValues(self,fieldList):
         if ("ws" in fieldList):
-            self.WS_EN = np.zeros((self.fvcomgrid.nodecount,self.getMJDCount()),float)
-            progStr = "Element-Node ({}) transmapping".format(", ".join(fieldList).strip())+" {:4.0f}%"
-            for i in range(self.fvcomgrid.nodecount):
-                for t in range(self.getMJDCount()):
-                    k=self.enmap[i]-1 # These values are 1-indexed, and must be 0-indexed
-                    self.WS_EN[i,t]=self.WS[k,t]
-                # for t END
-                u.prog(i,self.fvcomgrid.nodecount-1,0.25,progStr)
-            # for i END
+            print("Element-Node ({}) transmapping ...".format(", ".join(fieldList).strip()))
+            # Area-weighted average of the elements touching each node (sparse operator, see FVCOMGrid.buildTransferOperators)
+            self.WS_EN = self.eleToNodeValues(np.asarray(self.WS)[:,:self.getMJDCount()])
 
         return self.WS_EN
     # def END
@@ -929,157 +1064,31 @@ class FvcomGribMap:
     #=============================================================================================================================
     def transmapSimple(self,fields):
         print("Transmapping SIMPLE from GRIB(ws,wd)[{},{},{}] to FVCOM(WS,WD)[{},{}] ...".format(self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #
-        # Local variable initialization
-        MSLP = None
-        T2   = None
-        CDRX = None
-        TPX  = None
-        if "mslp" in fields: MSLP = np.zeros((self.entrycount,TN),float)
-        if "t2"   in fields: T2   = np.zeros((self.entrycount,TN),float)
-        if "cdrx" in fields: CDRX = np.zeros((self.entrycount,TN),float)
-        if "tpx"  in fields: TPX  = np.zeros((self.entrycount,TN),float)
-        #
-        progStr = "Node ({}) transmapping".format(", ".join(fields).strip())+" {:4.0f}%"
-        #
-        for i in range(self.entrycount):
-            for t in range(TN):
-                gi=self.fgmap[i,I_FG]
-                gj=self.fgmap[i,J_FG] # her stóð i_fg
-                MSLP[i,t] = self.gribdata.mslp[gi,gj,t]
-                T2[i,t]   = self.gribdata.t2[gi,gj,t]
-                CDRX[i,t] = self.gribdata.cdrx[gi,gj,t]
-                TPX[i,t]  = self.gribdata.tpx[gi,gj,t]
-            # for END
-            u.prog(i,self.entrycount-1,0.25,progStr)
-        # for END
-        return MSLP, T2, CDRX, TPX
+        return self.transmapNodeFields(fields,"simple")
     # def END
 #=============================================================================================================================
 #
 #=============================================================================================================================
 #=============================================================================================================================
     def transmap1D(self, fields):
-        minDist = 250.0 # m
-        nearN = 1 # Nearest neightbors
-
         print("Transmapping 1D from GRIB({})[{},{},{}] to FVCOM(WS,WD)[{},{}] ...".format(", ".join(fields),self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #
-        # Local variable initialization
-        MSLP = None
-        T2   = None
-        CDRX = None
-        TPX  = None
-        if "mslp" in fields: MSLP = np.zeros((self.entrycount,TN),float)
-        if "t2"   in fields: T2   = np.zeros((self.entrycount,TN),float)
-        if "cdrx" in fields: CDRX = np.zeros((self.entrycount,TN),float)
-        if "tpx"  in fields: TPX  = np.zeros((self.entrycount,TN),float)
-        #
-        progStr = "Node ({}) transmapping {:4.0f}%".format(", ".join(fields).strip())
-        #
-        xinf=self.gribdata.x.shape[0]
-        yinf=self.gribdata.x.shape[1]
-        for i in range(self.entrycount): # For each node/element in FVCOM do: Find best matching element
-            gi = self.fgmap[i,I_FG]
-            gj = self.fgmap[i,J_FG] # her stóð i_fg
-            xs = self.gribdata.x[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            ys = self.gribdata.y[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            x0 = self.getEntryX(i)
-            y0 = self.getEntryY(i)
-            d = u.d1norm(xs,ys,x0,y0)
-            d = np.maximum(d,minDist)
-            w = np.divide(1.0,np.square(d)) # Statistical weigth
-            wsum = np.sum(w)                # Statistical weigth SUM / normalization value
-            #
-            for t in range(TN):
-                vals  = self.gribdata.mslp[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                mslp  = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.t2[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                t2    = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.cdrx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                cdrx  = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.tpx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                tpx   = np.sum(np.multiply(w,vals)) / wsum
-
-                MSLP[i,t] = mslp
-                T2[i,t]   = t2
-                CDRX[i,t] = cdrx
-                TPX[i,t]  = tpx
-
-            # for END
-            #
-            u.prog(i,self.entrycount-1,0.25,progStr)
-            #if ( i % int(self.entrycount/10)  == 0 ): print("{:4.0f}%".format(int(100*i/self.fvcomgrid.cellcount)))
-        # for END
-        return MSLP, T2, CDRX, TPX
+        return self.transmapNodeFields(fields,"1D")
     # def END
 #=============================================================================================================================
     def transmapGauss(self, fields):
-        nearN = self.GaussNearN # Nearest neightbors
-        sigmaCorrectionFactor = self.GaussCorrectionFactor
-        cosLat = math.cos(self.GaussLat/180*math.pi)
-        sigma = sigmaCorrectionFactor * cosLat * ( (HALF * self.GribCellWidthDeg * MinPerDeg) ) * self.GaussSigma  # sqrt(2) times= 7378 m
-        #sigma = 12000
-        #sigma = 1000
-        sigma2 = sigma**2
         print("Transmapping Gaussian from GRIB({})[{},{},{}] to FVCOM[{},{}] ...".format(", ".join(fields),self.gribdata.ws.shape[0],self.gribdata.ws.shape[1],self.gribdata.ws.shape[2], self.fvcomgrid.cellcount,self.gribdata.mjd.shape[0]))
-        TN=self.gribdata.mjd.shape[0]
-        #
-        #
-        # Local variable initialization
-        MSLP = None
-        T2   = None
-        CDRX = None
-        TPX  = None
-        if "mslp" in fields: MSLP = np.zeros((self.entrycount,TN),float)
-        if "t2"   in fields: T2   = np.zeros((self.entrycount,TN),float)
-        if "cdrx" in fields: CDRX = np.zeros((self.entrycount,TN),float)
-        if "tpx"  in fields: TPX  = np.zeros((self.entrycount,TN),float)
-        #
-        progStr = "Node ({}) transmapping {{:4.0f}}%".format(", ".join(fields).strip())
-        #
-        xinf=self.gribdata.x.shape[0]
-        yinf=self.gribdata.x.shape[1]
-
-        for i in range(self.entrycount):
-            gi = self.fgmap[i,I_FG] # Mapping millum fvcom og grib
-            gj = self.fgmap[i,J_FG] # Mapping millum fvcom og grib
-            xs = self.gribdata.x[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            ys = self.gribdata.y[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1) ]
-            x0 = self.getEntryX(i)
-            y0 = self.getEntryY(i)
-            #d = u.d1norm(xs,ys,x0,y0)
-            d2 = u.d2norm(xs,ys,x0,y0) # TODO Move this outside for optimization ...
-            w  = np.exp(-d2/sigma2) # Statistical weigth
-            wsum = np.sum(w)        # Statistical weigth SUM / normalization value
-
-            for t in range(TN):
-                vals  = self.gribdata.mslp[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                mslp  = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.t2[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                t2    = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.cdrx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                cdrx  = np.sum(np.multiply(w,vals)) / wsum
-
-                vals  = self.gribdata.tpx[ max(0,gi-nearN):min(xinf,gi+nearN+1), max(0,gj-nearN):min(yinf,gj+nearN+1),t ]
-                tpx   = np.sum(np.multiply(w,vals)) / wsum
-
-                MSLP[i,t] = mslp
-                T2[i,t]   = t2
-                CDRX[i,t] = cdrx
-                TPX[i,t]  = tpx
-            # for END
-
-            u.prog(i,self.entrycount-1,0.25,progStr)
-
-        # for END
+        return self.transmapNodeFields(fields,"gauss")
+    # def END
+#=============================================================================================================================
+    # transmapNodeFields
+    # Transmaps the requested subset of (mslp, t2, cdrx, tpx). Fields not requested are returned as None.
+    def transmapNodeFields(self, fields, method):
+        wanted = [ fn for fn in NODEFIELDS if fn in fields ]
+        mapped = dict(zip(wanted, self.transmapFields(wanted,method)))
+        MSLP = mapped.get("mslp", None)
+        T2   = mapped.get("t2", None)
+        CDRX = mapped.get("cdrx", None)
+        TPX  = mapped.get("tpx", None)
         return MSLP, T2, CDRX, TPX
     # def END
     #=============================================================================================================================
@@ -1115,6 +1124,15 @@ class FvcomGribMap:
     #def END
     #=============================================================================================================================
     #=============================================================================================================================
+    def setPlotAnimate(self, value):
+        for a in self.p_anim.values():
+            plt.close(a["fig"])
+        # for END
+        self.p_anim = {}
+        self.p_animate = value
+    #def END
+    #=============================================================================================================================
+    #=============================================================================================================================
 
     def p_Reset(self):
         print("Resetting plot settings...")
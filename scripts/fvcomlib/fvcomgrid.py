@@ -11,9 +11,15 @@ import fvcomlibio as io
 import fvcomlibutil as u
 import math
 import re
+try:
+    from scipy.sparse import csr_matrix
+except ImportError:
+    csr_matrix = None
 
 VERBOSE = False
 CUTOFORPHANCOUNT = 99999999
+GRIDCACHESUFFIX = ".npz" # Binary cache written next to each source file (see loadCache)
+GRIDCACHEVERSION = 1     # Bump when the cached content of any loader changes
 iNodeFieldCount = 5
 inX = 0
 inY = 1
@@ -56,6 +62,13 @@ irNode = 3
 def norm2(a1, a2, b1, b2):
     return (math.sqrt((a1-a2)**2 + (b1-b2)**2))
 
+# Parses count lines starting at lines[first] into a numpy array in one call.
+# Only the columns in usecols are read, trailing columns may vary per line.
+def loadBlock(lines, first, count, usecols, dtype=float):
+    if (count <= 0):
+        return np.zeros((0, len(usecols)), dtype=dtype)
+    return np.loadtxt(lines[first:first + count], usecols=usecols, dtype=dtype, ndmin=2)
+
 class FVCOMGrid:
 
     def __init__(self):
@@ -94,69 +107,238 @@ class FVCOMGrid:
         self.setNodesLength(0)
         self.setCellsLength(0)
 
-        self.enMap = [] # Map of best fitting element to each node. Use calcEleNodeMap() to build
+        self.clearAdjacency() # Node/element adjacency, cell areas and enMap (first element at each node, see calcEleNodeMap)
     # def END
     #
     #===========================================================================================
 
+    # ==========================================================================================
+    # calcEleNodeMap
+    # enMap[i]: the first (lowest, 0-indexed) element touching node i (0-indexed), -1 for orphans.
+    #
     def calcEleNodeMap(self):
-        self.enMap = [-1] * self.nodecount # Allocate array of length nodecount
-        for i in range(self.nodecount):
-            jFound = -1
-            rDist = 1e12
-            jindex = np.where(self.cells == i) # A quick, but clumsy way to find if
-            jFound = jindex[0]-1 # -1: 0-index
+        self.enMap = self.getNodeFirstElements()
+    # def END
 
-            #for j in range(self.cellcount):
-                #if (self.cells[j,0]==i): jFound = j
-                #if (self.cells[j,1]==i): jFound = j
-                #if (self.cells[j,2]==i): jFound = j
-                #if (i<10 and jFound==j):
-                        #print("Found for i={:6d}: j={:6d}".format(i,j))
-            if (i % 1000 == 0): print(i)
+    # ==========================================================================================
+    # Adjacency (compressed sparse rows, all indices 0-indexed)
+    #   node -> elements:    elements touching node i are neIndices[neIndptr[i]:neIndptr[i+1]] (ascending)
+    #   element -> elements: edge neighbours of element j are eeIndices[eeIndptr[j]:eeIndptr[j+1]] (ascending)
+    # Built once from the cells in O(cells) and cached until clearAdjacency() is called. Every method
+    # that replaces or re-indexes the cells or nodes calls it; code that edits self.cells or the node
+    # coordinates directly must call it too.
+    #
+    def clearAdjacency(self):
+        self.adjValid = False
+        self.neIndptr = None
+        self.neIndices = None
+        self.eeIndptr = None
+        self.eeIndices = None
+        self.cellAreas = None
+        self.opEleToNode = None
+        self.opNodeToEle = None
+        self.enMap = []
+    # def END
 
-                # if END
-            # for j END
-            self.enMap[i]=jFound
-        # for i END
+    #
+    # Rebuilds the adjacency if it has been cleared (or the node/cell counts have changed) since it was built.
+    #
+    def buildAdjacency(self):
+        key = (self.cellcount, self.nodecount)
+        if (self.adjValid and self.adjKey == key):
+            return
+        # if END
+        n = max(0, self.nodecount)
+        m = max(0, self.cellcount)
+        c = np.asarray(self.cells[:m], dtype=int) - 1 # 0-index
+        #
+        # node -> elements: counting sort of the 3*m (node, element) pairs by node
+        nodeOf = c.ravel()
+        eleOf = np.repeat(np.arange(m), iCellFieldCount)
+        valid = (nodeOf >= 0) & (nodeOf < n)
+        if (not np.all(valid)):
+            print("ERROR: {} cell corners refer to nodes outside 1..{}. Ignored.".format(np.count_nonzero(~valid), n))
+        # if END
+        nodeOf = nodeOf[valid]
+        eleOf = eleOf[valid]
+        order = np.argsort(nodeOf, kind="stable") # Stable: elements stay ascending within each node
+        self.neIndptr = np.zeros(n + 1, dtype=int)
+        np.cumsum(np.bincount(nodeOf, minlength=n), out=self.neIndptr[1:])
+        self.neIndices = eleOf[order]
+        #
+        # element -> elements: two elements are neighbours if they share an edge
+        a = c[:, [0, 1, 2]].ravel()
+        b = c[:, [1, 2, 0]].ravel()
+        edgekey = np.minimum(a, b) * (n + 1) + np.maximum(a, b)
+        eleOf = np.repeat(np.arange(m), 3)
+        order = np.argsort(edgekey, kind="stable")
+        edgekey = edgekey[order]
+        eleOf = eleOf[order]
+        same = np.flatnonzero(edgekey[1:] == edgekey[:-1]) # Interior edges: consecutive equal keys
+        e1 = np.concatenate([eleOf[same], eleOf[same + 1]])
+        e2 = np.concatenate([eleOf[same + 1], eleOf[same]])
+        order = np.lexsort((e2, e1))
+        self.eeIndptr = np.zeros(m + 1, dtype=int)
+        np.cumsum(np.bincount(e1, minlength=m), out=self.eeIndptr[1:])
+        self.eeIndices = e2[order]
+        #
+        self.cellAreas = None
+        self.opEleToNode = None
+        self.opNodeToEle = None
+        self.adjKey = key
+        self.adjValid = True
+    # def END
 
+    #
+    # All elements (0-indexed, ascending) touching node i (0-indexed).
+    #
+    def getNodeElements(self, i):
+        self.buildAdjacency()
+        return self.neIndices[self.neIndptr[i]:self.neIndptr[i + 1]]
+    # def END
 
+    #
+    # First (lowest) element (0-indexed) touching each node, -1 for orphan nodes.
+    #
+    def getNodeFirstElements(self):
+        self.buildAdjacency()
+        first = np.full(max(0, self.nodecount), -1, dtype=int)
+        count = np.diff(self.neIndptr)
+        first[count > 0] = self.neIndices[self.neIndptr[:-1][count > 0]]
+        return first
+    # def END
 
+    #
+    # Edge neighbours (0-indexed, ascending) of element j (0-indexed).
+    #
+    def getEleNeighbours(self, j):
+        self.buildAdjacency()
+        return self.eeIndices[self.eeIndptr[j]:self.eeIndptr[j + 1]]
+    # def END
 
+    #
+    # Triangle areas of all cells.
+    #
+    def calcCellAreas(self):
+        self.buildAdjacency()
+        if (self.cellAreas is None):
+            c = np.asarray(self.cells[:max(0, self.cellcount)], dtype=int) - 1 # 0-index
+            x = self.nodes[:, inX]
+            y = self.nodes[:, inY]
+            self.cellAreas = 0.5 * np.abs((x[c[:, ic2]] - x[c[:, ic1]]) * (y[c[:, ic3]] - y[c[:, ic1]])
+                                          - (x[c[:, ic3]] - x[c[:, ic1]]) * (y[c[:, ic2]] - y[c[:, ic1]]))
+        # if END
+        return self.cellAreas
+    # def END
+
+    #
+    # Weights of the element -> node average per adjacency entry (neIndices order): rowOf is the node
+    # (0-indexed) of each entry, data its weight. Weighted: element area over the total area around the
+    # node; degenerate (zero area) neighbourhoods and unweighted averages: 1 / number of elements.
+    #
+    def calcEleToNodeWeights(self, weighted=True):
+        self.buildAdjacency()
+        n = max(0, self.nodecount)
+        count = np.diff(self.neIndptr)
+        rowOf = np.repeat(np.arange(n), count)
+        if (not weighted):
+            return rowOf, 1.0 / count[rowOf]
+        # if END
+        w = self.calcCellAreas()[self.neIndices]
+        ws = np.bincount(rowOf, weights=w, minlength=n)
+        flat = (ws[rowOf] <= 0) # Degenerate (zero area) neighbourhood: plain average
+        data = np.where(flat, 1.0 / np.maximum(count[rowOf], 1), w / np.where(flat, 1.0, ws[rowOf]))
+        return rowOf, data
+    # def END
+
+    #
+    # Sparse transfer operators (scipy CSR, None if scipy is unavailable), built from the adjacency and cell areas:
+    #   opEleToNode (nodes x cells): area-weighted average of the elements touching each node (rows sum to 1)
+    #   opNodeToEle (cells x nodes): mean of the three corner nodes
+    # A (cells x T) field becomes (nodes x T) in one sparse product, opEleToNode @ field, and vice versa.
+    #
+    def buildTransferOperators(self):
+        self.buildAdjacency()
+        if (csr_matrix is None or self.opEleToNode is not None):
+            return self.opEleToNode, self.opNodeToEle
+        # if END
+        n = max(0, self.nodecount)
+        m = max(0, self.cellcount)
+        rowOf, data = self.calcEleToNodeWeights(True)
+        self.opEleToNode = csr_matrix((data, self.neIndices, self.neIndptr), shape=(n, m))
+        c = np.asarray(self.cells[:m], dtype=int) - 1 # 0-index
+        self.opNodeToEle = csr_matrix((np.full(3 * m, 1.0 / 3.0), c.ravel(), np.arange(0, 3 * m + 1, 3)), shape=(m, n))
+        return self.opEleToNode, self.opNodeToEle
+    # def END
+
+    #
+    # Element values (cells, ...) to node values (nodes, ...): the average of the elements touching
+    # each node, weighted by the element area if weighted is True (see calcEleToNodeWeights). Orphan
+    # nodes get fill. Without scipy the same weights are summed per node with np.bincount.
+    #
+    def eleToNodeAverage(self, values, weighted=True, fill=np.nan):
+        self.buildAdjacency()
+        values = np.asarray(values)
+        n = max(0, self.nodecount)
+        m = max(0, self.cellcount)
+        count = np.diff(self.neIndptr)
+        shape = (n,) + values.shape[1:]
+        v = values.reshape(values.shape[0], -1)
+        if (csr_matrix is not None):
+            if (weighted):
+                op = self.buildTransferOperators()[0]
+            else:
+                op = csr_matrix((self.calcEleToNodeWeights(False)[1], self.neIndices, self.neIndptr), shape=(n, m))
+            # if END
+            out = np.asarray(op @ v, dtype=float)
+        else:
+            rowOf, data = self.calcEleToNodeWeights(weighted)
+            out = np.empty((n, v.shape[1]), dtype=float)
+            for k in range(v.shape[1]):
+                out[:, k] = np.bincount(rowOf, weights=data * v[self.neIndices, k], minlength=n)
+            # for END
+        # if END
+        out = out.reshape(shape)
+        out[count == 0] = fill
+        return out
+    # def END
+
+    #
+    # Node values (nodes, ...) to element values (cells, ...): the mean of the three corner nodes.
+    #
+    def nodeToEleAverage(self, values):
+        values = np.asarray(values)
+        op = self.buildTransferOperators()[1]
+        if (op is not None):
+            return np.asarray(op @ values.reshape(values.shape[0], -1), dtype=float).reshape((op.shape[0],) + values.shape[1:])
+        # if END
+        c = np.asarray(self.cells[:max(0, self.cellcount)], dtype=int) - 1 # 0-index
+        return (values[c[:, ic1]] + values[c[:, ic2]] + values[c[:, ic3]]) / 3.0
+    # def END
 
     # ==========================================================================================
     #
     #
     def checkOrphanNodes(self):
         self.setOrphanDictLength(self.nodecount)
-        pivot = 0  # Next Valid index.
-        orphans = []
-        for i in range(self.nodecount):
-            nodeno = i + 1  # The nodes are numbered from 1, not 0.
-            nodefound = False
-
-            itemindex = np.where(self.cells == nodeno) # A quick, but clumsy way to find if there is an occurance in the list
-            nodefound = (len(itemindex[0]) > 0)
-
-            if (nodefound):
-                pivot += 1  # Update the new next valid node no
-                self.orphandict[i, 0] = nodeno  # Current node index
-                self.orphandict[i, 1] = pivot  # New node index. -1 indicates current was not found. not found
-                # sys.stdout.write('.'+str(nodeno))
-                sys.stdout.write('.')
-            else:
-                self.orphandict[i, 0] = nodeno  # Current node index
-                self.orphandict[i, 1] = -1  # New node index. -1 indicates current was not found. not found
-                sys.stdout.write('0')
-                orphans.append(str(nodeno))
-                # print("Orphan node found: {}".format(nodeno))
-            if (i % 1000 == 0): sys.stdout.write(" " + str(round(100 * i / self.nodecount)) + "% \n")
-            if (i % 200 == 0): sys.stdout.flush()
-
-            if (i == CUTOFORPHANCOUNT):
-                self.orphandictcount = CUTOFORPHANCOUNT
-                break
-        # for i ...
+        n = self.nodecount
+        if (n > CUTOFORPHANCOUNT):
+            n = CUTOFORPHANCOUNT + 1
+            self.orphandictcount = CUTOFORPHANCOUNT
+        # if END
+        #
+        # One pass over all cells: count the references to each node (1-indexed).
+        c = np.asarray(self.cells).ravel()
+        c = c[(c >= 1) & (c <= n)]
+        nodefound = np.bincount(c, minlength=n + 1)[1:n + 1] > 0
+        #
+        # New node index = running count of referenced nodes. -1 indicates current was not found.
+        nodeno = np.arange(1, n + 1)
+        self.orphandict[:n, 0] = nodeno  # Current node index
+        self.orphandict[:n, 1] = np.where(nodefound, np.cumsum(nodefound), -1)  # New node index
+        orphans = [str(k) for k in nodeno[~nodefound]]
+        print("Checked {} nodes in {} cells.".format(n, self.cellcount))
+
         self.orphans = "\n".join(orphans)
         self.countOrphans()
         print("Number of orphans: {}".format(self.orphancount))
@@ -166,158 +348,173 @@ class FVCOMGrid:
     #
     #
     def countOrphans(self):
-        c = 0
-        for i in range(self.orphandictcount):
-            if (self.orphandict[i, 1] == -1): c += 1
-        self.orphancount = c;
+        self.orphancount = int(np.count_nonzero(self.orphandict[:max(0, self.orphandictcount), 1] == -1))
         return self.orphancount
 
+    # ==========================================================================================
+    # loadCache
+    # Returns the arrays cached for the source file fn (memory mapped, copy-on-write),
+    # or None if there is no valid cache. The cache is valid when the version and
+    # the file size match, and either the mtime or (if touched/copied) the SHA1 of
+    # the content matches.
+    #
+    def loadCache(self, fn):
+        cfn = fn + GRIDCACHESUFFIX
+        if (not os.path.isfile(cfn)):
+            return None
+        # if END
+        try:
+            c = io.loadNpzMmap(cfn)
+            st = os.stat(fn)
+            if ( (int(c["cacheversion"]) != GRIDCACHEVERSION) or (int(c["size"]) != st.st_size) ):
+                print("Cache {} is outdated.".format(cfn))
+                return None
+            # if END
+            if ( (int(c["mtime"]) != st.st_mtime_ns) and (str(c["sha1"]) != io.getFileSha1(fn)) ):
+                print("Cache {} is outdated.".format(cfn))
+                return None
+            # if END
+        except Exception as e:
+            print("WARNING: Could not read cache {}. [{}]".format(cfn, e))
+            return None
+        # try END
+        print("Loaded from cache: {}".format(cfn))
+        return c
+    # def END
+
+    # ==========================================================================================
+    # saveCache
+    # Writes the arrays parsed from the source file fn to its cache (uncompressed .npz,
+    # so it can be memory mapped). Failing to write (e.g. read-only directory) is not fatal.
+    #
+    def saveCache(self, fn, **arrays):
+        cfn = fn + GRIDCACHESUFFIX
+        tmp = cfn + ".tmp.npz"
+        try:
+            st = os.stat(fn)
+            np.savez(tmp, cacheversion=GRIDCACHEVERSION, size=st.st_size, mtime=st.st_mtime_ns, sha1=io.getFileSha1(fn), **arrays)
+            os.replace(tmp, cfn)
+            print("Saved cache: {}".format(cfn))
+        except Exception as e:
+            print("WARNING: Could not write cache {}. [{}]".format(cfn, e))
+        # try END
+    # def END
+
     # ==========================================================================================
     #
     #
-    def loadCorFile(self, fn):
+    def loadCorFile(self, fn, useCache=True):
         print("Opening cor file: \"{}\":".format(fn))
-        file1 = open(fn, 'r')
-        lines = file1.readlines()
-        N = len(lines)
-        d = [""] * N  # List of empty string
-        print("Lines in file: {}".format(N))
-        # Loads the lines into list
-        count = 0
-        for line in lines:
-            count += 1
-            #             if (count<=10):
-            #                print("Line {:5}: {}".format(count, line.strip()))
-            d[count - 1] = line
-        print("Number of lines read: {}".format(count))
-        #
-        # Loading the data into array
-        # Read node / cell (line 1)
-        s = d[0]
-        ss = s.split("=")
-        corcount = int(ss[1])
-        #
-        # Read node % cell count
+        c = self.loadCache(fn) if useCache else None
+        if (c is None):
+            with open(fn, 'r') as file1:
+                d = file1.readlines()
+            count = len(d)
+            print("Lines in file: {}".format(count))
+            print("Number of lines read: {}".format(count))
+            #
+            # Read cor count (line 1)
+            ss = d[0].split("=")
+            corcount = int(ss[1])
+            #
+            # Load the data block (x, y, cor) into array
+            offset = 1
+            a = loadBlock(d, offset, corcount, (0, 1, 2))
+            if (useCache):
+                self.saveCache(fn, block=a)
+        else:
+            a = c["block"]
+            corcount = len(a)
+        # if END
         print("Cor count in file: {}".format(corcount))
         self.setCorsLength(corcount)
-
-        #
-        # Load the data into array
-        offset = 1
-        for i in range(offset, corcount + offset):
-            j = i - offset
-            #             if (j<6):
-            #                 print("Reading line: {}...".format(i))
-            #                 print("L{}        : [{}].".format(i,d[i])  )
-            ss = d[i].split()
-            f0 = float(ss[0]) #  First field
-            f1 = float(ss[1]) # Second field
-            f2 = float(ss[2]) # Third field
-            n2=norm2(f0,self.nodes[j,inX],f1,self.nodes[j,inY])
-            if (n2>1e-1):
-                print("ERROR: large deviation: {}".format(n2))
-                exit
-            #self.nodes[j, 0] = f0
-            #self.nodes[j, 1] = f1
-            self.nodes[j, inCor] = f2
-            # self.cells[j,3]=int(ss[4])
-
-    #             if (VERBOSE and j<6):
-    #                 print("Cells read ({}->{}) : {}  {}  {}".format(i,j,self.nodes[j][0],self.nodes[j][1],self.nodes[j][2]))
+        self.checkNodeDeviation(a[:, 0], a[:, 1])
+        self.nodes[:corcount, inCor] = a[:, 2]
     # end def
 #
     # ==========================================================================================
     #
     #
-    def loadDepFile(self, fn):
+    def loadDepFile(self, fn, useCache=True):
         print("Opening dep file: \"{}\":".format(fn))
-        file1 = open(fn, 'r')
-        lines = file1.readlines()
-        N = len(lines)
-        d = [""] * N  # List of empty string
-        print("Lines in file: {}".format(N))
-        # Loads the lines into list
-        count = 0
-        for line in lines:
-            count += 1
-            #             if (count<=10):
-            #                print("Line {:5}: {}".format(count, line.strip()))
-            d[count - 1] = line
-        print("Number of lines read: {}".format(count))
-        #
-        # Loading the data into array
-        # Read node / cell (line 1)
-        s = d[0]
-        ss = s.split("=")
-        depcount = int(ss[1])
-        #
-        # Read node % cell count
+        c = self.loadCache(fn) if useCache else None
+        if (c is None):
+            with open(fn, 'r') as file1:
+                d = file1.readlines()
+            count = len(d)
+            print("Lines in file: {}".format(count))
+            print("Number of lines read: {}".format(count))
+            #
+            # Read dep count (line 1)
+            ss = d[0].split("=")
+            depcount = int(ss[1])
+            #
+            # Load the data block (x, y, dep) into array
+            offset = 1
+            a = loadBlock(d, offset, depcount, (0, 1, 2))
+            if (useCache):
+                self.saveCache(fn, block=a)
+        else:
+            a = c["block"]
+            depcount = len(a)
+        # if END
         print("Dep count in file: {}".format(depcount))
         self.setDepsLength(depcount)
-
-        #
-        # Load the data into array
-        offset = 1
-        for i in range(offset, depcount + offset):
-            j = i - offset
-            #             if (j<6):
-            #                 print("Reading line: {}...".format(i))
-            #                 print("L{}        : [{}].".format(i,d[i])  )
-            ss = d[i].split()
-            f0 = float(ss[0]) #  First field
-            f1 = float(ss[1]) # Second field
-            f2 = float(ss[2]) # Third field
-            n2=norm2(f0,self.nodes[j,inX],f1,self.nodes[j,inY])
-            if (n2>1e-1):
-                print("ERROR: large deviation: {}".format(n2))
-                exit
-            #self.nodes[j, 0] = f0
-            #self.nodes[j, 1] = f1
-            self.nodes[j, inDep] = f2
-            # self.cells[j,3]=int(ss[4])
-
-    #             if (VERBOSE and j<6):
-    #                 print("Cells read ({}->{}) : {}  {}  {}".format(i,j,self.nodes[j][0],self.nodes[j][1],self.nodes[j][2]))
+        self.checkNodeDeviation(a[:, 0], a[:, 1])
+        self.nodes[:depcount, inDep] = a[:, 2]
     # end def
+#
+    # ==========================================================================================
+    # checkNodeDeviation
+    # Compares x, y read from a cor/dep file with the grid nodes (same order).
+    # Every node further away than 0.1 m is reported.
+    #
+    def checkNodeDeviation(self, x, y):
+        n = len(x)
+        n2 = np.hypot(x - self.nodes[:n, inX], y - self.nodes[:n, inY])
+        for j in np.flatnonzero(n2 > 1e-1):
+            print("ERROR: large deviation: {}".format(n2[j]))
+        # for END
+        return n2
+    # def END
 #
     # ==========================================================================================
     #
     #
-    def loadGridFile(self, fn):
+    def loadGridFile(self, fn, useCache=True):
         print("Opening grid file: \"{}\":".format(fn))
-        file1 = open(fn, 'r')
-        lines = file1.readlines()
-        N = len(lines)
-        d = [""] * N  # List of empty string
-        print("Lines in file: {}".format(N))
-        # Loads the lines into list
-        count = 0
-        for line in lines:
-            count += 1
-            #             if (count<=10):
-            #                print("Line {:5}: {}".format(count, line.strip()))
-            d[count - 1] = line
+        c = self.loadCache(fn) if useCache else None
+        if (c is not None):
+            # Memory mapped (copy-on-write), no parsing or copying.
+            self.nodes = c["nodes"]
+            self.nodecount = len(self.nodes)
+            self.cells = c["cells"]
+            self.cellCenters = c["cellCenters"]
+            self.cellcount = len(self.cells)
+            self.clearAdjacency()
+            print("Node count in file: {}".format(self.nodecount))
+            print("Cell count in file: {}".format(self.cellcount))
+            print("Loaded grd file.")
+            return
+        # if END
+        with open(fn, 'r') as file1:
+            d = file1.readlines()
+        count = len(d)
+        print("Lines in file: {}".format(count))
         print("Number of lines read: {}".format(count))
         #
         # Loading the data into array
         nodecount = 0
         cellcount = 0
-        # Read node / cell (line 1)
-        s = d[0]
-        if ("Node Number" in s):
-            ss = s.split("=")
-            nodecount = int(ss[1])
-        else:
-            ss = s.split("=")
-            cellcount = int(ss[1])
-        # Read node / cell (line 2)
-        s = d[1]
-        if ("Node Number" in s):
-            ss = s.split("=")
-            nodecount = int(ss[1])
-        else:
+        # Read node / cell (line 1 and 2)
+        for s in d[0:2]:
             ss = s.split("=")
-            cellcount = int(ss[1])
+            if ("Node Number" in s):
+                nodecount = int(ss[1])
+            else:
+                cellcount = int(ss[1])
+            # if END
+        # for END
         #
         # Read node % cell count
         print("Node count in file: {}".format(nodecount))
@@ -325,62 +522,51 @@ class FVCOMGrid:
         self.setNodesLength(nodecount)
         self.setCellsLength(cellcount)
         #
-        # Load the data into array
-        # Load Cells first
+        # Load the data into array, one block each.
+        # Cells first: "     30 117215  66138  58140      1"
         offset = 2
-        for i in range(offset, cellcount + offset):
-            j = i - offset;
-            ss = d[i].split()
-            self.cells[j, ic1] = int(ss[1])
-            self.cells[j, ic2] = int(ss[2])
-            self.cells[j, ic3] = int(ss[3])
-        # for END
+        self.cells[:, :] = loadBlock(d, offset, cellcount, (1, 2, 3), int)
         #
-        # Load Nodes next
+        # Nodes next: "   3164 -0.42137998E+04  0.34138398E+05  0.00000000E+00"
         offset = cellcount + 2
-        for i in range(offset, offset + nodecount):
-            j = i - offset
-            #             if (j<6):
-            #                  print("Reading line: {}...".format(i))
-            #                  print("L{}        : [{}].".format(i,d[i][:-1])  )
-            ss = d[i].split()
-            self.nodes[j, inX] = float(ss[1])
-            self.nodes[j, inY] = float(ss[2])
-            self.nodes[j, inZ] = float(ss[3])
-        #             if (VERBOSE and j<6):
-        #                 print("Nodes read ({}->{}) : {}  {}  {}".format(i,j,self.nodes[j][0],self.nodes[j][1],self.nodes[j][2]))
-        # for END
+        self.nodes[:, inX:inZ+1] = loadBlock(d, offset, nodecount, (1, 2, 3))
+        self.clearAdjacency()
         #
-        # =======================================================================================0
-        # Calculate Cell centers
-        for i in range(self.cellcount):
-            #
-            # Calc XC
-            self.cellCenters[i,inX]= ( self.nodes[self.cells[i,ic1]-1,inX] + self.nodes[self.cells[i,ic2]-1,inX] + self.nodes[self.cells[i,ic3]-1,inX]) / 3.0
-            # Calc YC
-            self.cellCenters[i,inY]= ( self.nodes[self.cells[i,ic1]-1,inY] + self.nodes[self.cells[i,ic2]-1,inY] + self.nodes[self.cells[i,ic3]-1,inY]) / 3.0
-            # Calc YC - NOT VALID AS DEPTH is contained in the DEP file.
-            #self.cellCenters[i,inZ]= ( self.nodes[self.cells[i,ic1]-1,inZ] + self.nodes[self.cells[i,ic2]-1,inZ] + self.nodes[self.cells[i,ic3]-1,inZ]) / 3.0
-
-            if (VERBOSE):
-                print("N1 N2 N3 X1 X2 X3 : {:5d} {:5d} {:5d}    {:8.1f}  {:8.1f}  {:8.1f} => {:8.1f}"
-                        .format(self.cells[i,ic1], self.cells[i,ic2], self.cells[i,ic3],
-                                self.nodes[self.cells[i,ic1]-1,inX], self.nodes[self.cells[i,ic2]-1,inX], self.nodes[self.cells[i,ic3]-1,inX], self.cellCenters[i,inX]))
-                print("N1 N2 N3 Y1 Y2 Y3 : {:5d} {:5d} {:5d}    {:8.1f}  {:8.1f}  {:8.1f} => {:8.1f}"
-                        .format(self.cells[i,ic1], self.cells[i,ic2], self.cells[i,ic3],
-                                self.nodes[self.cells[i,ic1]-1,inY], self.nodes[self.cells[i,ic2]-1,inY], self.nodes[self.cells[i,ic3]-1,inY], self.cellCenters[i,inY]))
-
-            #print("XC YC {}  {}".format(self.cellCenters[i,icc1],self.cellCenters[i,icc2]))
-            #self.cellCenters[i,icc1]=self.cells[i,ic1]
-        # for END
+        self.calcCellCenters()
+        if (useCache):
+            self.saveCache(fn, nodes=self.nodes, cells=self.cells, cellCenters=self.cellCenters)
+        # if END
         print("Loaded grd file.")
 
         # end
     # ==========================================================================================
+    # calcCellCenters
+    # Cell centers (xc, yc) as the mean of the three corner nodes.
+    # The depth is NOT averaged, as it is contained in the DEP file.
+    #
+    def calcCellCenters(self):
+        c = self.cells - 1 # 0-index
+        self.cellCenters[:, icc1] = (self.nodes[c[:, ic1], inX] + self.nodes[c[:, ic2], inX] + self.nodes[c[:, ic3], inX]) / 3.0
+        self.cellCenters[:, icc2] = (self.nodes[c[:, ic1], inY] + self.nodes[c[:, ic2], inY] + self.nodes[c[:, ic3], inY]) / 3.0
+        if (VERBOSE):
+            for i in range(min(10, self.cellcount)):
+                print("N1 N2 N3 => XC YC : {:5d} {:5d} {:5d} => {:8.1f} {:8.1f}"
+                        .format(self.cells[i,ic1], self.cells[i,ic2], self.cells[i,ic3], self.cellCenters[i,icc1], self.cellCenters[i,icc2]))
+            # for END
+        # if END
+    # def END
+    # ==========================================================================================
     #
     #
-    def loadObcFile(self, fn):
+    def loadObcFile(self, fn, useCache=True):
         print("Opening obc file: \"{}\":".format(fn))
+        c = self.loadCache(fn) if useCache else None
+        if (c is not None):
+            self.setObcsLength(len(c["obcs"]))
+            self.obcs[:, :] = c["obcs"]
+            print("obc count in file: {}".format(self.obccount))
+            return
+        # if END
         file1 = open(fn, 'r')
         lines = file1.readlines()
         N = len(lines)
@@ -415,14 +601,28 @@ class FVCOMGrid:
             self.obcs[j, ioIndex] = int(ss[0]) #  First field
             self.obcs[j, ioNode] = float(ss[1]) # Second field
             self.obcs[j, ioOpen] = float(ss[2]) # Third field
+        if (useCache):
+            self.saveCache(fn, obcs=self.obcs)
+        # if END
     # end def loadObsFile
 
 
     # ==========================================================================================
     # loadRiverNmlFile
     #
-    def loadRiverNmlFile(self, fn):
+    def loadRiverNmlFile(self, fn, useCache=True):
         print("Opening river (.nml) file: \"{}\":".format(fn))
+        c = self.loadCache(fn) if useCache else None
+        if (c is not None):
+            r = c["rivers"]
+            self.setRiversLength(len(r))
+            for k in [0, 1, 2, 4, 5]:
+                self.rivers[:, k] = r[:, k].tolist()
+            # for END
+            self.rivers[:, irNode] = r[:, irNode].astype(int).tolist()
+            print("River count in file: {}".format(self.rivercount))
+            return
+        # if END
         file1 = open(fn, 'r')
         lines = file1.readlines()
         N = len(lines)
@@ -446,6 +646,9 @@ class FVCOMGrid:
             self.rivers[i, 3] =int(ss.split("=")[1])
             self.rivers[i, 4] = d[6 * i + 4].strip()
             self.rivers[i, 5] = d[6 * i + 5].strip()
+        if (useCache):
+            self.saveCache(fn, rivers=self.rivers.astype(str))
+        # if END
 
 
 
@@ -455,8 +658,17 @@ class FVCOMGrid:
     # ==========================================================================================
     # loadSpgFile
     #
-    def loadSpgFile(self, fn):
+    def loadSpgFile(self, fn, useCache=True):
         print("Opening spg file: \"{}\":".format(fn))
+        c = self.loadCache(fn) if useCache else None
+        if (c is not None):
+            self.setSpongesLength(len(c["node"]))
+            self.sponges[:, isNode] = c["node"].tolist()
+            self.sponges[:, isRadius] = c["radius"].tolist()
+            self.sponges[:, isExp] = c["exp"].tolist()
+            print("Spg count in file: {}".format(self.spongecount))
+            return
+        # if END
         file1 = open(fn, 'r')
         lines = file1.readlines()
         N = len(lines)
@@ -487,13 +699,23 @@ class FVCOMGrid:
             self.sponges[j, isNode] = int(ss[0]) #  First field
             self.sponges[j, isRadius] = float(ss[1]) # Second field
             self.sponges[j, isExp] = float(ss[2]) # Third field
+        if (useCache):
+            self.saveCache(fn, node=self.sponges[:, isNode].astype(int), radius=self.sponges[:, isRadius].astype(float), exp=self.sponges[:, isExp].astype(float))
+        # if END
     # end def loadSpgFile
 
     # ==========================================================================================
     # loadTideCdlFile
     #
-    def loadTideCdlFile(self, fn):
+    def loadTideCdlFile(self, fn, useCache=True):
         print("Opening tide (.cdl) file: \"{}\":".format(fn))
+        c = self.loadCache(fn) if useCache else None
+        if (c is not None):
+            self.tidecdlfilecontent = c["content"].tolist()
+            self.setTidesLength(len(c["tides"]))
+            self.tides[:, itObcNodes] = c["tides"].tolist()
+            return
+        # if END
         s = io.getFileContent(fn)
         t = [] # Strings list
         tag = []
@@ -520,6 +742,9 @@ class FVCOMGrid:
         self.setTidesLength(len(d))
         for i in range(len(d)):
             self.tides[i,itObcNodes] = d[i]
+        if (useCache):
+            self.saveCache(fn, content=np.array(t, dtype=str), tides=np.array(d, dtype=int))
+        # if END
 
     # END def loadTideCdlFile
 
@@ -565,122 +790,163 @@ class FVCOMGrid:
         # def readOrphanDictionary END
 
     #
+    # ==========================================================================================
+    # buildReindexLookup
+    # Dense old->new node lookup built once from the orphan dictionary: lookup[old] is the new
+    # 1-based index of old 1-based node index "old", or -1 for orphans. lookup[0] is unused (-1).
+    # ==========================================================================================
+    def buildReindexLookup(self):
+        n = max(0, self.orphandictcount)
+        od = self.orphandict[:n]
+        bad = np.flatnonzero(od[:, 0] != np.arange(1, n + 1))  # Index number in the dictionary must match its row
+        for i in bad[:10]:
+            print("ERROR: Orphan dictionary row {} holds node index {}.".format(i + 1, od[i, 0]))
+        # for END
+        if (len(bad) > 10): print("ERROR: ... {} mismatching orphan dictionary rows in total.".format(len(bad)))
+        lookup = np.full(n + 1, -1, dtype=int)
+        lookup[1:] = od[:, 1]
+        return lookup
+    # def buildReindexLookup END
+
     #
-    #
-    def reindexCells(self):
-        print("Re-indexing cells....")
-        for i in range(self.cellcount):
-            if (self.cells[i, 0] != self.orphandict[self.cells[i, 0] - 1, 0]):
-                print("ERROR ERROR {} <-> {}".format(self.cells[i, 0], self.orphandict[self.cells[i, 0] - 1, 0]))
-            # if (i<25): print("Cell {}: {}  {}  {}".format(i+1,self.cells[i,0],self.cells[i,1],self.cells[i,2]))
-            self.cells[i, 0] = self.orphandict[self.cells[i, 0] - 1, 1]
-            self.cells[i, 1] = self.orphandict[self.cells[i, 1] - 1, 1]
-            self.cells[i, 2] = self.orphandict[self.cells[i, 2] - 1, 1]
-        print("Re-indexing cells.... DONE")
+    # ==========================================================================================
+    # applyReindexLookup
+    # Maps an array of old 1-based node indices through lookup. Indices outside the dictionary
+    # map to -1, like orphans.
+    # ==========================================================================================
+    def applyReindexLookup(self, lookup, idx):
+        idx = np.asarray(idx).astype(int)
+        valid = (idx >= 1) & (idx < len(lookup))
+        new = np.full(idx.shape, -1, dtype=int)
+        new[valid] = lookup[idx[valid]]
+        return new
+    # def applyReindexLookup END
 
-    # def reindexOrphans END
     #
+    # ==========================================================================================
+    # reindexTable
+    # Re-indexes column col of table in place (all columns if col is None) and returns the
+    # dropped references as an (k,2) array of [1-based row, old node index].
+    # ==========================================================================================
+    def reindexTable(self, name, table, count, col, lookup):
+        print("Re-indexing {}....".format(name))
+        count = max(0, count)
+        old = table[:count] if (col is None) else table[:count, col]
+        old = np.asarray(old).astype(int)
+        new = self.applyReindexLookup(lookup, old)
+        if (col is None):
+            table[:count] = new
+        elif (table.dtype == object):
+            table[:count, col] = new.tolist()  # Keep plain ints in object tables (sponges, rivers, tides)
+        else:
+            table[:count, col] = new
+        # if END
+        dropped = np.flatnonzero(new == -1)
+        rows = dropped // old.shape[1] if (old.ndim == 2) else dropped
+        dropped = np.column_stack([rows + 1, old.ravel()[dropped]])
+        print("Re-indexing {}.... DONE".format(name))
+        return dropped
+    # def reindexTable END
+
     #
     #
+    def reindexCells(self, lookup=None):
+        if (lookup is None): lookup = self.buildReindexLookup()
+        self.clearAdjacency() # Cells are changed in place
+        return self.reindexTable("cells", self.cells, self.cellcount, None, lookup)
+    # def reindexCells END
 
     #
     #
-    def reindexNodes(self):
+    def reindexNodes(self, lookup=None):
         print("Re-indexing nodes....")
-        if (True or self.nodecount == self.orphandictcount):
-            for i in range(self.orphandictcount):
-                if (self.orphandict[i, 1] != -1):
-                    # print("Index change {} -> {}  ".format(self.orphandict[i,0],self.orphandict[i,1]))
-                    # print("1 Node {} before : {} {} {}".format(self.orphandict[i,1],self.nodes[self.orphandict[i,1]-1,0], self.nodes[self.orphandict[i,1]-1,1], self.nodes[self.orphandict[i,1]-1,2]))
-                    # print("2 Node {} before: {} {} {}".format(self.orphandict[i,0],self.nodes[self.orphandict[i,0]-1,0], self.nodes[self.orphandict[i,0]-1,1], self.nodes[self.orphandict[i,0]-1,2]))
-                    self.nodes[self.orphandict[i, 1] - 1] = self.nodes[self.orphandict[i, 0] - 1]
-                    # print("3 Node {} after : {} {} {}".format(self.orphandict[i,1],self.nodes[self.orphandict[i,1]-1,0], self.nodes[self.orphandict[i,1]-1,1], self.nodes[self.orphandict[i,1]-1,2]))
-                #                 else:
-                #                     if (i<25):
-                #                         print("Node {} is orphan.".format(i+1))
-                # if (i % 1000 == 0):
-                #     sys.stdout.write('\033[2K\033[1G')
-                #     sys.stdout.write(str(round(100 * i / self.nodecount)) + "% ")
-                #     sys.stdout.flush()
-        else:
+        if (lookup is None): lookup = self.buildReindexLookup()
+        n = min(self.nodecount, len(lookup) - 1)
+        if (self.nodecount != len(lookup) - 1):
             print(
                 "ERROR:: Number of nodes and number of elements in the orphan dictionary do not match. Have you already run the re-indexing routine? Or have you not yet populated the dictionary, either from file or through generation?")
-        # if/else ... END
-        print("Old node count: {}. New node count: {}.".format(self.nodecount,
-                                                               self.orphandict[self.orphandictcount - 1, 1]))
-        self.nodecount = self.orphandict[self.orphandictcount - 1, 1]
+        # if END
+        keep = lookup[1:n + 1] != -1
+        newcount = int(np.count_nonzero(keep))
+        if (not np.array_equal(lookup[1:n + 1][keep], np.arange(1, newcount + 1))):
+            print("ERROR: New node indices in the orphan dictionary are not consecutive. Nodes are compacted in their old order.")
+        # if END
+        print("Old node count: {}. New node count: {}.".format(self.nodecount, newcount))
+        self.nodes = self.nodes[:n][keep]
+        self.nodecount = newcount
+        self.clearAdjacency()
         if (self.corcount>-1): self.corcount = self.nodecount
         if (self.depcount > -1): self.depcount = self.nodecount
         print("Re-indexing nodes.... DONE")
+        return np.flatnonzero(~keep) + 1 # Removed (old, 1-based) node numbers
     # def reindexNodes ... END
 
     #
     #
-    def reindexObcs(self):
-        print("Re-indexing obcs....")
-        for i in range(self.obccount):
-            if (self.obcs[i, 0] != self.orphandict[int(self.obcs[i, 0]) - 1, 0]): # Compare the index number in sponges to the one in the dictionary
-                print("ERROR ERROR {} <-> {}".format(self.obcs[i, 0], self.orphandict[int(self.obcs[i, 0]) - 1, 0]))
-            # if (i<25): print("Cell {}: {}  {}  {}".format(i+1,self.cells[i,0],self.cells[i,1],self.cells[i,2]))
-            self.obcs[i, ioNode] = self.orphandict[int(self.obcs[i, ioNode]) - 1, 1]
-        print("Re-indexing obcs.... DONE")
+    def reindexObcs(self, lookup=None):
+        if (lookup is None): lookup = self.buildReindexLookup()
+        return self.reindexTable("obcs", self.obcs, self.obccount, ioNode, lookup)
     # def reindexObcs ... END
 
     #
-    #
-    #
+    # ==========================================================================================
+    # reindexOrphans
+    # Builds the old->new lookup once and applies it to the nodes and to every table holding
+    # node indices. Returns a report {table: (k,2) array of [1-based row, old node index]} of
+    # the references that pointed to dropped (orphan) nodes and are now -1, and under "nodes"
+    # the (k) removed old node numbers.
+    # ==========================================================================================
     def reindexOrphans(self):
-        self.reindexNodes()
-        self.reindexCells()
-        self.reindexObcs()
-        self.reindexSponges()
-        self.reindexTides()
-        self.reindexRivers()
+        lookup = self.buildReindexLookup()
+        self.clearAdjacency() # Nodes and cells are re-indexed
+        report = {}
+        report["nodes"] = self.reindexNodes(lookup)
+        report["cells"] = self.reindexCells(lookup)
+        report["obcs"] = self.reindexObcs(lookup)
+        report["sponges"] = self.reindexSponges(lookup)
+        report["tides"] = self.reindexTides(lookup)
+        report["rivers"] = self.reindexRivers(lookup)
+        print("Removed nodes: {}".format(len(report["nodes"])))
+        for key in ["cells", "obcs", "sponges", "tides", "rivers"]:
+            if (len(report[key]) > 0):
+                print("WARNING: {} references in {} point to removed nodes (rows: {}).".format(
+                    len(report[key]), key, " ".join(str(r) for r in report[key][:20, 0])))
+            # if END
+        # for END
+        return report
     # def reindexOrphans END
 
     #
     #
-    def reindexRivers(self):
-        print("Re-indexing rivers....")
-        for i in range(self.rivercount):
-            # print("{} {}".format(i,self.rivers[i, irNode]))
-            if (self.rivers[i, irNode] != self.orphandict[int(self.rivers[i, irNode]) - 1, 0]): # Compare the index number in rivers to the one in the dictionary
-                print("ERROR RIVER REINDEX ERROR {} <-> {}".format(self.rivers[i, irNode], self.orphandict[int(self.rivers[i, irNode]) - 1, 0]))
-            # if (i<25): print("rivers {}: {}".format(i+1,self.rivers[i,irNode]))
-            self.rivers[i, irNode] = self.orphandict[int(self.rivers[i, irNode]) - 1, 1]
-            # if (i < 25): print("rivers {}: {}".format(i + 1, self.rivers[i, irNode]))
-        print("Re-indexing rivers.... DONE")
-    # def reindexNodes ... END
+    def reindexRivers(self, lookup=None):
+        if (lookup is None): lookup = self.buildReindexLookup()
+        return self.reindexTable("rivers", self.rivers, self.rivercount, irNode, lookup)
+    # def reindexRivers ... END
+
     #
     #
-    def reindexSponges(self):
-        print("Re-indexing sponges....")
-        for i in range(self.spongecount):
-            if (self.sponges[i, 0] != self.orphandict[int(self.sponges[i, 0]) - 1, 0]): # Compare the index number in sponges to the one in the dictionary
-                print("ERROR SPONGE REINDEX ERROR {} <-> {}".format(self.sponges[i, 0], self.orphandict[int(self.sponges[i, 0]) - 1, 0]))
-            # if (i<25): print("sponges {}: {}  {}  {}".format(i+1,self.sponges[i,0],self.sponges[i,1],self.sponges[i,2]))
-            self.sponges[i, 0] = self.orphandict[int(self.sponges[i, 0]) - 1, 1]
-        print("Re-indexing sponges.... DONE")
-    # def reindexNodes ... END
+    def reindexSponges(self, lookup=None):
+        if (lookup is None): lookup = self.buildReindexLookup()
+        return self.reindexTable("sponges", self.sponges, self.spongecount, isNode, lookup)
+    # def reindexSponges ... END
 
     #
     #
-    def reindexTides(self):
-        print("Re-indexing tides....")
-        for i in range(self.tidecount):
-            if (self.tides[i, itObcNodes] != self.orphandict[int(self.tides[i, itObcNodes]) - 1, 0]): # Compare the index number in sponges to the one in the dictionary
-                print("ERROR TIDE REINDEX ERROR {} <-> {}".format(self.tides[i, itObcNodes], self.orphandict[int(self.tides[i, itObcNodes]) - 1, 0]))
-            # if (i<25): print("Cell {}: {}  {}  {}".format(i+1,self.tides[i,0],self.tides[i,1],self.tides[i,2]))
-            self.tides[i, itObcNodes] = self.orphandict[int(self.tides[i, itObcNodes]) - 1, 1]
-        self.tidecdlfilecontent[itcObcNodes]=", ".join(str(self.tides[i,:])).strip()
-        print("Re-indexing tides.... DONE")
-    # def reindexNodes ... END
+    def reindexTides(self, lookup=None):
+        if (lookup is None): lookup = self.buildReindexLookup()
+        dropped = self.reindexTable("tides", self.tides, self.tidecount, itObcNodes, lookup)
+        if (len(self.tidecdlfilecontent) > itcObcNodes):
+            self.tidecdlfilecontent[itcObcNodes] = u.generateDataSeries("", self.tides[:, itObcNodes], self.tidecount, 1, "{:d}")
+        # if END
+        return dropped
+    # def reindexTides ... END
 
     def setCellsLength(self, cellcount):
         self.cellcount = cellcount
         cnt = max(0, cellcount)
         self.cells = np.zeros((cnt, iCellFieldCount),dtype=int)  # Example of file record: "     30 117215  66138  58140      1"
         self.cellCenters = np.zeros((cnt, iCellCenterFieldCount),dtype=float)  # Example of file record: "     30 117215  66138  58140      1"
+        self.clearAdjacency()
 
     def setObcsLength(self, obccount):
         self.obccount = obccount
@@ -699,6 +965,7 @@ class FVCOMGrid:
         self.nodecount = nodecount
         cnt = max(0, nodecount)
         self.nodes = np.zeros((cnt, iNodeFieldCount),dtype=np.double)  # Example of file record: "   3164 -0.42137998E+04  0.34138398E+05  0.00000000E+00"
+        self.clearAdjacency()
 
     def setRiversLength(self, rivercount):
         self.rivercount = rivercount
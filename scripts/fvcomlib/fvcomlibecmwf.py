@@ -12,20 +12,24 @@ import fvcomlibutil as u
 import shutil
 import glob
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 VERBOSE = False
 GRIBBASEDIR = "/opt/fvcom/cron/forcing/ecmwf/"
 GRIBCURRENTBUFFER = "0/"
 GRIBTEMPBUFFER = "1/"
 GRIBARCHIVE = "archive/"
+GRIBSTORE = "store/" # Decoded GRIB sub-areas (.npy per archive file), see writeGribStore
+GRIBTARGETFILTERVALUE = 30.0 # latitudeOfLastGridPointInDegrees of the GRIB grid used
 MJD0 = 2400000.5 # Zero of MJD compared to JulianDay
+GRIBNPROC = None # Number of processes decoding GRIB files. None: number of CPUs. 1: no process pool.
 
 
 
 #=============================================================================================================
 # Copy and RENAME files from CURRENTBUFFER to ARCHIVE
 #
-def copyToArchive():
+def copyToArchive(lat1=None, lat2=None, lon1=None, lon2=None):
     print("Copying data files to archive ...")
     baseDir = GRIBBASEDIR
     gribDir = baseDir + GRIBCURRENTBUFFER
@@ -48,6 +52,7 @@ def copyToArchive():
         datayear=runtime_year
 
         #print("{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(runtime_year,runtime_month,runtime_day,runtime_hour,runtime_minute,runtime_second))
+        dstlist = []
 
         for i in range(flen):
         #for i in range(1):
@@ -62,7 +67,12 @@ def copyToArchive():
             dst = archiveDir+dfn
             print("Copying {} to {} in archive...".format(flist[i],dfn))
             shutil.copy(src,dst)
+            dstlist.append(dst)
         # for END
+        # Decode the sub-area of the new files into the store, so later loads skip pygrib
+        if (lat1 is not None):
+            ingestToStore(dstlist, lat1, lat2, lon1, lon2)
+        # if END
     else:
         print("No files to copy to archive...")
     # if-else END
@@ -265,6 +275,300 @@ def selectMessage(grbs, messagename, targetvalue,lat1=0, lat2=90, lon1=-90, lon2
     return values, lat, lon, grbx, index
 
 
+#================================================================================================
+# GRIB fields read by get_ecmwf_FVCOMdata: (field, GRIB message name)
+GRIBMESSAGES = [
+    ("mslp", "Mean sea level pressure"),
+    ("u10",  "10 metre U wind component"),
+    ("v10",  "10 metre V wind component"),
+    ("dpt2", "2 metre dewpoint temperature"),
+    ("t2",   "2 metre temperature"),
+    ("cdr",  "Surface direct short-wave radiation, clear sky"),
+    ("cbh",  "Cloud base height"),
+    ("cp",   "Convective precipitation"),
+    ("lsp",  "Large-scale precipitation"),
+    ("sp",   "Surface pressure"),
+    ("tcc",  "Total cloud cover"),
+    ("vis",  "Visibility"),
+    ("tp",   "Total precipitation"),
+    ("c1",   "Low cloud cover"),
+    ("c2",   "Medium cloud cover"),
+    ("c3",   "High cloud cover")
+]
+GRIBFILECACHE = {} # Decoded sub-areas per file, see readGribFile
+
+
+#================================================================================================
+# Builds an index of all messages in a GRIB file in a single pass.
+# Key: (shortName, level, grid extent [latitudeOfLastGridPointInDegrees]) -> first matching message.
+# The message name is mapped to its (shortName, level) pairs in names, as the fields are looked up by name.
+# Only the message headers are read, the values are not decoded.
+def indexGribFile(grbs, filterPropertyName="latitudeOfLastGridPointInDegrees"):
+    index = {}
+    names = {}
+    grbs.seek(0)
+    for grb in grbs:
+        key = (grb['shortName'], grb['level'], grb[filterPropertyName])
+        if key not in index:
+            index[key] = grb
+        # if END
+        if grb['name'] not in names:
+            names[grb['name']] = []
+        # if END
+        if (grb['shortName'], grb['level']) not in names[grb['name']]:
+            names[grb['name']].append((grb['shortName'], grb['level']))
+        # if END
+    # for END
+    return index, names
+# def END
+
+
+#================================================================================================
+# Finds the (row, column) index set of the sub-area [lat1;lat2] x [lon1;lon2] of a GRIB message.
+# Same selection as grb.data(lat1, lat2, lon1, lon2) for regular lat/lon grids. Returns None for other grids.
+def getSubArea(grb, lat1, lat2, lon1, lon2):
+    if (grb['gridType'] != "regular_ll"):
+        return None
+    # if END
+    lats, lons = grb.latlons()
+    ii = np.where((lats[:,0] >= lat1) & (lats[:,0] <= lat2))[0]
+    jj = np.where((lons[0,:] >= lon1) & (lons[0,:] <= lon2))[0]
+    ix = np.ix_(ii,jj)
+    return ix, lats[ix], lons[ix]
+# def END
+
+
+#================================================================================================
+# Key of a decoded GRIB file sub-area in GRIBFILECACHE.
+def getGribFileCacheKey(fn, targetvalue, lat1, lat2, lon1, lon2):
+    st = os.stat(fn)
+    return (fn, st.st_mtime, st.st_size, targetvalue, lat1, lat2, lon1, lon2)
+# def END
+
+
+#================================================================================================
+# Reads and decodes the sub-area of all GRIBMESSAGES fields of one GRIB file.
+# The file is indexed once and the sub-area is located once; results are cached per file (path, mtime, size)
+# and area, so repeated loads of the same archive window do not touch the file again.
+# Returns a dictionary with julianDay, startStep, endStep, lat, lon and the fields of GRIBMESSAGES.
+def readGribFile(fn, targetvalue, lat1, lat2, lon1, lon2):
+    key = getGribFileCacheKey(fn, targetvalue, lat1, lat2, lon1, lon2)
+    if key in GRIBFILECACHE:
+        return GRIBFILECACHE[key]
+    # if END
+    grbs = pgr.open(fn)
+    if VERBOSE: print("Length of grbs: {}".format(len(grbs)))
+    (index, names) = indexGribFile(grbs)
+    grb = grbs.message(1)
+    rec = {}
+    rec["julianDay"] = grb['julianDay']
+    rec["startStep"] = grb['startStep']
+    rec["endStep"]   = grb['endStep']
+    sub = None
+    for (field, messagename) in GRIBMESSAGES:
+        grbx = None
+        for (shortName, level) in names.get(messagename, []):
+            grbx = index.get((shortName, level, targetvalue), None)
+            if (grbx is not None):
+                break
+            # if END
+        # for END
+        if (grbx is None):
+            print("ERROR: Message \"{}\" ({} = {}) not found in GRIB file: {}".format(messagename,"latitudeOfLastGridPointInDegrees",targetvalue,fn))
+            sys.exit()
+        # if END
+        if (sub is None):
+            sub = getSubArea(grbx, lat1, lat2, lon1, lon2)
+            if (sub is None):
+                (values, lat, lon) = grbx.data(lat1, lat2, lon1, lon2)
+            else:
+                (ix, lat, lon) = sub
+            # if END
+            rec["lat"] = lat
+            rec["lon"] = lon
+        # if END
+        if (sub is None):
+            (values, latx, lonx) = grbx.data(lat1, lat2, lon1, lon2)
+        else:
+            values = grbx.values[ix]
+        # if END
+        rec[field] = np.asarray(values)
+    # for END
+    grbs.close()
+    GRIBFILECACHE[key] = rec
+    return rec
+# def END
+
+
+#================================================================================================
+# Widens the area [lat1;lat2] x [lon1;lon2] by a small epsilon, so points on the bounds are included.
+def getSearchArea(lat1, lat2, lon1, lon2):
+    epsilon = 1e-6
+    lat1 = lat1 - epsilon # Lower the limit by just a bit, to be sure to be under...
+    lat2 = lat2 + epsilon # Raise the limit by just a bit, to be sure to be over...
+    lon1 = lon1 - epsilon # Lower the limit by just a bit, to be sure to be under...
+    lon2 = lon2 + epsilon # Raise the limit by just a bit, to be sure to be over...
+    return lat1, lat2, lon1, lon2
+# def END
+
+
+#================================================================================================
+# Store of decoded GRIB sub-areas. Per archive file and area:
+#   <name>_<area>.npy      : float array [STOREFIELDS, i, j] (lat, lon, x, y and the fields of GRIBMESSAGES)
+#   <name>_<area>-meta.npy : [julianDay, startStep, endStep]
+# The data file is read with memory mapping, so only the time steps (files) requested are read from disk.
+STOREFIELDS = ["lat", "lon", "x", "y"] + [ field for (field, messagename) in GRIBMESSAGES ]
+def getGribStoreFilename(fn, targetvalue, lat1, lat2, lon1, lon2):
+    storeDir = GRIBBASEDIR + GRIBSTORE
+    name = os.path.splitext(os.path.basename(fn))[0]
+    return storeDir+"{}_{:g}_{:.4f}_{:.4f}_{:.4f}_{:.4f}.npy".format(name, targetvalue, lat1, lat2, lon1, lon2)
+# def END
+
+
+#================================================================================================
+# Writes a decoded GRIB file record (see readGribFile) to the store.
+def writeGribStore(fn, rec, targetvalue, lat1, lat2, lon1, lon2):
+    sfn = getGribStoreFilename(fn, targetvalue, lat1, lat2, lon1, lon2)
+    os.makedirs(os.path.dirname(sfn), exist_ok=True)
+    x, y = u.latlon2Pos(rec["lat"],rec["lon"],0,0,62.0,-7.0)
+    planes = {"x": x, "y": y}
+    data = np.stack([ np.asarray(planes[field] if field in planes else rec[field], dtype=float) for field in STOREFIELDS ], axis=0)
+    meta = np.array([rec["julianDay"], rec["startStep"], rec["endStep"]], dtype=float)
+    # Write to temporary files first, so readers never see a partial file
+    np.save(sfn+".tmp.npy", data)
+    np.save(sfn+".tmp-meta.npy", meta)
+    os.replace(sfn+".tmp-meta.npy", sfn[:-4]+"-meta.npy")
+    os.replace(sfn+".tmp.npy", sfn)
+# def END
+
+
+#================================================================================================
+# Reads a GRIB file record from the store (memory mapped). Returns None if it is not in the store,
+# or if the GRIB file is newer than the stored record.
+def readGribStore(fn, targetvalue, lat1, lat2, lon1, lon2):
+    sfn = getGribStoreFilename(fn, targetvalue, lat1, lat2, lon1, lon2)
+    mfn = sfn[:-4]+"-meta.npy"
+    if not (os.path.isfile(sfn) and os.path.isfile(mfn)):
+        return None
+    # if END
+    if (os.path.getmtime(sfn) < os.path.getmtime(fn)):
+        return None
+    # if END
+    data = np.load(sfn, mmap_mode="r")
+    meta = np.load(mfn)
+    if (data.shape[0] != len(STOREFIELDS)):
+        return None
+    # if END
+    rec = {}
+    rec["julianDay"] = meta[0]
+    rec["startStep"] = meta[1]
+    rec["endStep"]   = meta[2]
+    for k in range(len(STOREFIELDS)):
+        rec[STOREFIELDS[k]] = data[k]
+    # for END
+    return rec
+# def END
+
+
+#================================================================================================
+# Decodes a list of GRIB (archive) files and writes their sub-area [lat1;lat2] x [lon1;lon2] to the store.
+def ingestToStore(fnlist, lat1, lat2, lon1, lon2, targetvalue=GRIBTARGETFILTERVALUE, nproc=GRIBNPROC):
+    print("Ingesting {} GRIB files to store ...".format(len(fnlist)))
+    (lat1, lat2, lon1, lon2) = getSearchArea(lat1, lat2, lon1, lon2)
+    readGribFiles(fnlist, targetvalue, lat1, lat2, lon1, lon2, nproc, True)
+    print("Ingesting {} GRIB files to store ... DONE".format(len(fnlist)))
+# def END
+
+
+#================================================================================================
+# Reads and decodes a list of GRIB files (see readGribFile) with a pool of nproc processes.
+# Files already in GRIBFILECACHE or (if useStore) in the store are not decoded again. Newly decoded files
+# are written to the store if useStore. Returns the records in the order of fnlist.
+def readGribFiles(fnlist, targetvalue, lat1, lat2, lon1, lon2, nproc=None, useStore=True):
+    if (nproc is None):
+        nproc = os.cpu_count()
+    # if END
+    flen = len(fnlist)
+    recs = [None]*flen
+    todo = []
+    for i in range(flen):
+        key = getGribFileCacheKey(fnlist[i], targetvalue, lat1, lat2, lon1, lon2)
+        if key in GRIBFILECACHE:
+            recs[i] = GRIBFILECACHE[key]
+        else:
+            if (useStore):
+                recs[i] = readGribStore(fnlist[i], targetvalue, lat1, lat2, lon1, lon2)
+            # if END
+            if (recs[i] is None):
+                todo.append(i)
+            # if END
+        # if END
+    # for END
+    print("Reading GRIB files: {} of {} not in cache or store (processes: {}) ...".format(len(todo),flen,min(nproc,max(len(todo),1))))
+    if (nproc > 1 and len(todo) > 1):
+        n = len(todo)
+        with ProcessPoolExecutor(max_workers=min(nproc,n)) as pool:
+            results = pool.map(readGribFile, [fnlist[i] for i in todo], [targetvalue]*n, [lat1]*n, [lat2]*n, [lon1]*n, [lon2]*n)
+            for (i, rec) in zip(todo, results):
+                print("Reading file ({} of {}): {} ... DONE".format(i+1,flen,os.path.basename(fnlist[i])))
+                recs[i] = rec
+                GRIBFILECACHE[getGribFileCacheKey(fnlist[i], targetvalue, lat1, lat2, lon1, lon2)] = rec
+            # for END
+        # with END
+    else:
+        for i in todo:
+            print("Reading file ({} of {}): {} ...".format(i+1,flen,os.path.basename(fnlist[i])))
+            recs[i] = readGribFile(fnlist[i], targetvalue, lat1, lat2, lon1, lon2)
+        # for END
+    # if END
+    if (useStore):
+        for i in todo:
+            try:
+                writeGribStore(fnlist[i], recs[i], targetvalue, lat1, lat2, lon1, lon2)
+            except OSError as e:
+                print("WARNING: Could not write GRIB store for {}: {}".format(os.path.basename(fnlist[i]),e))
+            # try END
+        # for END
+    # if END
+    return recs
+# def END
+
+
+#================================================================================================
+# Calculates the DELTA of an accumulated field (cdr, lsp, tp) for all files in one pass along the time axis.
+#   values      : Accumulated field [i,j,file], files in (sorted) file order
+#   slots       : Time step (n) of each file
+#   isModelData : False for analysis files (T00-01-00), which overwrite the previous time step
+#   timefactor  : Factor of the accumulated value used when there is no previous value (first file)
+# Model data    : DELTA = value - value of the previous file
+# Analysis data : DELTA = value - the accumulated value of the time step it overwrites
+# Returns the DELTA [i,j,file], clipped to be non-negative.
+def calcAccumulatedDelta(values, slots, isModelData, timefactor, name="X"):
+    flen = values.shape[2]
+    base = np.full(flen, -1, dtype=int) # File to subtract, -1: none
+    for i in range(flen):
+        if (isModelData[i]):
+            base[i] = i - 1
+        else:
+            prev = np.where(slots[:i] == slots[i])[0]
+            if (len(prev) > 0):
+                base[i] = prev[-1]
+            # if END
+            print("WARNING: {}X = {}2 - {}N (file {})".format(name,name,name,i+1))
+        # if END
+    # for END
+    hasBase = (base >= 0)
+    delta = np.subtract(values, np.where(hasBase[np.newaxis,np.newaxis,:], values[:,:,np.maximum(base,0)], 0.0))
+    first = np.logical_and(isModelData, np.logical_not(hasBase))
+    for i in np.where(first)[0]:
+        print("WARNING: {:4.1f}% of {} used for delta. (file {})".format(timefactor[i]*100, name, i+1))
+        delta[:,:,i] = np.multiply(values[:,:,i], timefactor[i])
+    # for END
+    # Ensure only positive values
+    return np.maximum(delta, 0)
+# def END
+
+
 
 #================================================================================================
 # Returns the GRIB data for the intervals
@@ -272,19 +576,14 @@ def selectMessage(grbs, messagename, targetvalue,lat1=0, lat2=90, lon1=-90, lon2
 # Latitude : [lat1; lat2]
 # Longitude: [lon1, lon2]
 # Returns  : timesteps, lat, lon, x, y, mslp, u10, v10, t2, c1, c2, c3
-def get_ecmwf_FVCOMdata(fromDateTime, toDateTime, lat1, lat2, lon1, lon2):
+def get_ecmwf_FVCOMdata(fromDateTime, toDateTime, lat1, lat2, lon1, lon2, nproc=GRIBNPROC, useStore=True):
     # Settings
-    targetFilterValue = 57.5
-    targetFilterValue = 30.0
+    targetFilterValue = GRIBTARGETFILTERVALUE
 
     # Initialize parameters
     fromDateTime = fromDateTime - dt.timedelta(seconds=5)
     toDateTime   = toDateTime   + dt.timedelta(seconds=5)
-    epsilon = 1e-6
-    lat1 = lat1 - epsilon # Lower the limit by just a bit, to be sure to be under...
-    lat2 = lat2 + epsilon # Raise the limit by just a bit, to be sure to be over...
-    lon1 = lon1 - epsilon # Lower the limit by just a bit, to be sure to be under...
-    lon2 = lon2 + epsilon # Raise the limit by just a bit, to be sure to be over...
+    (lat1, lat2, lon1, lon2) = getSearchArea(lat1, lat2, lon1, lon2)
 
     # Initialize dirs
     baseDir = GRIBBASEDIR
@@ -320,24 +619,31 @@ def get_ecmwf_FVCOMdata(fromDateTime, toDateTime, lat1, lat2, lon1, lon2):
     #sys.exit()
 
     #====================================================================================
-    # Read data dimensions
-    grbs = pgr.open(archiveDir+flist[0])
-    (data, lat, lon, grb, index) = selectMessage(grbs,"Mean sea level pressure",targetFilterValue, lat1, lat2, lon1, lon2)
-    xlen=data.shape[0]
-    ylen=data.shape[1]
+    # Read (decode) all files
+    recs = readGribFiles([archiveDir+fl for fl in flist], targetFilterValue, lat1, lat2, lon1, lon2, nproc, useStore)
+    xlen=recs[0]["mslp"].shape[0]
+    ylen=recs[0]["mslp"].shape[1]
 
     #===================================================
     # Initialize timesteps array
     dt0=dt.datetime(1900,1,1,00,00,00) # Just a dummy value to initialize the array with
 
     print("Calculate the number of timesteps to generate ...")
-    nTimeSteps = 0
+    slots = np.zeros(flen,dtype=int) # Time step (n) of each file
+    isModelData = np.ones(flen,dtype=bool)
+    n = 0 # Counter
     for i in range(flen):
         if (flist[i].find("T00-01-00.grib")>-1):
-            nTimeSteps = max(nTimeSteps-1,0)
+            nm1 = max (n - 1, 0)
+            print("WARNING: Overwriting simulation data, with new inital data (measurements) (n:{}->{}) ({}).".format(n,nm1,flist[i]))
+            n = nm1
+            isModelData[i] = False
+             # Roll back and overwrite previous entry.
         # if END
-        nTimeSteps = nTimeSteps + 1
+        slots[i] = n
+        n = n + 1
     # for END
+    nTimeSteps = n
     print("Number of calculated time steps: {}".format(nTimeSteps))
 
 
@@ -386,201 +692,47 @@ def get_ecmwf_FVCOMdata(fromDateTime, toDateTime, lat1, lat2, lon1, lon2):
     #windspeed = np.zeros([xlen,ylen,nTimeSteps])
     #direction = np.zeros([xlen,ylen,nTimeSteps])
     #
-    # Temp variables for CDR/CDRX, LSP/LSPX, TP/TPX
-    cdr2 = None
-    cdr1 = None
-    lsp2 = None
-    lsp1 = None
-    tp1 = None
-    tp2 = None
-
-
-    gridConstructed = False
-
-    n = 0 # Counter
-    for i in range(flen):
-    #for i in range(1):
-        print("Reading file ({} of {}): {} ...".format(i+1,flen,flist[i]))
-        isModelData = True
-        if (flist[i].find("T00-01-00.grib")>-1):
-            nm1 = max (n - 1, 0)
-            print("WARNING: Overwriting simulation data, with new inital data (measurements) (n:{}->{}).".format(n,nm1))
-            n = nm1
-            isModelData = False
-             # Roll back and overwrite previous entry.
-        # if END
-        fn=archiveDir+flist[i]
-        grbs = pgr.open(fn)
-
-
-        if VERBOSE: print("Length of grbs: {}".format(len(grbs)))
-        grb=grbs.message(1)
-
-        # FOR DEBUG/DEVELOPMENT PURPOSES::
-        #printKeys(grb)
-        #printMessages(grbs)
-
-        # DO NOT DELETE - YET....
-        julianDay[n] = grb['julianDay']
-        startStep[n] = grb['startStep']
-        endStep[n]   = grb['endStep']
-        refMJD[n] = julianDay[n] - MJD0
-        mjd[n] = refMJD[n] + startStep[n]/24
-        hour[n] = grb['startStep']
-        xxtimefactor[n] = 3.0/max(3.0,hour[n]) # Factor used to calculate data, when delta value is missing/impossible to calculate.
+    # The last file written to a time step is kept
+    keep = np.zeros(flen,dtype=bool)
+    for n in range(nTimeSteps):
+        keep[np.where(slots == n)[0][-1]] = True
+    # for END
+    ks = slots[keep]
+    ik = np.where(keep)[0]
+    #
+    julianDay[ks] = [ recs[i]['julianDay'] for i in ik ]
+    startStep[ks] = [ recs[i]['startStep'] for i in ik ]
+    endStep[ks]   = [ recs[i]['endStep'] for i in ik ]
+    refMJD = julianDay - MJD0
+    mjd = refMJD + startStep/24
+    hour = np.copy(startStep)
+    xxtimefactor = 3.0/np.maximum(3.0,hour) # Factor used to calculate data, when delta value is missing/impossible to calculate.
+    fileTimeFactor = np.array([ 3.0/max(3.0,rec['startStep']) for rec in recs ])
+    #
+    # Instantaneous fields
+    for (field, data) in [("mslp",mslp), ("u10",u10), ("v10",v10), ("dpt2",dpt2), ("t2",t2), ("cbh",cbh), ("cp",cp), ("sp",sp), ("tcc",tcc), ("vis",vis), ("c1",c1), ("c2",c2), ("c3",c3)]:
+        data[:,:,ks] = np.stack([ recs[i][field] for i in ik ], axis=2)
+    # for END
+    lat[:,:] = recs[-1]["lat"]
+    lon[:,:] = recs[-1]["lon"]
+    #
+    # Accumulated fields and their DELTA (CDR/CDRX, LSP/LSPX, TP/TPX)
+    for (field, data, datax) in [("cdr",cdr,cdrx), ("lsp",lsp,lspx), ("tp",tp,tpx)]:
+        values = np.stack([ rec[field] for rec in recs ], axis=2)
+        delta = calcAccumulatedDelta(values, slots, isModelData, fileTimeFactor, field.upper())
+        data[:,:,ks]  = values[:,:,keep]
+        datax[:,:,ks] = delta[:,:,keep]
+    # for END
+    #
+    for n in range(nTimeSteps):
+        timesteps[n]=u.MJD2datetime(mjd[n])
         if VERBOSE:
             print("JulianDay {}    MJD: {}".format(julianDay[n],mjd[n]))
-        #for grb in grbs:
-        #    print(grb)
-
-        #(xtime, latx, lonx, grb, index) = selectMessage(grbs,"time",targetFilterValue, lat1, lat2, lon1, lon2)
-        #print("xtime {}".format(xtime))
-        #sys.exit()
-
-
-        # MSLP
-        (mslp[:,:,n], latx, lonx, grb, index) = selectMessage(grbs,"Mean sea level pressure",targetFilterValue, lat1, lat2, lon1, lon2)
-        lat[:,:]=latx
-        lon[:,:]=lonx
-        if VERBOSE:
-            print("LAT shape: {}".format(lat.shape))
-        # if END
-        #
-        #
-        # U10
-        (u10[:,:,n], latx, lonx, grb, index) = selectMessage(grbs,"10 metre U wind component",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # V10
-        (v10[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"10 metre V wind component",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # DPT2
-        (dpt2[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"2 metre dewpoint temperature",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # T2
-        (t2[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"2 metre temperature",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # CDR / CDRX
-        # Reading: Clear-sky direct solar radiation at surface, J m**-2
-        if ( not cdr2 is None):
-            cdr1 = cdr2
-        # if END
-        (cdr2, grb, latx, lonx, index) = selectMessage(grbs,"Surface direct short-wave radiation, clear sky",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        if (isModelData):
-            if ( not cdr1 is None):
-                cdrx[:,:,n]=np.subtract(cdr2,cdr1)
-            else:
-                print("WARNING: {:4.1f}% of Clear-sky direct solar radiation at surface used for delta radiation. (hour = {})".format(xxtimefactor[n]*100, hour[n]))
-                cdrx[:,:,n]=np.multiply(cdr2,xxtimefactor[n])
-            # if END
-            cdr[:,:,n] = cdr2 # Same :-)
-        else:
-            print("WARNING: CDRX = CDR2 - CDRN")
-            cdrx[:,:,n] = np.subtract(cdr2 , cdr[:,:,n])
-            print("WARNING: CDR overwritten with measurement data.")
-            cdr[:,:,n] = cdr2 # Same :-)
-        # if END
-        # Ensure only positive precipitation
-        cdrx[:,:,n] = np.maximum(cdrx[:,:,n], 0)
-        #
-        #
-        #
-        # CBH
-        (cbh[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Cloud base height",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # CP
-        (cp[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Convective precipitation",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        #
-        # LSP / LSPX
-        # Reading: Clear-sky direct solar radiation at surface, J m**-2
-        if ( not lsp2 is None):
-            lsp1 = lsp2
-        # if END
-        (lsp2, grb, latx, lonx, index) = selectMessage(grbs,"Large-scale precipitation",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        if (isModelData):
-            if ( not lsp1 is None):
-                lspx[:,:,n]=np.subtract(lsp2,lsp1)
-            else:
-                print("WARNING: {:4.1f}% of Large-scale precipitation used for delta precipitation. (hour = {})".format(xxtimefactor[n]*100, hour[n]))
-                lspx[:,:,n]=np.multiply(lsp2,xxtimefactor[n])
-            # if END
-            lsp[:,:,n] = lsp2 # Same :-)
-        else:
-            print("WARNING: LSPX = LSP2 - LSPN")
-            lspx[:,:,n] = np.subtract(lsp2 , lsp[:,:,n])
-            print("WARNING: LSP overwritten with measurement data.")
-            lsp[:,:,n] = lsp2 # Same :-)
-        # if END
-        # Ensure only positive precipitation
-        lspx[:,:,n] = np.maximum(lspx[:,:,n], 0)
-        #
-        #
-        # SP
-        (sp[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Surface pressure",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # TCC
-        (tcc[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Total cloud cover",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        # VIS
-        (vis[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Visibility",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        #
-        #
-        # TP / TPX
-        # Reading Total precipitation
-        if ( not tp2 is None):
-            tp1 = tp2
-        # if END
-        (tp2, grb, latx, lonx, index) = selectMessage(grbs,"Total precipitation",targetFilterValue, lat1, lat2, lon1, lon2)
-        #
-        if (isModelData):
-            if ( not tp1 is None):
-                tpx[:,:,n]=np.subtract(tp2,tp1)
-            else:
-                print("WARNING: {:4.1f}% of total preciptitation used for delta precipitation. (hour = {})".format(xxtimefactor[n]*100, hour[n]))
-                tpx[:,:,n]=np.multiply(tp2,xxtimefactor[n])
-            # if END
-            tp[:,:,n] = tp2 # Same :-)
-        else:
-            print("WARNING: TPX = TP2 - TPN")
-            tpx[:,:,n] = np.subtract(tp2 , tp[:,:,n])
-            print("WARNING: TP overwritten with measurement data.")
-            tp[:,:,n] = tp2 # Same :-)
-            #print("WARNING: TP NOT overwritten with measurement data.")
-        # if END
-        # Ensure only positive precipitation
-        tpx[:,:,n] = np.maximum(tpx[:,:,n], 0)
-        #
-        #
-        # C1
-        (c1[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Low cloud cover",targetFilterValue, lat1, lat2, lon1, lon2)
-        # C2
-        (c2[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"Medium cloud cover",targetFilterValue, lat1, lat2, lon1, lon2)
-        # C3
-        (c3[:,:,n], grb, latx, lonx, index) = selectMessage(grbs,"High cloud cover",targetFilterValue, lat1, lat2, lon1, lon2)
-
-        #timesteps[n]=datetime.strptime(dflist[i],'%Y-%m-%dT%H-%M-%S')
-        timesteps[n]=u.MJD2datetime(mjd[n])
-        #timesteps[i]=string2DateTime(flist[i][11:20],runtime_month)
         print("  File timestamp: {}".format(timesteps[n].strftime("%Y-%m-%d %H:%M:%S")))
-
-
-
-
-        if (not gridConstructed):
-            gridConstructed = True
-            for j in range(xlen):
-                for k in range(ylen):
-                    rx, ry=u.latlon2Pos(lat[j][k],lon[j][k],0,0,62.0,-7.0)
-                    x[j][k]=rx
-                    y[j][k]=ry
-                # for k END
-            #for j END
-        #if END
-        n = n + 1
     # for END
+    #
+    x[:,:], y[:,:] = u.latlon2Pos(lat,lon,0,0,62.0,-7.0)
+    n = nTimeSteps
     ncount = n
     #
     #sys.exit()
@@ -5,6 +5,13 @@
 # Version 1.3 29-05-2024
 #==================================================================
 import netCDF4
+import numpy as np
+import sys
+import os
+import struct
+import zipfile
+import hashlib
+import fvcomlibutil as u
 #
 # Reads a text file line by line.
 def getFileContent(fn):
@@ -29,4 +36,141 @@ def writeFile(fn,s):
     f = open(fn, "w")
     f.write(s)
     f.close()
+#
+#
+# Returns the SHA1 hex digest of a file, read in 1 MB blocks.
+def getFileSha1(fn):
+    h = hashlib.sha1()
+    with open(fn, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+#
+#
+# Loads an uncompressed .npz file (np.savez) as memory maps, one per array.
+# np.load ignores mmap_mode for .npz, so the offset of each stored .npy
+# member is found from its zip local header. mode='c' (copy-on-write) lets
+# the caller modify the arrays without touching the file. Compressed or
+# object members are read normally.
+def loadNpzMmap(fn, mode='c'):
+    result = {}
+    with zipfile.ZipFile(fn) as z, open(fn, "rb") as f:
+        for info in z.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if (info.compress_type != zipfile.ZIP_STORED):
+                with z.open(info) as m:
+                    result[name] = np.load(m, allow_pickle=False)
+                continue
+            # if END
+            f.seek(info.header_offset)
+            header = f.read(30)
+            nlen, elen = struct.unpack("<HH", header[26:30])
+            f.seek(info.header_offset + 30 + nlen + elen)
+            version = np.lib.format.read_magic(f)
+            if (version == (1, 0)):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            # if END
+            if (dtype.hasobject or (int(np.prod(shape)) == 0)):
+                with z.open(info) as m:
+                    result[name] = np.load(m, allow_pickle=False)
+            else:
+                order = 'F' if fortran else 'C'
+                result[name] = np.asarray(np.memmap(fn, dtype=dtype, mode=mode, offset=f.tell(), shape=shape, order=order))
+            # if END
+        # for END
+    # with END
+    return result
     
+#
+#
+# FVCOM surface forcing variables: name -> (location dimension, attributes).
+# Same schema as buildwind_base.cdl (+ heating fields).
+FORCINGVARS = {
+    "uwind_speed"     : ("nele", {"long_name": "Eastward Wind Speed",  "standard_name": "Wind Speed", "units": "m/s"}),
+    "vwind_speed"     : ("nele", {"long_name": "Northward Wind Speed", "standard_name": "Wind Speed", "units": "m/s"}),
+    "air_temperature" : ("node", {"long_name": "Surface air temperature", "units": "Celsius Degree"}),
+    "short_wave"      : ("node", {"long_name": "Short Wave Radiation", "units": "W m-2"}),
+    "long_wave"       : ("node", {"long_name": "Long Wave Radiation", "units": "W m-2"}),
+    "air_pressure"    : ("node", {"long_name": "Surface air pressure", "units": "Pa"}),
+    "net_heat_flux"   : ("node", {"long_name": "Surface Net Heat Flux", "units": "W m-2"}),
+    "precip"          : ("node", {"long_name": "Precipitation", "description": "Precipitation, ocean lose water is negative", "units": "m s-1"}),
+    "evap"            : ("node", {"long_name": "Evaporation", "description": "Evaporation, ocean lose water is negative", "units": "m s-1"}),
+}
+#
+#
+# Writes an FVCOM surface forcing NetCDF file directly from numpy arrays (no CDL/ncgen).
+#   T        : Time in MJD (TN)
+#   fields   : Dictionary name -> array (entries, TN), names from FORCINGVARS. Written as var(time, nele/node).
+#   chunk    : Number of time steps written per chunk.
+#   compress : zlib compression (complevel) of the data variables.
+def writeForcingNetCDF(fn, T, fields, nele, node, globalattrs=None, timezone="none", chunk=24, compress=False, complevel=4):
+    T = np.asarray(T, dtype=float)
+    TN = len(T)
+    print("Writing NetCDF file: {} ...".format(fn))
+    ds = netCDF4.Dataset(fn, "w", format="NETCDF4" if compress else "NETCDF3_64BIT_OFFSET")
+    try:
+        ds.createDimension("nele", nele)
+        ds.createDimension("node", node)
+        ds.createDimension("one", 1)
+        ds.createDimension("three", 3)
+        ds.createDimension("time", None)
+        ds.createDimension("DateStrLen", 26)
+        #
+        vt = ds.createVariable("time", "f4", ("time",))
+        vt.long_name = "time"
+        vt.units = "days since 1858-11-17 00:00:00"
+        vt.format = "modified julian day (MJD)"
+        vt.time_zone = timezone
+        vi = ds.createVariable("Itime", "i4", ("time",))
+        vi.long_name = "itime"
+        vi.units = "days since 1858-11-17 00:00:00"
+        vi.format = "modified julian day (MJD)"
+        vi.time_zone = timezone
+        vi2 = ds.createVariable("Itime2", "i4", ("time",))
+        vi2.long_name = "itime2"
+        vi2.units = "msec since 00:00:00"
+        vi2.time_zone = timezone
+        #
+        vdata = {}
+        for name in fields:
+            if name not in FORCINGVARS:
+                print("ERROR: Unknown forcing variable: [{}]. Exiting.".format(name))
+                sys.exit(1)
+            # if END
+            (dim, attrs) = FORCINGVARS[name]
+            if compress:
+                v = ds.createVariable(name, "f4", ("time", dim), zlib=True, complevel=complevel, chunksizes=(min(chunk,max(TN,1)), nele if dim == "nele" else node))
+            else:
+                v = ds.createVariable(name, "f4", ("time", dim))
+            # if END
+            for a in attrs:
+                v.setncattr(a, attrs[a])
+            v.grid = "fvcom_grid"
+            v.type = "data"
+            vdata[name] = v
+        # for END
+        if globalattrs is not None:
+            for a in globalattrs:
+                ds.setncattr(a, globalattrs[a])
+            # for END
+        # if END
+        #
+        # Rounded once and split, so a time a hair below midnight gives (day, 0), not (day-1, 86400000).
+        ms = np.rint(T*u.MILLISECONDSPERDAY).astype(np.int64)
+        Itime, Itime2 = np.divmod(ms, u.MILLISECONDSPERDAY)
+        vt[:] = T
+        vi[:] = Itime.astype(np.int32)
+        vi2[:] = Itime2.astype(np.int32)
+        for t0 in range(0, TN, chunk):
+            t1 = min(t0+chunk, TN)
+            for name in fields:
+                vdata[name][t0:t1,:] = np.transpose(fields[name][:,t0:t1])
+            # for END
+            print("Writing NetCDF file: {} ... {:4.0f}%".format(fn, 100*t1/TN))
+        # for END
+    finally:
+        ds.close()
+    # try END
+    print("Writing NetCDF file: {} ... DONE.".format(fn))
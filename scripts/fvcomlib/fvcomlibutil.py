@@ -89,62 +89,53 @@ def ensure_numpy_array(value):
 # 30  4243
 # 35  5623
 # Formula f(x) = 0,0393512340600576 x2 + 1,64471673914321 x2 + 39,5281581653641 x + 577,564717635306
-def calcSatPartialWaterPressure(t):
-    coeff = np.array([3, 2, 1, 0])
-
-    factors = [0.0393512340600576, 1.64471673914321, 39.5281581653641, 577.564717635306]
-
-    #print("Size of array: {}".format(np.size(t)))
-    #print("Shape of array: {}".format(t.shape))
-    ilen = np.size(t)
-    #print(ilen)
-
-
-    x = np.zeros((ilen),float)
-    #x[0]=-1
-
-
-    for i in range(ilen):
-        ts = np.multiply(t[i], np.ones((4),float))
-        x[i] = np.sum(np.multiply(factors,np.power(ts,coeff)))
-    # for i END
-
-
+# Evaluated in Horner form over the whole array (any shape). If out is given (same shape, float),
+# the result is written into it.
+SATPRESSURECOEFFS = (0.0393512340600576, 1.64471673914321, 39.5281581653641, 577.564717635306) # x^3, x^2, x, 1
+def calcSatPartialWaterPressure(t, out=None):
+    t = np.asarray(t, dtype=float)
+    if (out is not None and np.shares_memory(out, t)):
+        t = np.copy(t) # t is needed after out has been overwritten
+    # if END
+    c3, c2, c1, c0 = SATPRESSURECOEFFS
+    x = np.multiply(t, c3, out=out)
+    x += c2
+    x *= t
+    x += c1
+    x *= t
+    x += c0
     return x
 
 #========================================================================
 # Calculates the evaporation from the sea surface
 # From eq (5) https://ethz.ch/content/dam/ethz/special-interest/usys/iac/iac-dam/documents/edu/courses/atmospheric_physics_lab_work/evaporation.pdf
 
-# T0 is the Sea temperature in C
-# T is the Air temperature in C
-# p is the pressure in Pa (conversion to hPa is done inside)
-# TwDelta is the number of degrees (in C), that Tw (Wet bulb temperature) is below the air temperature. Should be positive.
-def calcEvapSimple(u,Twater,Tair,RH=0.80):
+# u is the wind speed in m/s (nodes x T)
+# Twater is the Sea temperature in C (T)
+# Tair is the Air temperature in C (nodes x T)
+# RH is the relative humidity (scalar or per node)
+# Returns the evaporation in m/s (nodes x T). If out is given (nodes x T, float), the result is written into it.
+def calcEvapSimple(u,Twater,Tair,RH=0.80,out=None):
     Twater = ensure_numpy_array(Twater)
-    Tair = ensure_numpy_array(Tair)
+    Tair = np.asarray(Tair, dtype=float)
     RH = ensure_numpy_array(RH)
+    if (RH.size > 1 and Tair.ndim == 2 and RH.size == Tair.shape[0]):
+        RH = RH.reshape(-1, 1) # Per node
+    # if END
 
     a = 30.6 # m/s
     b = 32.1 # no unit
     deltaHw = 2410 # kJ/kg
 
-    mA = np.zeros(Tair.shape,float)
-    #print("u shape: {}".format(u.shape))
-    #print("Twater shape: {}".format(Twater.shape))
-    #print("Tair shape: {}".format(Tair.shape))
-
-    pwPa = calcSatPartialWaterPressure(Twater)
-    #print("pw({}):\n{}".format(Twater,pwPa))
-    pwHg = (1/133.322) * pwPa # mmHg
-    tlen = np.size(Twater)
-    for t in range(tlen):
-        paPa = calcSatPartialWaterPressure(Tair[:,t])*RH
-        #print("pa({}):\n{}".format(Tair[:,t],paPa))
-        paHg = (1/133.322) * paPa # mmHg
-        mA[:,t] = (a+b*u[:,t])*(pwHg[t]-paHg)/deltaHw # kg/(m2 hour)
-        mA[:,t] = np.multiply(mA[:,t],1 /(1000 * 3600)) #  1kg/m2 = 1mmH2O => 1/1000 mH2O; 1/hour = 1/(3600s)
-    # for END
+    pwHg = calcSatPartialWaterPressure(Twater) * (1/133.322) # mmHg, per time step
+    mA = calcSatPartialWaterPressure(Tair, out) # paPa
+    mA *= RH
+    mA *= (1/133.322) # paHg, mmHg
+    np.subtract(pwHg, mA, out=mA) # pwHg - paHg
+    w = np.multiply(b, u)
+    w += a
+    mA *= w
+    mA *= 1 / (deltaHw * 1000 * 3600) # kg/(m2 hour) => 1kg/m2 = 1mmH2O => 1/1000 mH2O; 1/hour = 1/(3600s)
 
     return mA
 
@@ -213,6 +204,42 @@ def calcWindSpeedDirection(u, v):
     wd = np.mod(np.add(180,wd),360) # Transform from TO-direction to FROM-direction
     return ws, wd
 
+#========================================================================
+# Speed (magnitude) of the vector (u, v), any (broadcastable) shapes.
+def calcSpeed(u, v):
+    return np.sqrt(np.add(np.square(u),np.square(v)))
+
+#========================================================================
+# Direction (360 deg) of the vector (u, v) relative to NORTH and CW, as the
+# TO-direction (currents), or the FROM-direction (wind) if fromDirection.
+def calcDirection(u, v, fromDirection=False):
+    wd = np.multiply(RAD2DEG,np.arctan2(u,v)) # NorthCW, TO-direction
+    if (fromDirection):
+        wd += 180
+    return np.mod(wd,360)
+
+#========================================================================
+# Density of sea water (kg/m3) at atmospheric pressure from temperature T (C)
+# and salinity S (psu), UNESCO 1981 (EOS-80), valid for 0-40 C and 0-42 psu.
+# The polynomials in T are evaluated in Horner form over the whole array.
+SEAWATERRHOWCOEFFS = (6.536332e-9, -1.120083e-6, 1.001685e-4, -9.095290e-3, 6.793952e-2, 999.842594) # Pure water, T^5 ... 1
+SEAWATERACOEFFS    = (5.3875e-9, -8.2467e-7, 7.6438e-5, -4.0899e-3, 8.24493e-1) # S term, T^4 ... 1
+SEAWATERBCOEFFS    = (-1.6546e-6, 1.0227e-4, -5.72466e-3) # S^1.5 term, T^2 ... 1
+SEAWATERC          = 4.8314e-4 # S^2 term
+def calcSeawaterDensity(T, S):
+    T, S = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(S, dtype=float))
+    def horner(coeffs):
+        x = np.full(T.shape, coeffs[0])
+        for c in coeffs[1:]:
+            x *= T
+            x += c
+        return x
+    rho = horner(SEAWATERRHOWCOEFFS)
+    rho += horner(SEAWATERACOEFFS) * S
+    rho += horner(SEAWATERBCOEFFS) * (S * np.sqrt(S))
+    rho += SEAWATERC * np.square(S)
+    return rho
+
 #========================================================================
 # Calculates the X and Y values and transforms the NorthCW to EastCCW.
 def calcWindXY(ws,wd):
@@ -225,28 +252,55 @@ def calcWindXY(ws,wd):
 # def END
 #
 #========================================================================
-# Check and correct Wind Direction values.
-# This is used in interpolation, to prevent jumping values where
-# smooth transitions should be.
-# Convert date to MJD (float)
+# unwrapDegrees
+# Unwraps angles (degrees) along axis, so consecutive values never differ by more than 180 degrees:
+# each value is shifted by the whole number of turns (360) that brings it within [-180;180] of the
+# (already unwrapped) previous value, as the former per-point loops did. A jump of exactly +-180 from
+# the unwrapped previous value is kept with its sign (np.unwrap instead takes the sign of the raw
+# jump). Returns the unwrapped array and the number of 360 degree shifts made (summed over all
+# values, as counted by the former per-point loops).
+def unwrapDegrees(wd,axis=-1):
+    wd = np.asarray(wd,dtype=float)
+    if (wd.shape[axis] < 2):
+        return np.copy(wd), 0
+    d = np.moveaxis(np.diff(wd,axis=axis),axis,-1)
+    turns = np.where(d > 180, -np.ceil((d - 180) / 360), np.where(d < -180, np.ceil((-180 - d) / 360), 0)) # Turns added at each step
+    # A raw jump of 180+360*m lands exactly on +-180 from the unwrapped previous value; the sign (and so the
+    # turns) depends on the turns T already added to the previous value: +180 if m >= T, else -180.
+    tie = (np.mod(d - 180, 360) == 0)
+    if (np.any(tie)):
+        m = np.round((d - 180) / 360)
+        T = np.zeros(d.shape[:-1])
+        k0 = 0
+        for k in np.flatnonzero(np.any(tie.reshape(-1, d.shape[-1]), axis=0)):
+            T += np.sum(turns[..., k0:k], axis=-1) # Turns of the value before step k
+            turns[..., k] = np.where(tie[..., k], np.where(m[..., k] >= T, -m[..., k], -m[..., k] - 1), turns[..., k])
+            k0 = k
+        # for END
+    # if END
+    turns = np.moveaxis(np.cumsum(turns,axis=-1),-1,axis) # Total turns added to each value
+    nchanges = int(np.sum(np.abs(turns)))
+    res = np.copy(wd)
+    if (nchanges > 0):
+        idx = [slice(None)] * wd.ndim
+        idx[axis] = slice(1,None)
+        res[tuple(idx)] += turns * 360
+    # if END
+    if VERBOSE:
+        for p in np.argwhere(turns != 0)[:100]:
+            q = np.copy(p)
+            q[axis] += 1 # Index of the changed value in wd
+            print("Changed rotation of point {} by {:+.0f} turns.".format(tuple(q),turns[tuple(p)]))
+        # for END
+    # if END
+    return res, nchanges
+# def END
+
+#========================================================================
+# Check and correct Wind Direction values between w_istart and w_iend-1 (see unwrapDegrees).
 def correctWindDirection(d_winddir,w_istart,w_iend):
-    nchanges = 0
-    for i in range(w_istart,w_iend-1):
-        while (d_winddir[i+1]-d_winddir[i] > 180): # THEN CounterClockwise
-            x1=d_winddir[i+1]
-            x2=d_winddir[i+1]-360
-            d_winddir[i+1]=x2
-            nchanges = nchanges + 1
-            if VERBOSE: print("Changed rotation direction of point {} to CCW ({} to {}) (prev. {}).".format(i+1,x1,x2,d_winddir[i]))
-        # while END
-        while (d_winddir[i+1]-d_winddir[i] < -180): # THEN CounterClockwise
-            x1=d_winddir[i+1]
-            x2=d_winddir[i+1]+360
-            d_winddir[i+1]=x2
-            nchanges = nchanges + 1
-            if VERBOSE: print("Changed rotation direction of point {} to CW ({} to {}) (prev. {}).".format(i+1,x1,x2,d_winddir[i]))
-        # while END
-    #A for END
+    res, nchanges = unwrapDegrees(np.asarray(d_winddir[w_istart:w_iend],dtype=float))
+    d_winddir[w_istart:w_iend] = res.tolist() if isinstance(d_winddir,list) else res
     return d_winddir, nchanges
 # def END
 
@@ -254,33 +308,11 @@ def correctWindDirection(d_winddir,w_istart,w_iend):
 # Check and correct Wind Direction values.
 # This is used in interpolation, to prevent jumping values where
 # smooth transitions should be.
-# Convert date to MJD (float)
+# The time steps are along the last axis (lat,lon,time) (see unwrapDegrees).
 def correctWindDirection3D(wd):
-    nchanges = 0
-    jcnt=wd.shape[0]
-    kcnt=wd.shape[1]
-    icnt=wd.shape[2]
-    print("jCNT: {}  kCNT: {}   iCNT: {}".format(jcnt,kcnt,icnt))
-    for j in range(jcnt): # X - direction
-        for k in range(kcnt): # y - direction
-            for i in range(icnt-1): # Time steps
-                while (wd[j,k,i+1]-wd[j,k,i] > 180): # THEN CounterClockwise
-                    x1=wd[j,k,i+1]
-                    x2=wd[j,k,i+1]-360
-                    wd[j,k,i+1]=x2
-                    nchanges = nchanges + 1
-                    if VERBOSE: print("Changed rotation (x,y,t)=({},{},{}) to CCW ({:6.1f} to {:6.1f}) (prev.pt. {:6.1f}).".format(j,k,i+1,x1,x2,wd[j,k,i]))
-                # while END
-                while (wd[j,k,i+1]-wd[j,k,i] < -180): # THEN CounterClockwise
-                    x1=wd[j,k,i+1]
-                    x2=wd[j,k,i+1]+360
-                    wd[j,k,i+1]=x2
-                    nchanges = nchanges + 1
-                    if VERBOSE: print("Changed rotation (x,y,t)=({},{},{}) to CW ({:6.1f} to {:6.1f}) (prev.pt. {:6.1f}).".format(j,k,i+1,x1,x2,wd[j,k,i]))
-                # while END
-            # for i END
-        #for k END
-    #for j END
+    print("jCNT: {}  kCNT: {}   iCNT: {}".format(wd.shape[0],wd.shape[1],wd.shape[2]))
+    res, nchanges = unwrapDegrees(wd,axis=2)
+    wd[...] = res
     return wd, nchanges
 # def END
 
@@ -6,6 +6,38 @@ import sys
 
 TEPSILON = 1e-6
 KELVIN = 273.15
+RAMPBLOCKSIZE = 24 # Output time steps per block in createRamps
+APPENDRESERVE = 8  # Minimum number of spare time steps reserved when a field grows (see appendFieldStep)
+#
+# Field registry: name -> (unit, description, source). Every field is a (lat,lon,time) array attribute
+# of GRIBData with a <name>_unit attribute. source is "grib" (decoded) or "calc" (calculated).
+GRIBFIELDS = {
+    "mslp" : ("Pa",   "Mean sea level pressure, Pa",                                  "grib"),
+    "u10"  : ("m/s",  "10 metre U wind component, m/s",                               "grib"),
+    "v10"  : ("m/s",  "10 metre V wind component, m/s",                               "grib"),
+    "dpt2" : ("°C",   "2 metre dewpoint temperature, °C/C (GRIB: K)",                "grib"),
+    "t2"   : ("°C",   "2 metre temperature, °C/C (GRIB: K)",                         "grib"),
+    "cdr"  : ("J/m2", "Clear-sky direct solar radiation at surface, J m**-2",         "grib"),
+    "cdrx" : ("W/m2", "Clear-sky direct solar radiation at surface, W m**-2",         "grib"),
+    "cbh"  : ("m",    "Cloud base height",                                            "grib"),
+    "cp"   : ("m",    "Convective precipitation, m",                                  "grib"),
+    "lsp"  : ("m",    "Large-scale precipitation, m",                                 "grib"),
+    "lspx" : ("m/s",  "DELTA Large-scale precipitation, m/s",                         "grib"),
+    "sp"   : ("Pa",   "Surface pressure, Pa",                                         "grib"),
+    "tcc"  : ("0-1",  "Total cloud cover, 0-1",                                       "grib"),
+    "vis"  : ("m",    "Visibility, m",                                                "grib"),
+    "tp"   : ("m",    "Total precipitation",                                          "grib"),
+    "tpx"  : ("m/s",  "DELTA @ Total precipitation",                                  "grib"),
+    "c1"   : ("0-1",  "Low cloud cover, 0-1",                                         "grib"),
+    "c2"   : ("0-1",  "Medium cloud cover, 0-1",                                      "grib"),
+    "c3"   : ("0-1",  "High cloud cover, 0-1",                                        "grib"),
+    "ws"   : ("m/s",  "10 metre wind component speed, m/s",                           "calc"),
+    "wd"   : ("deg",  "10 metre wind angle",                                          "calc"),
+    "wx"   : ("m/s",  "Interpolated 10 metre U wind component, m/s",                  "calc"),
+    "wy"   : ("m/s",  "Interpolated 10 metre V wind component, m/s",                  "calc"),
+}
+GRIBSOURCEFIELDS = [fn for fn in GRIBFIELDS if GRIBFIELDS[fn][2] == "grib"] # In the order returned by ecmwf.get_ecmwf_FVCOMdata
+GRIBOTHERS = ["timeBounds","latBounds","lonBounds","timesteps","lat","lon","x","y","mjd"] # Non-field values available through getField
 
 class GRIBData:
     def __init__(self):
@@ -25,92 +57,33 @@ class GRIBData:
         self.x_unit     = "m"
         self.y          = np.zeros((0,0),dtype=float) # Coordinate index order: lat,lon
         self.y_unit     = "m"
-        self.mslp       = np.zeros((0,0,0),dtype=float) # Mean sea level pressure, Pa
-        self.mslp_unit  = "Pa"
-        self.u10        = np.zeros((0,0,0),dtype=float) # 10 metre U wind component, m/s
-        self.u10_unit   = "m/s"
-        self.v10        = np.zeros((0,0,0),dtype=float) # 10 metre V wind component, m/s
-        self.v10_unit   = "m/s"
-        self.dpt2       = np.zeros((0,0,0),dtype=float) # 2 metre dewpoint temperature, °C/C (GRIB: K)
-        self.dpt2_unit  = "°C"
-        self.t2         = np.zeros((0,0,0),dtype=float) # 2 metre temperature, °C/C (GRIB: K)
-        self.t2_unit    = "°C"
-        self.cdr        = np.zeros((0,0,0),dtype=float)  # Clear-sky direct solar radiation at surface, J m**-2
-        self.cdr_unit   = "J/m2"
-        self.cdrx       = np.zeros((0,0,0),dtype=float) # Clear-sky direct solar radiation at surface, W m**-2
-        self.cdrx_unit  = "W/m2"
-        self.cbh        = np.zeros((0,0,0),dtype=float)  # Cloud base height
-        self.cbh_unit   = "m"
-        self.cp         = np.zeros((0,0,0),dtype=float)   # Convective precipitation, m
-        self.cp_unit    = "m"
-        self.lsp        = np.zeros((0,0,0),dtype=float)  # Large-scale precipitation, m
-        self.lsp_unit   = "m"
-        self.lspx       = np.zeros((0,0,0),dtype=float)  # DELTA Large-scale precipitation, m/s
-        self.lspx_unit  = "m/s"
-        self.sp         = np.zeros((0,0,0),dtype=float)   # Surface pressure, Pa
-        self.sp_unit    = "Pa"
-        self.tcc        = np.zeros((0,0,0),dtype=float)  # Total cloud cover, 0-1
-        self.tcc_unit   = "0-1"
-        self.vis        = np.zeros((0,0,0),dtype=float)  # Visibility, m
-        self.vis_unit   = "m"
-        self.tp         = np.zeros((0,0,0),dtype=float) # Total precipitation
-        self.tp_unit    = "m"
-        self.tpx        = np.zeros((0,0,0),dtype=float) # DELTA @ Total precipitation
-        self.tpx_unit   = "m/s"
-        self.c1         = np.zeros((0,0,0),dtype=float) # Low cloud cover, 0-1
-        self.c1_unit    = "0-1"
-        self.c2         = np.zeros((0,0,0),dtype=float) # Medium cloud cover, 0-1
-        self.c2_unit    = "0-1"
-        self.c3         = np.zeros((0,0,0),dtype=float) # High cloud cover, 0-1
-        self.c3_unit    = "0-1"
-
+        #
+        # Fields (see GRIBFIELDS)
+        for fn in GRIBFIELDS:
+            setattr(self,fn,np.zeros((0,0,0),dtype=float))
+            setattr(self,fn+"_unit",GRIBFIELDS[fn][0])
+        # for END
+        self.fieldBuffers = {} # fn -> (lat,lon,capacity) array backing the field while it grows (see appendFieldStep)
+        #
         # Calculated values
         self.mjd        = np.zeros((0),dtype=float)
         self.mjd_unit   = "MJD"
-        self.ws         = np.zeros((0,0,0),dtype=float) # 10 metre wind component speed, m/s
-        self.ws_unit    = "m/s"
-        self.wd         = np.zeros((0,0,0),dtype=float) # 10 metre wind angle
-        self.wd_unit    = "deg"
-        self.wx         = np.zeros((0,0,0),dtype=float) # Interpolated 10 metre U wind component, m/s
-        self.wx_unit    = "m/s"
-        self.wy         = np.zeros((0,0,0),dtype=float) # Interpolated 10 metre V wind component, m/s
-        self.wy_unit    = "m/s"
-        # Units
 
     #
     #======================================================================
     ##
-    def loadData(self,time1, time2, lat1, lat2, lon1, lon2):
+    def loadData(self,time1, time2, lat1, lat2, lon1, lon2, useStore=True):
         #fromDateTime=u.MJD2datetime(T0)
         #toDateTime=u.MJD2datetime(T9)
         timeBounds = [time1, time2]
         latBounds  = [lat1, lat2]
         lonBounds  = [lon1, lon2]
-        (self.timesteps,
-         self.lat,
-         self.lon,
-         self.x,
-         self.y,
-         self.mslp, # Mean sea level pressure, Pa
-         self.u10,  # 10 metre U wind component, m/s
-         self.v10,  # 10 metre V wind component, m/s
-         self.dpt2, # 2 metre dewpoint temperature, °C/C (GRIB: K)
-         self.t2,   # 2 metre temperature, °C/C (GRIB: K)
-         self.cdr,  # Clear-sky direct solar radiation at surface, J m**-2
-         self.cdrx, # Clear-sky direct solar radiation at surface, W m**-2
-         self.cbh,  # Cloud base height
-         self.cp,   # Convective precipitation, m
-         self.lsp,  # Large-scale precipitation, m
-         self.lspx, # Large-scale precipitation, m/3h
-         self.sp,   # Surface pressure, Pa
-         self.tcc,  # Total cloud cover, 0-1
-         self.vis,  # Visibility, m
-         self.tp,   # Total precipitation, m H2O
-         self.tpx,  # Precipitation, m/3h H20
-         self.c1,   # Low cloud cover, 0-1
-         self.c2,   # Medium cloud cover, 0-1
-         self.c3    # High cloud cover, 0-1
-         ) = ecmwf.get_ecmwf_FVCOMdata(time1, time2, lat1, lat2, lon1, lon2)
+        res = ecmwf.get_ecmwf_FVCOMdata(time1, time2, lat1, lat2, lon1, lon2, ecmwf.GRIBNPROC, useStore) # Decoded sub-areas are read from the GRIB store (memory mapped) if available
+        (self.timesteps, self.lat, self.lon, self.x, self.y) = res[:5]
+        for fn, f in zip(GRIBSOURCEFIELDS, res[5:]): # mslp, u10, v10, dpt2, t2, cdr, cdrx, cbh, cp, lsp, lspx, sp, tcc, vis, tp, tpx, c1, c2, c3
+            setattr(self,fn,f)
+            self.fieldBuffers.pop(fn,None)
+        # for END
         #
         # Calculating MJD
         tmp_mjd = []
@@ -181,16 +154,52 @@ class GRIBData:
     #======================================================================
     #
     def appendwd(self, wdval):
-        self.wd=np.dstack((self.wd,wdval))
+        self.appendFieldStep("wd",wdval)
     #
     #======================================================================
     #
     def appendws(self, wsval):
-        self.ws=np.dstack((self.ws,wsval))
+        self.appendFieldStep("ws",wsval)
     #
     def appendEntry(self, entryArray,entryVal):
         return np.dstack((entryArray,entryVal))
     #
+    #======================================================================
+    # appendFieldStep
+    # Appends one time step (lat,lon) to field fn. The field is a view into a buffer with spare
+    # time steps (fieldBuffers), so appending does not reallocate the field on every step.
+    #
+    def appendFieldStep(self, fn, val):
+        f = getattr(self,fn)
+        n = f.shape[2]
+        buf = self.fieldBuffers.get(fn)
+        if (buf is None or f.base is not buf or buf.shape[2] <= n or not np.shares_memory(f,buf)):
+            buf = np.empty((f.shape[0],f.shape[1],n+max(n,APPENDRESERVE)),dtype=np.result_type(f,val))
+            buf[:,:,:n] = f
+            self.fieldBuffers[fn] = buf
+        # if END
+        buf[:,:,n] = val
+        setattr(self,fn,buf[:,:,:n+1])
+    # def END
+    #
+    #======================================================================
+    # getFieldList
+    # Registered fields selected by fieldList (an empty list selects all) that hold one value per
+    # time step, in registry order. Fields that are not loaded/calculated are left out.
+    #
+    def getFieldList(self,fieldList,exclude=[]):
+        res = []
+        for fn in GRIBFIELDS:
+            if ((fn in fieldList or []==fieldList) and not fn in exclude):
+                f = getattr(self,fn)
+                if (len(f.shape) == 3 and f.shape[2] == self.getMJDLen() and f.size > 0):
+                    res.append(fn)
+                # if END
+            # if END
+        # for END
+        return res
+    # def END
+    #
     #
     #======================================================================
     #
@@ -218,138 +227,15 @@ class GRIBData:
 
         print("Checking if additional time is needed...")
         if (self.mjd[endIndex] <= (T9+TEPSILON) ):
+            fns = self.getFieldList(fieldList,["wx","wy"])
             # MJD
             self.appendmjd(T9+TEXTRA)
             #
-            if "mslp" in fieldList or []==fieldList:
-                field="mslp"
-                print("BEFORE Shape of {} :  {}".format(field,self.mslp.shape))
-                self.mslp=self.appendEntry(self.mslp,self.mslp[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.mslp.shape))
-            # if END
-            if "u10" in fieldList or []==fieldList:
-                field="u10"
-                print("BEFORE Shape of {} :  {}".format(field,self.u10.shape))
-                self.u10=self.appendEntry(self.u10,self.u10[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.u10.shape))
-            # if END
-            if "v10" in fieldList or []==fieldList:
-                field="v10"
-                print("BEFORE Shape of {} :  {}".format(field,self.v10.shape))
-                self.v10=self.appendEntry(self.v10,self.v10[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.v10.shape))
-            # if END
-            if "dpt2" in fieldList or []==fieldList:
-                field="dpt2"
-                print("BEFORE Shape of {} :  {}".format(field,self.dpt2.shape))
-                self.dpt2=self.appendEntry(self.dpt2,self.dpt2[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.dpt2.shape))
-            # if END
-            if "t2" in fieldList or []==fieldList:
-                field="t2"
-                print("BEFORE Shape of {} :  {}".format(field,self.t2.shape))
-                self.t2=self.appendEntry(self.t2,self.t2[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.t2.shape))
-            # if END
-            if "cdr" in fieldList or []==fieldList:
-                field="cdr"
-                print("BEFORE Shape of {} :  {}".format(field,self.cdr.shape))
-                self.cdr=self.appendEntry(self.cdr,self.cdr[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.cdr.shape))
-            # if END
-            if "cdrx" in fieldList or []==fieldList:
-                field="cdrx"
-                print("BEFORE Shape of {} :  {}".format(field,self.cdrx.shape))
-                self.cdrx=self.appendEntry(self.cdrx,self.cdrx[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.cdrx.shape))
-            # if END
-            if "cbh" in fieldList or []==fieldList:
-                field="cbh"
-                print("BEFORE Shape of {} :  {}".format(field,self.cbh.shape))
-                self.cbh=self.appendEntry(self.cbh,self.cbh[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.cbh.shape))
-            # if END
-
-            if "cp" in fieldList or []==fieldList:
-                field="cp"
-                print("BEFORE Shape of {} :  {}".format(field,self.cp.shape))
-                self.cp=self.appendEntry(self.cp,self.cp[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.cp.shape))
-            # if END
-            if "lsp" in fieldList or []==fieldList:
-                field="lsp"
-                print("BEFORE Shape of {} :  {}".format(field,self.lsp.shape))
-                self.lsp=self.appendEntry(self.lsp,self.lsp[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.lsp.shape))
-            # if END
-            if "lspx" in fieldList or []==fieldList:
-                field="lspx"
-                print("BEFORE Shape of {} :  {}".format(field,self.lspx.shape))
-                self.lspx=self.appendEntry(self.lspx,self.lspx[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.lspx.shape))
-            # if END
-            if "sp" in fieldList or []==fieldList:
-                field="sp"
-                print("BEFORE Shape of {} :  {}".format(field,self.sp.shape))
-                self.sp=self.appendEntry(self.sp,self.sp[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.sp.shape))
-            # if END
-            if "tcc" in fieldList or []==fieldList:
-                field="tcc"
-                print("BEFORE Shape of {} :  {}".format(field,self.tcc.shape))
-                self.tcc=self.appendEntry(self.tcc,self.tcc[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.tcc.shape))
-            # if END
-            if "vis" in fieldList or []==fieldList:
-                field="vis"
-                print("BEFORE Shape of {} :  {}".format(field,self.vis.shape))
-                self.vis=self.appendEntry(self.vis,self.vis[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.vis.shape))
-            # if END
-            if "tp" in fieldList or []==fieldList:
-                field="tp"
-                print("BEFORE Shape of {} :  {}".format(field,self.tp.shape))
-                self.tp=self.appendEntry(self.tp,self.tp[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.tp.shape))
-            # if END
-            if "tpx" in fieldList or []==fieldList:
-                field="tpx"
-                print("BEFORE Shape of {} :  {}".format(field,self.tpx.shape))
-                self.tpx=self.appendEntry(self.tpx,self.tpx[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.tpx.shape))
-            # if END
-            if "c1" in fieldList or []==fieldList:
-                field="c1"
-                print("BEFORE Shape of {} :  {}".format(field,self.c1.shape))
-                self.c1=self.appendEntry(self.c1,self.c1[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.c1.shape))
-            # if END
-            if "c2" in fieldList or []==fieldList:
-                field="c2"
-                print("BEFORE Shape of {} :  {}".format(field,self.c2.shape))
-                self.c2=self.appendEntry(self.c2,self.c2[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.c2.shape))
-            # if END
-            if "c3" in fieldList or []==fieldList:
-                field="c3"
-                print("BEFORE Shape of {} :  {}".format(field,self.c3.shape))
-                self.c3=self.appendEntry(self.c3,self.c3[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.c3.shape))
-            # if END
-            #
-            # Conversion fields - Calculated: WS, WD, (WX, WY)
-            if "ws" in fieldList or []==fieldList:
-                field = "ws"
-                print("BEFORE Shape of {} :  {}".format(field,self.ws.shape))
-                self.ws=self.appendEntry(self.ws,self.ws[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.ws.shape))
-            # if END
-            if "wd" in fieldList or []==fieldList:
-                field="wd"
-                print("BEFORE Shape of {} :  {}".format(field,self.wd.shape))
-                self.wd=self.appendEntry(self.wd,self.wd[:,:,endIndex])
-                print("AFTER  Shape of {} :  {}".format(field,self.wd.shape))
-            # if END
+            for field in fns:
+                print("BEFORE Shape of {} :  {}".format(field,getattr(self,field).shape))
+                self.appendFieldStep(field,getattr(self,field)[:,:,endIndex])
+                print("AFTER  Shape of {} :  {}".format(field,getattr(self,field).shape))
+            # for END
             print("Added new end record {} with MJD: {}.".format(fieldList,self.mjd[endIndex]))
             print("Extra End MJD:   {}".format(self.mjd[endIndex]))
             endIndex = endIndex + 1
@@ -359,155 +245,72 @@ class GRIBData:
     #
     #
     #======================================================================
+    # calcRampWeights
+    # Time interpolation (per default: hourly steps), computed once for all fields.
+    # Output step k lies in source interval rampIndex[k] (between mjd[i] and mjd[i+1]), at step rampStep[k]
+    # of rampSteps[k] steps, i.e. value = f[i] + (f[i+1]-f[i])/rampSteps[k]*rampStep[k]
+    # (identical to u.ramp3D + u.ramps3DJoin). Returns the output MJD array.
     #
-    def  createRamps(self,fieldList,timestepsperday,kind="polar"):
-        mjdl = [] # Time Series List
+    def calcRampWeights(self,timestepsperday):
+        n = self.getMJDLen()
+        if (n < 2):
+            print("ERROR: At least 2 time steps are needed to create ramps (found {}).".format(n))
+            self.rampIndex = np.zeros((n),dtype=int)
+            self.rampStep = np.zeros((n),dtype=int)
+            self.rampSteps = np.ones((n),dtype=int)
+            return np.copy(self.mjd)
+        # if END
+        nsteps = np.maximum(1,np.round((self.mjd[1:] - self.mjd[:-1])*timestepsperday).astype(int)) # Since MJD is in units of days
+        for i in range(n-1):
+            print("From {:9.3f} to {:9.3f} in {} steps (d={:5.4f})".format(self.mjd[i],self.mjd[i+1],nsteps[i],(self.mjd[i+1]-self.mjd[i])/nsteps[i] ))
+        # for END
         #
-        u10l   = [] # U-Wind
-        v10l   = [] # V-Wind
-        mslpl = [] # Mean sea level pressure List
-        dpt2l = [] # # 2 metre dewpoint temperature, °C/C (GRIB: K)
-        t2l   = [] # 2 metre temperature, °C/C (GRIB: K)
-        cdrl  = [] # Temperature List
-        cdrxl = [] # Temperature List
-        cbhl   = []
-        cpl   = []
-        lspl   = []
-        lspxl   = []
-        spl   = []
-        tccl   = []
-        visl   = []
-        tpl   = [] # Temperature List
-        tpxl  = [] # Temperature List
-        c1l   = []
-        c2l   = []
-        c3l   = []
-
-
-        wsl = [] # Wind Speed List
-        wdl = [] # Wind Direction List
-        wsx = []
-        wsy = []
-
-
-
+        # Each interval contributes steps 0..nsteps-1; the last interval also its end point (step nsteps)
+        self.rampIndex = np.append(np.repeat(np.arange(n-1),nsteps),n-2)
+        start = np.cumsum(nsteps) - nsteps
+        self.rampStep = np.append(np.arange(np.sum(nsteps)) - np.repeat(start,nsteps),nsteps[-1])
+        self.rampSteps = nsteps[self.rampIndex]
+        return self.rampValues(self.mjd,0,len(self.rampIndex),axis=0)
+    # def END
+    #
+    #======================================================================
+    # rampValues
+    # Interpolated values of field f (time along axis) for output steps k0..k1-1 (see calcRampWeights).
+    #
+    def rampValues(self,f,k0,k1,axis=2):
+        i = self.rampIndex[k0:k1]
+        begin = np.take(f,i,axis=axis)
+        end = np.take(f,i+1,axis=axis)
+        shape = [1]*begin.ndim
+        shape[axis] = k1-k0
+        delta = np.divide(np.subtract(end,begin),self.rampSteps[k0:k1].reshape(shape))
+        return np.add(begin,np.multiply(delta,self.rampStep[k0:k1].reshape(shape)))
+    # def END
+    #
+    #======================================================================
+    # getRampFieldList
+    # Fields ramped by createRamps (see getFieldList). An empty fieldList means all fields.
+    #
+    def getRampFieldList(self,fieldList,kind="polar"):
+        exclude = ["wx","wy"] if (kind == "polar") else ["ws","wd"]
+        res = self.getFieldList(fieldList,exclude)
+        for fn in fieldList:
+            if (not fn in res and not fn in exclude):
+                print("WARNING: Field [{}] has shape {} and {} time steps are expected. Not ramped.".format(fn,np.shape(self.getField(fn)),self.getMJDLen()))
+            # if END
+        # for END
+        return res
+    # def END
+    #
+    #======================================================================
+    #
+    def  createRamps(self,fieldList,timestepsperday,kind="polar",blocksize=RAMPBLOCKSIZE):
         #
         # Creating ramps
         print("Creating ramps ...")
-        for i in range(self.getMJDLen()-1):
-            # STEPS
-            nsteps = max(1,int(round((self.mjd[i+1] - self.mjd[i])*timestepsperday,0))) # Since MJD is in units of days, and we want
-            npoints=nsteps+1
-            print("From {:9.3f} to {:9.3f} in {} steps (d={:5.4f})".format(self.mjd[i],self.mjd[i+1],nsteps,(self.mjd[i+1]-self.mjd[i])/nsteps ))
-            #
-            # TIME
-            tmp_mjd = u.ramp1D(self.mjd[i],self.mjd[i+1],npoints)
-            mjdl.append(tmp_mjd)
-            #
-            #
-            # MSLP
-            if "mslp" in fieldList or []==fieldList:
-                tmp_mslp = u.ramp3D(self.mslp[:,:,i],self.mslp[:,:,i+1],npoints)
-                mslpl.append(tmp_mslp)
-                #print("mslp")
-            # U10
-            if "u10" in fieldList or []==fieldList:
-                tmp_u10 = u.ramp3D(self.u10[:,:,i],self.u10[:,:,i+1],npoints)
-                u10l.append(tmp_u10)
-                #print("u10")
-            # V-Wind Speed
-            if "v10" in fieldList or []==fieldList:
-                tmp_v10 = u.ramp3D(self.v10[:,:,i],self.v10[:,:,i+1],npoints)
-                v10l.append(tmp_v10)
-            # DPT2
-            if "dpt2" in fieldList or []==fieldList:
-                #print("DPT2: {}".format(self.dpt2.shape))
-                tmp_dpt2 = u.ramp3D(self.dpt2[:,:,i],self.dpt2[:,:,i+1],npoints)
-                dpt2l.append(tmp_dpt2)
-            # T2
-            if "t2" in fieldList or []==fieldList:
-                #print("T2: {}".format(self.t2.shape))
-                tmp_t2 = u.ramp3D(self.t2[:,:,i],self.t2[:,:,i+1],npoints)
-                t2l.append(tmp_t2)
-                #print("t2 {}".format(len(t2l)))
-            # CDR
-            if "cdr" in fieldList or []==fieldList:
-                tmp_cdr = u.ramp3D(self.cdr[:,:,i],self.cdr[:,:,i+1],npoints)
-                cdrl.append(tmp_cdr)
-            # CDRX
-            if "cdrx" in fieldList or []==fieldList:
-                tmp_cdrx = u.ramp3D(self.cdrx[:,:,i],self.cdrx[:,:,i+1],npoints)
-                cdrxl.append(tmp_cdrx)
-            # CBH
-            if "cbh" in fieldList or []==fieldList:
-                #print("CBH: {}".format(self.cbh.shape))
-                tmp_cbh = u.ramp3D(self.cbh[:,:,i],self.cbh[:,:,i+1],npoints)
-                cbhl.append(tmp_cbh)
-                #print("...")
-            # CP
-            if "cp" in fieldList or []==fieldList:
-                tmp_cp = u.ramp3D(self.cp[:,:,i],self.cp[:,:,i+1],npoints)
-                cpl.append(tmp_cp)
-            # LSP
-            if "lsp" in fieldList or []==fieldList:
-                tmp_lsp = u.ramp3D(self.lsp[:,:,i],self.lsp[:,:,i+1],npoints)
-                lspl.append(tmp_lsp)
-            # LSPX
-            if "lspx" in fieldList or []==fieldList:
-                tmp_lspx = u.ramp3D(self.lspx[:,:,i],self.lspx[:,:,i+1],npoints)
-                lspxl.append(tmp_lspx)
-            # SP
-            if "sp" in fieldList or []==fieldList:
-                tmp_sp = u.ramp3D(self.sp[:,:,i],self.sp[:,:,i+1],npoints)
-                spl.append(tmp_sp)
-            # TCC
-            if "tcc" in fieldList or []==fieldList:
-                tmp_tcc = u.ramp3D(self.tcc[:,:,i],self.tcc[:,:,i+1],npoints)
-                tccl.append(tmp_tcc)
-            # VIS
-            if "vis" in fieldList or []==fieldList:
-                tmp_vis = u.ramp3D(self.vis[:,:,i],self.vis[:,:,i+1],npoints)
-                visl.append(tmp_vis)
-            # TP
-            if "tp" in fieldList or []==fieldList:
-                tmp_tp = u.ramp3D(self.tp[:,:,i],self.tp[:,:,i+1],npoints)
-                tpl.append(tmp_tp)
-            # TPX
-            if "tpx" in fieldList or []==fieldList:
-                tmp_tpx = u.ramp3D(self.tpx[:,:,i],self.tpx[:,:,i+1],npoints)
-                tpxl.append(tmp_tpx)
-            # C1
-            if "c1" in fieldList or []==fieldList:
-                tmp_c1 = u.ramp3D(self.c1[:,:,i],self.c1[:,:,i+1],npoints)
-                c1l.append(tmp_c1)
-            # C2
-            if "c2" in fieldList or []==fieldList:
-                tmp_c2 = u.ramp3D(self.c2[:,:,i],self.c2[:,:,i+1],npoints)
-                c2l.append(tmp_c2)
-            # C3
-            if "c3" in fieldList or []==fieldList:
-                tmp_c3 = u.ramp3D(self.c3[:,:,i],self.c3[:,:,i+1],npoints)
-                c3l.append(tmp_c3)
-
-
-            #
-            # Wind Speed
-            if "ws" in fieldList or []==fieldList:
-                tmp_ws = u.ramp3D(self.ws[:,:,i],self.ws[:,:,i+1],npoints)
-                wsl.append(tmp_ws)
-            #
-            # Wind Direction
-            if "wd" in fieldList or []==fieldList:
-                tmp_wd = u.ramp3D(self.wd[:,:,i],self.wd[:,:,i+1],npoints)
-                wdl.append(tmp_wd)
-            #
-
-
-        # for END
+        mjd = self.calcRampWeights(timestepsperday)
         #
-        # === Converting to NumPy
         print("Creating new GRIBData object ...")
-
         gdr = GRIBData() # GRIB data format with Ramp data
         gdr.lat = np.copy(self.lat)
         gdr.lon = np.copy(self.lon)
@@ -515,131 +318,42 @@ class GRIBData:
         gdr.y = np.copy(self.y)
         #
         # Time
-        gdr.mjd = u.ramps1DJoin(mjdl) # Calculated
-        #
-        if "mslp" in fieldList or []==fieldList:
-            gdr.mslp = u.ramps3DJoin(mslpl)
-        #if END
-        #
-        if "u10" in fieldList or []==fieldList:
-            gdr.u10 = u.ramps3DJoin(u10l)
-        # if END
-        #
-        if "v10" in fieldList or []==fieldList:
-            gdr.v10 = u.ramps3DJoin(v10l)
-        # if END
-        #
-        if "dpt2" in fieldList or []==fieldList:
-            gdr.dpt2 = u.ramps3DJoin(dpt2l)
-        # if END
-        #
-        if "t2" in fieldList or []==fieldList:
-            gdr.t2 = u.ramps3DJoin(t2l)
-        # if END
-        #
-        if "cdr" in fieldList or []==fieldList:
-            gdr.cdr = u.ramps3DJoin(cdrl)
-        # if END
-        #
-        if "cdrx" in fieldList or []==fieldList:
-            gdr.cdrx = u.ramps3DJoin(cdrxl)
-        # if END
-        #
-        if "chb" in fieldList or []==fieldList:
-            gdr.cbh = u.ramps3DJoin(cbhl)
-        # if END
-        #
-        if "cp" in fieldList or []==fieldList:
-            gdr.cp = u.ramps3DJoin(cpl)
-        # if END
-        #
-        if "lsp" in fieldList or []==fieldList:
-            gdr.lsp = u.ramps3DJoin(lspl)
-        # if END
-        #
-        if "lspx" in fieldList or []==fieldList:
-            gdr.lspx = u.ramps3DJoin(lspxl)
-        # if END
-        #
-        if "sp" in fieldList or []==fieldList:
-            gdr.sp = u.ramps3DJoin(spl)
-        # if END
-        #
-        if "tcc" in fieldList or []==fieldList:
-            gdr.tcc = u.ramps3DJoin(tccl)
-        # if END
-        #
-        if "vis" in fieldList or []==fieldList:
-            gdr.vis = u.ramps3DJoin(visl)
-        # if END
-        #
-        if "tp" in fieldList or []==fieldList:
-            gdr.tp = u.ramps3DJoin(tpl)
-        # if END
-        #
-        if "tpx" in fieldList or []==fieldList:
-            gdr.tpx = u.ramps3DJoin(tpxl)
-        # if END
-        #
-        if "c1" in fieldList or []==fieldList:
-            gdr.c1 = u.ramps3DJoin(c1l)
-        # if END
-        #
-        if "c2" in fieldList or []==fieldList:
-            gdr.c2 = u.ramps3DJoin(c2l)
-        # if END
-        #
-        if "c3" in fieldList or []==fieldList:
-            gdr.c3 = u.ramps3DJoin(c3l)
-        # if END
-        #
-        if (kind == "polar"):
-            gdr.ws = u.ramps3DJoin(wsl)
-            gdr.wd = u.ramps3DJoin(wdl)
-        else :
-            gdr.wx = u.ramps3DJoin(wxl)
-            gdr.wy = u.ramps3DJoin(wyl)
-        # if END
-        #
+        gdr.mjd = mjd # Calculated
+        #
+        # Fields are written block by block into the output arrays (no intermediate per-interval copies)
+        fns = self.getRampFieldList(fieldList,kind)
+        for fn in fns:
+            f = self.getField(fn)
+            setattr(gdr,fn,np.zeros((f.shape[0],f.shape[1],len(mjd)),float))
+            setattr(gdr,fn+"_unit",self.getFieldUnit(fn))
+        # for END
+        for k0 in range(0,len(mjd),max(1,blocksize)):
+            k1 = min(len(mjd),k0+max(1,blocksize))
+            for fn in fns:
+                getattr(gdr,fn)[:,:,k0:k1] = self.rampValues(self.getField(fn),k0,k1)
+            # for END
+        # for END
 
         return gdr
     #
     #======================================================================
     #
-    def exportForcingData(self, stepStart, stepEnd):
+    def exportForcingData(self, stepStart, stepEnd, fieldList=[]):
         gdx = GRIBData()
         #gdx.timeBounds  = self.timeBounds
         gdx.latBounds   = np.copy(self.latBounds)
         gdx.lonBounds   = np.copy(self.lonBounds)
         gdx.timesteps   = np.copy(self.timeBounds)
-        gdx.mjd         = np.copy(self.mjd)
         gdx.lat         = np.copy(self.lat)
         gdx.lon         = np.copy(self.lon)
         gdx.x           = np.copy(self.x)
         gdx.y           = np.copy(self.y)
-        gdx.mslp        = self.mslp[:,:,stepStart:stepEnd+1]
-        gdx.u10         = self.u10[:,:,stepStart:stepEnd+1]
-        gdx.v10         = self.v10[:,:,stepStart:stepEnd+1]
-        gdx.dpt2        = self.dpt2[:,:,stepStart:stepEnd+1]
-        gdx.t2          = self.t2[:,:,stepStart:stepEnd+1]
-        gdx.cdr         = self.cdr[:,:,stepStart:stepEnd+1]
-        gdx.cdrx        = self.cdrx[:,:,stepStart:stepEnd+1]
-        gdx.cbh         = self.cbh[:,:,stepStart:stepEnd+1]
-        gdx.cp          = self.cp[:,:,stepStart:stepEnd+1]
-        gdx.lsp         = self.lsp[:,:,stepStart:stepEnd+1]
-        gdx.lspx        = self.lspx[:,:,stepStart:stepEnd+1]
-        gdx.sp          = self.sp[:,:,stepStart:stepEnd+1]
-        gdx.tcc         = self.tcc[:,:,stepStart:stepEnd+1]
-        gdx.vis         = self.vis[:,:,stepStart:stepEnd+1]
-        gdx.tp          = self.tp[:,:,stepStart:stepEnd+1]
-        gdx.tpx         = self.tpx[:,:,stepStart:stepEnd+1]
-        gdx.c1          = self.c1[:,:,stepStart:stepEnd+1]
-        gdx.c2          = self.c2[:,:,stepStart:stepEnd+1]
-        gdx.c3          = self.c3[:,:,stepStart:stepEnd+1]
+        for fn in self.getFieldList(fieldList,["wx","wy"]):
+            setattr(gdx,fn,getattr(self,fn)[:,:,stepStart:stepEnd+1])
+            setattr(gdx,fn+"_unit",getattr(self,fn+"_unit"))
+        # for END
         #Calculated
         gdx.mjd         = self.mjd[stepStart:stepEnd+1]
-        gdx.ws          = self.ws[:,:,stepStart:stepEnd+1]
-        gdx.wd          = self.wd[:,:,stepStart:stepEnd+1]
         return gdx
     #
     #======================================================================
@@ -666,83 +380,19 @@ class GRIBData:
 #==================================================================================================================================
 #
     def getField(self, fn):
-        # Dictionary mapping field names to their respective unit attributes
-        fields = {
-            "timeBounds"    : self.timeBounds,
-            "latBounds"     : self.latBounds,
-            "lonBounds"     : self.lonBounds,
-            "timesteps"     : self.timesteps,
-            "lat"           : self.lat,
-            "lon"           : self.lon,
-            "x"             : self.x,
-            "y"             : self.y,
-            "mslp"          : self.mslp,
-            "u10"           : self.u10,
-            "v10"           : self.v10,
-            "dpt2"          : self.dpt2,
-            "t2"            : self.t2,
-            "cdr"           : self.cdr,
-            "cdrx"          : self.cdrx,
-            "cbh"           : self.cbh,
-            "cp"            : self.cp,
-            "lsp"           : self.lsp,
-            "lspx"          : self.lspx,
-            "sp"            : self.sp,
-            "tcc"           : self.tcc,
-            "vis"           : self.vis,
-            "tp"            : self.tp,
-            "tpx"           : self.tpx,
-            "c1"            : self.c1,
-            "c2"            : self.c2,
-            "c3"            : self.c3,
-            "mjd"           : self.mjd,
-            "ws"            : self.ws,
-            "wd"            : self.wd,
-            "wx"            : self.wx,
-            "wy"            : self.wy
-        }
-        return fields.get(fn, None)
+        if (fn in GRIBFIELDS or fn in GRIBOTHERS):
+            return getattr(self,fn)
+        # if END
+        return None
     # def END
 #==================================================================================================================================
 #==================================================================================================================================
 #
     def getFieldUnit(self, fn):
-        # Dictionary mapping field names to their respective unit attributes
-        field_units = {
-            "timeBounds": self.timeBounds_unit,
-            "latBounds": self.latBounds_unit,
-            "lonBounds": self.lonBounds_unit,
-            "timesteps": self.timesteps_unit,
-            "lat": self.lat_unit,
-            "lon": self.lon_unit,
-            "x": self.x_unit,
-            "y": self.y_unit,
-            "mslp": self.mslp_unit,
-            "u10": self.u10_unit,
-            "v10": self.v10_unit,
-            "dpt2": self.dpt2_unit,
-            "t2": self.t2_unit,
-            "cdr": self.cdr_unit,
-            "cdrx": self.cdrx_unit,
-            "cbh": self.cbh_unit,
-            "cp": self.cp_unit,
-            "lsp": self.lsp_unit,
-            "lspx": self.lspx_unit,
-            "sp": self.sp_unit,
-            "tcc": self.tcc_unit,
-            "vis": self.vis_unit,
-            "tp": self.tp_unit,
-            "tpx": self.tpx_unit,
-            "c1": self.c1_unit,
-            "c2": self.c2_unit,
-            "c3": self.c3_unit,
-            "mjd": self.mjd_unit,
-            "ws": self.ws_unit,
-            "wd": self.wd_unit,
-            "wx": self.wx_unit,
-            "wy": self.wy_unit
-        }
-        return field_units.get(fn, None)
+        if (fn in GRIBFIELDS or fn in GRIBOTHERS):
+            return getattr(self,fn+"_unit")
+        # if END
+        return None
     # def END
 #
 #==================================================================================================================================
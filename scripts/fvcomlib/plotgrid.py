@@ -19,10 +19,14 @@ import array as arr # importing "array" for array creations
 import fvcomlibio as io
 import fvcomlibutil as u
 from fvcomgrid import FVCOMGrid
-from fvcomdata import FVCOMData
+from fvcomdata import FVCOMData, DERIVEDFIELDS
 import sys
 import matplotlib
+import matplotlib.tri as mtri
 import numpy as np
+import io as pyio
+import subprocess
+import multiprocessing
 
 
 #========CONSTANTS - DO NOT CHANGE==============================================
@@ -57,6 +61,11 @@ y0 = -1
 y1 = -1
 title = -1
 lagdatafile = "lag_out.nc"
+NProc = 0        # Number of render workers. 0: one per CPU, 1: serial.
+FFmpegPipe = 0   # 1: Stream the frames to ffmpeg stdin instead of writing PNG files.
+PlotAnimate = 1  # 1: Keep figure, mesh and colorbar between frames, only update the data.
+BuildStats = 1   # 1: Build the statistics (bounds, percentiles) of the plotted variable into the sidecar, if not already there. The full sidecar is built by buildstats.py.
+BoundsMode = "global" # Colour bounds: "global", "layer" (of the plotted siglay) or "percentile" (1-99 %).
 
 if (RunMode == "simple"):
     #===INPUT FILES===
@@ -92,6 +101,11 @@ if (RunMode == "file"):
     if ("y1" in params):              y1                = float(params["y1"])
     if ("title" in params):           title             = params["title"]
     if ("lagdatafile" in params):     lagdatafile       = params["lagdatafile"]
+    if ("nproc" in params):           NProc             = int(params["nproc"])
+    if ("ffmpegpipe" in params):      FFmpegPipe        = int(params["ffmpegpipe"])
+    if ("animate" in params):         PlotAnimate       = int(params["animate"])
+    if ("buildstats" in params):      BuildStats        = int(params["buildstats"])
+    if ("boundsmode" in params):      BoundsMode        = params["boundsmode"]
 
 
     imagefile          = "{}{}".format(imagefilemask,"-{:04}.png") # Do Not touch
@@ -105,6 +119,11 @@ if (RunMode == "file"):
     print("Image file mask (imagefilemask) : {}".format(imagefilemask))
     print("Movie file mask (moviefilemask) : {}".format(moviefilemask))
     print("Variable (var)                  : {}".format(var))
+    print("Render workers (nproc)          : {}".format(NProc))
+    print("Pipe to ffmpeg (ffmpegpipe)     : {}".format(FFmpegPipe))
+    print("Animation mode (animate)        : {}".format(PlotAnimate))
+    print("Build statistics (buildstats)   : {}".format(BuildStats))
+    print("Bounds mode (boundsmode)        : {}".format(BoundsMode))
     print("==================\nDerived parameters:")
     print("Image file       : {}".format(imagefile))
     print("MI file mask     : {}".format(movieimagefilemask))
@@ -121,28 +140,25 @@ lagdatafilefull   = datapath+"/"+lagdatafile
 if (VERBOSE):
     print("Data file     : {}".format(datafilefull))
 
-#========PROGRAM==================================================================
-d = FVCOMData()
-d.loadvars = d.getLoadVars(var)
-d.loadFile(datafilefull,False)
-d.loadLagFile(lagdatafilefull,False)
-d.getPlotData(0,0)
-d.setPlotBlocking(False)
-#d.setPlotBlocking(True)
-matplotlib.use("Agg")
-d.setPlotSize(12,12)
-# Bounds
-if ( x0 != -1 and x1 != -1):
-    d.p_xbounds = [x0, y1]
-if ( y0 != -1 and y1 != -1):
-    d.p_ybounds = [y0, y1]
-
+#========FUNCTIONS================================================================
+#
+# initWorker()::
+# Runs once in each render worker. The mesh, triangulation and bounds are
+# inherited from the parent (fork), only the nc file handles are reopened,
+# since they cannot be shared between processes.
+def initWorker():
+    d.loadFile(datafilefull,False)
+    d.loadLagFile(lagdatafilefull,False)
+# def END
 
-iSigLayer = 0
-#for i in range(0,3):
-for iTimeStep in range(d.times):
-#for i in range(94,97):
-#for i in range(50,51):
+#
+# renderFrame()::
+# Renders one time step. Returns the PNG data if the frames are piped to
+# ffmpeg, otherwise writes the PNG file and returns its filename.
+tlabel = None # Time label artist, reused in animation mode.
+def renderFrame(iTimeStep):
+    global tlabel
+    iSigLayer = 0
     print("Plotting time step no. {}".format(iTimeStep))
     d.loadPlotData(iTimeStep,iSigLayer)
     tstr = "Tíð: {} (MJD: {:9.3f})".format(u.MJD2datetime(d.time[iTimeStep]),d.time[iTimeStep])
@@ -195,6 +211,8 @@ for iTimeStep in range(d.times):
             d.setContour(d.evap,d.evap_kind,d.evap_bounds,d.evap_unit,"μm/h")
         case "dye":
             d.setContour(d.dye,d.dye_kind,d.dye_bounds,d.dye_unit,"kg/m3")
+        case _ if (var in DERIVEDFIELDS):
+            d.setContour(getattr(d,var),getattr(d,var+"_kind"),getattr(d,var+"_bounds"))
         case _:
             print("ERROR: Unknown or NON-implemented variable ({}). Check spelling or implement the new variable.\nValid options are: u, uwind, v, vwind, velocity, velocityvector, windvelocity, windvelocityvector, salinity, temp, z, zeta.".format(var))
     # match END
@@ -203,19 +221,91 @@ for iTimeStep in range(d.times):
     # X and Y limits, should be changed to using d.bounds.... TODO.
     # Plot title - Default: variable name
     if (title == -1 ):
-        title = "{:10s}".format(var)
-    d.p_plt.title(title)
+        d.p_plt.title("{:10s}".format(var))
+    else:
+        d.p_plt.title(title)
 
     #d.showColorbar()
 
     # Write extra label:
-    d.p_plt.text(d.p_plottingbounds[0]*0.99, d.p_plottingbounds[3]*1.01, tstr, fontsize = 12, horizontalalignment='left',     verticalalignment='bottom')
+    if ( d.p_animate and (tlabel != None) ):
+        tlabel.set_text(tstr)
+    else:
+        tlabel = d.p_plt.text(d.p_plottingbounds[0]*0.99, d.p_plottingbounds[3]*1.01, tstr, fontsize = 12, horizontalalignment='left',     verticalalignment='bottom')
+    # if END
 
     #d.p_plt.text(-60000, 70000, tstr, fontsize = 12)
-    os.system("mkdir -p {}".format(imagepath))
+    if (FFmpegPipe==1):
+        buf = pyio.BytesIO()
+        d.p_figure.savefig(buf, format="png")
+        return buf.getvalue()
+    # if END
     d.saveplot(imagefilefull.format(iTimeStep))
+    return imagefilefull.format(iTimeStep)
+# def END
+
+#========PROGRAM==================================================================
+d = FVCOMData()
+d.loadvars = d.getLoadVars(var)
+d.loadFile(datafilefull,False)
+d.loadLagFile(lagdatafilefull,False)
+if (BuildStats==1):
+    d.buildStats(d.getStatsKeys(d.loadvars))
+d.setPlotBoundsMode(BoundsMode)
+d.getPlotData(0,0)
+d.setPlotBlocking(False)
+#d.setPlotBlocking(True)
+matplotlib.use("Agg")
+d.setPlotSize(12,12)
+d.setPlotAnimate(PlotAnimate==1)
+# Bounds
+if ( x0 != -1 and x1 != -1):
+    d.p_xbounds = [x0, y1]
+if ( y0 != -1 and y1 != -1):
+    d.p_ybounds = [y0, y1]
+# The triangulation is built once here and shared by all frames/workers.
+d.p_triangulation = mtri.Triangulation(d.x, d.y, d.nv)
+os.system("mkdir -p {}".format(imagepath))
+
+if (NProc <= 0):
+    NProc = os.cpu_count()
+NProc = max(1, min(NProc, d.times))
 
 GenerateMPEG = True
+ffmpeg = None
+if (FFmpegPipe==1):
+    if ( VIDEOFORMAT==".mp4" ) :
+        cmd = ["ffmpeg", "-y", "-framerate", "3", "-f", "image2pipe", "-codec", "png", "-i", "-", "-vcodec", "libx264", "-crf", "22", moviefilefull]
+    else: #MOV
+        cmd = ["ffmpeg", "-y", "-framerate", "3", "-f", "image2pipe", "-codec", "png", "-i", "-", "-codec", "png", moviefilefull]
+    ffmpeg = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    GenerateMPEG = False
+# if END
+
+#for i in range(94,97):
+#for i in range(50,51):
+print("Rendering {} time steps with {} worker(s).".format(d.times,NProc))
+if (NProc == 1):
+    frames = map(renderFrame, range(d.times))
+    pool = None
+else:
+    # imap returns the frames in time step order, whichever worker finishes first.
+    pool = multiprocessing.get_context("fork").Pool(NProc, initializer=initWorker)
+    frames = pool.imap(renderFrame, range(d.times))
+# if END
+for frame in frames:
+    if (ffmpeg != None):
+        ffmpeg.stdin.write(frame)
+# for END
+if (pool != None):
+    pool.close()
+    pool.join()
+# if END
+if (ffmpeg != None):
+    ffmpeg.stdin.close()
+    ffmpeg.wait()
+# if END
+
 if (GenerateMPEG):
     if ( VIDEOFORMAT==".mp4" ) :
         cmd = "ffmpeg -y -framerate 3 -i {}/{} -codec png  -vcodec libx264 -crf 22 {}".format(imagepath,movieimagefilemask,moviefilefull) # If MPEG is desired
@@ -224,5 +314,3 @@ if (GenerateMPEG):
     os.system(cmd)
 
 #ffmpeg -i crn2024-10-27-%04d.png -codec png out.mov
-
-
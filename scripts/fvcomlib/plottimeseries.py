@@ -38,6 +38,8 @@ outbasepath       = "./"
 outcsvfile        = "out.dat"
 outpngfile        = "out.png"
 separator         = " " # columnseparator space ( ), comma (,), semicolon (;), tab (\t)
+stations          = [] # Stations as (x, y) or (lon, lat) pairs, e.g. [(-4213.8, 34138.4)]. If given, used instead of element indices.
+stationcoords     = "xy" # Coordinates of the stations: "xy" or "lonlat"
 #========AUTOMATED - DO NOT CHANGE==============================================
 indatafilefull      = inbasepath+datafile
 outcsvfilefull      = outbasepath+outcsvfile
@@ -52,7 +54,10 @@ if (VERBOSE):
     d.loadFile(indatafilefull)
     d.setPlotBlocking(False)
     d.setPlotAGG(True)
-    d.getData([152620,152621,152622],['velocity','u','v'],[0,1,2,3,4,5,6,7,8,9])
+    if (len(stations) > 0):
+        d.getStationData(stations,['velocity','u','v'],[0,1,2,3,4,5,6,7,8,9],coords=stationcoords)
+    else:
+        d.getData([152620,152621,152622],['velocity','u','v'],[0,1,2,3,4,5,6,7,8,9])
     #d.getData([152621,152622],['velocity','u','v'],[0])
     #d.getData([152621],['velocity'],[0,1,2,3])
     #d.getData([152621],['velocity'],[0])
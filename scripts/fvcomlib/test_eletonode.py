@@ -0,0 +1,88 @@
+import fvcomgrid
+import numpy as np
+import time
+
+#========================================================================
+# Test grid: a regular triangulated square, an island of three collinear nodes
+# with one zero-area (degenerate) cell, and trailing orphan nodes (the case
+# cleangridorphans.py is for).
+def makeGrid(nx, ny, orphans):
+    g = fvcomgrid.FVCOMGrid()
+    nodecount = nx * ny + 3 + orphans
+    g.setNodesLength(nodecount)
+    x, y = np.meshgrid(np.arange(nx, dtype=float), np.arange(ny, dtype=float))
+    g.nodes[:nx*ny, fvcomgrid.inX] = x.ravel()
+    g.nodes[:nx*ny, fvcomgrid.inY] = y.ravel()
+    g.nodes[nx*ny:, fvcomgrid.inX] = nx + 10.0
+    g.nodes[nx*ny:nx*ny+3, fvcomgrid.inY] = [0.0, 1.0, 2.0]
+    i, j = np.meshgrid(np.arange(nx - 1), np.arange(ny - 1))
+    n1 = (j * nx + i).ravel() + 1
+    cells = np.concatenate([np.column_stack([n1, n1 + 1, n1 + nx + 1]), np.column_stack([n1, n1 + nx + 1, n1 + nx])])
+    cells = np.concatenate([cells, [[nx*ny + 1, nx*ny + 2, nx*ny + 3]]]) # Zero area
+    g.setCellsLength(len(cells))
+    g.cells[:] = cells
+    g.clearAdjacency()
+    return g
+
+#========================================================================
+# Reference (per-node loop) implementation
+def eleToNodeAverageRef(g, values, weighted=True, fill=np.nan):
+    c = np.asarray(g.cells, dtype=int) - 1
+    x = g.nodes[:, fvcomgrid.inX]
+    y = g.nodes[:, fvcomgrid.inY]
+    area = 0.5 * np.abs((x[c[:, 1]] - x[c[:, 0]]) * (y[c[:, 2]] - y[c[:, 0]]) - (x[c[:, 2]] - x[c[:, 0]]) * (y[c[:, 1]] - y[c[:, 0]]))
+    out = np.full((g.nodecount,) + values.shape[1:], fill, dtype=float)
+    for i in range(g.nodecount):
+        e = np.flatnonzero((c == i).any(axis=1))
+        if (len(e) == 0):
+            continue
+        w = area[e] if weighted else np.ones(len(e))
+        if (np.sum(w) <= 0):
+            w = np.ones(len(e))
+        out[i] = np.tensordot(w, values[e], axes=1) / np.sum(w)
+    # for i END
+    return out
+
+#========================================================================
+# Numerical equivalence: CSR operator, no-scipy fallback and reference
+rng = np.random.default_rng(1)
+g = makeGrid(30, 20, 3)
+TN = 24
+V = rng.uniform(-5, 5, (g.cellcount, TN))
+for weighted in [True, False]:
+    ref = eleToNodeAverageRef(g, V, weighted)
+    op = g.eleToNodeAverage(V, weighted)
+    csr = fvcomgrid.csr_matrix
+    fvcomgrid.csr_matrix = None # Force the fallback
+    gf = makeGrid(30, 20, 3)
+    fb = gf.eleToNodeAverage(V, weighted)
+    fvcomgrid.csr_matrix = csr
+    print("eleToNodeAverage (weighted={}) max diff: operator {:.3e}  fallback {:.3e}  orphans {}".format(
+        weighted, np.nanmax(np.abs(op - ref)), np.nanmax(np.abs(fb - ref)), np.count_nonzero(np.isnan(fb[:, 0]))))
+    assert np.allclose(op, ref, equal_nan=True)
+    assert np.allclose(fb, ref, equal_nan=True)
+    assert np.allclose(fb, op, equal_nan=True)
+# for END
+
+# 5 nodes, cells [[1,2,4],[1,4,3]] and orphan node 5 (last real node 4 must keep both elements)
+g = fvcomgrid.FVCOMGrid()
+g.setNodesLength(5)
+g.nodes[:, fvcomgrid.inX] = [0, 1, 0, 1, 5]
+g.nodes[:, fvcomgrid.inY] = [0, 0, 1, 1, 5]
+g.setCellsLength(2)
+g.cells[:] = [[1, 2, 4], [1, 4, 3]]
+r = g.eleToNodeAverage(np.array([10.0, 20.0]), weighted=False)
+print("eleToNodeAverage 5-node grid: {}".format(r))
+assert np.allclose(r, [15, 10, 20, 15, np.nan], equal_nan=True)
+
+#========================================================================
+# Timing
+g = makeGrid(400, 300, 50)
+V = rng.uniform(-5, 5, (g.cellcount, 72))
+t = time.time()
+g.eleToNodeAverage(V)
+t1 = time.time() - t
+t = time.time()
+g.eleToNodeAverage(V)
+t2 = time.time() - t
+print("eleToNodeAverage ({} cells x {}): first {:.3f}s  cached operator {:.3f}s".format(g.cellcount, V.shape[1], t1, t2))
@@ -1,5 +1,6 @@
 import fvcomlibutil as u
 import numpy as np
+import time
 
 T2 = np.array([[1, 2, 3],[4,5,6],[7,8,9]])
 WS_EN = np.copy(np.multiply(1.2,T2))
@@ -10,4 +11,64 @@ wind = 14.0
 
 X = u.calcEvapSimple(WS_EN,u.calcTempSea(T0,5,12),T2,0.8)
 
+#========================================================================
+# Reference (former per-value/per-column loop) implementations
+def calcSatPartialWaterPressureRef(t):
+    coeff = np.array([3, 2, 1, 0])
+    factors = [0.0393512340600576, 1.64471673914321, 39.5281581653641, 577.564717635306]
+    ilen = np.size(t)
+    x = np.zeros((ilen),float)
+    for i in range(ilen):
+        ts = np.multiply(t[i], np.ones((4),float))
+        x[i] = np.sum(np.multiply(factors,np.power(ts,coeff)))
+    # for i END
+    return x
 
+def calcEvapSimpleRef(u,Twater,Tair,RH=0.80):
+    a = 30.6 # m/s
+    b = 32.1 # no unit
+    deltaHw = 2410 # kJ/kg
+    mA = np.zeros(Tair.shape,float)
+    pwHg = (1/133.322) * calcSatPartialWaterPressureRef(Twater) # mmHg
+    for t in range(np.size(Twater)):
+        paHg = (1/133.322) * calcSatPartialWaterPressureRef(Tair[:,t])*RH # mmHg
+        mA[:,t] = (a+b*u[:,t])*(pwHg[t]-paHg)/deltaHw # kg/(m2 hour)
+        mA[:,t] = np.multiply(mA[:,t],1 /(1000 * 3600))
+    # for END
+    return mA
+
+#========================================================================
+# Numerical equivalence
+rng = np.random.default_rng(1)
+N = 5000  # nodes
+TN = 72   # time steps
+TA = rng.uniform(-25, 40, (N, TN))
+WS = rng.uniform(0, 30, (N, TN))
+TW = u.calcTempSea(60676 + np.arange(TN) / 24.0, 5, 12)
+
+t = rng.uniform(-25, 40, 1000)
+print("calcSatPartialWaterPressure max rel. diff: {:.3e}".format(np.max(np.abs(u.calcSatPartialWaterPressure(t) - calcSatPartialWaterPressureRef(t)) / calcSatPartialWaterPressureRef(t))))
+print("calcEvapSimple (3x3) max diff: {:.3e}".format(np.max(np.abs(X - calcEvapSimpleRef(WS_EN,u.calcTempSea(T0,5,12),T2,0.8)))))
+ref = calcEvapSimpleRef(WS, TW, TA, 0.8)
+new = u.calcEvapSimple(WS, TW, TA, 0.8)
+buf = np.empty_like(TA)
+u.calcEvapSimple(WS, TW, TA, 0.8, out=buf)
+print("calcEvapSimple max rel. diff: {:.3e}".format(np.max(np.abs(new - ref)) / np.max(np.abs(ref))))
+assert np.allclose(new, ref, rtol=1e-12, atol=1e-15 * np.max(np.abs(ref)))
+assert np.array_equal(new, buf)
+
+#========================================================================
+# Micro-benchmark against the reference implementation
+def bench(f, n=3):
+    best = 1e99
+    for i in range(n):
+        t0 = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t0)
+    # for END
+    return best
+
+tref = bench(lambda: calcEvapSimpleRef(WS, TW, TA, 0.8), 1)
+tnew = bench(lambda: u.calcEvapSimple(WS, TW, TA, 0.8))
+tbuf = bench(lambda: u.calcEvapSimple(WS, TW, TA, 0.8, out=buf))
+print("calcEvapSimple ({} x {}): loop {:.3f}s  vectorized {:.4f}s  with out buffer {:.4f}s  (x{:.0f})".format(N, TN, tref, tnew, tbuf, tref / max(tbuf, 1e-9)))